@@ -0,0 +1,27 @@
+"""
+Manifest-driven build for the site's image assets.
+
+The standalone scripts (generate_icons.py, process_brand_assets.py,
+fix_logo_backgrounds.py, ...) each re-open the same masters and re-derive
+overlapping outputs. This package reads asset-pipeline.json, turns it into a
+dependency graph and builds every output from a single decode of each source,
+sharing intermediate results between the outputs that need them.
+
+    python -m asset_pipeline build
+    python -m asset_pipeline graph
+"""
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MANIFEST = os.path.join(BASE_DIR, "asset-pipeline.json")
+
+# Defaults shown by `--help`, kept here so the command line can describe
+# its options without importing the modules they configure (and with them
+# Pillow and NumPy)
+DEFAULT_BUDGET = 256 * 1024 * 1024  # imagecache.py
+DEFAULT_SPILL_SIZE = 1024 * 1024 * 1024  # imagecache.py
+DEFAULT_TARGET = 0.98  # quality.py
+DEFAULT_DENSITY = 2  # site.py
+DEBOUNCE = 0.2  # watch.py
+VARIANTS_MANIFEST = "image-variants.json"  # variants.py
+ASSET_MANIFEST = "asset-manifest.json"  # fingerprint.py
@@ -0,0 +1,247 @@
+"""
+Command line entry point:
+
+    python -m asset_pipeline {build,watch,graph,cache,picture,fingerprint,favicons,optimize-site}
+    python -m asset_pipeline {icons,variants,brand,logos-bg,desktop-banners}
+
+The second row runs the standalone scripts (generate_icons.py, ...) from
+the site's root. Only the module a command needs is imported, after the
+arguments are parsed: --help, `graph` and `build --dry-run` never load
+NumPy (and --help not even Pillow), so they answer immediately.
+"""
+import argparse
+import importlib
+import os
+import sys
+
+from . import (ASSET_MANIFEST, BASE_DIR, DEBOUNCE, DEFAULT_BUDGET, DEFAULT_DENSITY,
+               DEFAULT_MANIFEST, DEFAULT_SPILL_SIZE, DEFAULT_TARGET, VARIANTS_MANIFEST)
+from .cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_SIZE, BuildCache, parse_size
+
+# Spilled decoded pixels (build --spill-pixels), inside the cache directory
+PIXELS_DIR = "pixels"
+# command -> (script module, help); each module has a main()
+SCRIPTS = {
+    "icons": ("generate_icons", "favicons and header icons from botao-pequeno@2x.png"),
+    "variants": ("generate_variants", "the icon over the white and red brand backgrounds"),
+    "brand": ("process_brand_assets", "icons, favicons, logos and hero from the brand masters"),
+    "logos-bg": ("fix_logo_backgrounds", "remove the logos' light backgrounds and resize them"),
+    "desktop-banners": ("process_new_desktop_images", "1920x480 banners from the foto-0N-site-desktop-new photos"),
+}
+
+
+def run_script(command, workers=None, legacy=False):
+    """Run a standalone script's main() from the site root (they use relative paths)."""
+    name = "create_desktop_images" if legacy else SCRIPTS[command][0]
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+    os.chdir(BASE_DIR)
+    module = importlib.import_module(name)
+    return module.main(workers) if command == "desktop-banners" else module.main()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m asset_pipeline")
+    parser.add_argument("-m", "--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--cache-max-size", type=parse_size, default=DEFAULT_MAX_SIZE,
+                        help="LRU bound for the build cache, e.g. 200M (default 256M)")
+    parser.add_argument("--spill-max-size", type=parse_size, default=DEFAULT_SPILL_SIZE,
+                        help=f"LRU bound for the spilled pixels under <cache-dir>/{PIXELS_DIR} "
+                        "(default 1G)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="build outputs from the manifest")
+    p.add_argument("-g", "--group", action="append", help="only build this group (repeatable)")
+    p.add_argument("-n", "--dry-run", action="store_true", help="print the plan without building")
+    p.add_argument("--no-cache", action="store_true", help="rebuild everything, ignore the cache")
+    p.add_argument("-j", "--jobs", type=int, default=None,
+                   help="worker processes (default: CPU count, 1 = no pool)")
+    p.add_argument("--image-cache", type=parse_size, default=DEFAULT_BUDGET, metavar="SIZE",
+                   help="bytes of decoded images each worker keeps for reuse (default 256M, 0 = off)")
+    p.add_argument("--spill-pixels", action="store_true",
+                   help=f"also keep decoded pixels under <cache-dir>/{PIXELS_DIR} and map them "
+                   "instead of decoding again (shared by workers and later builds)")
+    p.add_argument("--max-memory", type=parse_size, default=None, metavar="SIZE",
+                   help="memory-bounded mode: reduced decodes, low-memory ops and no more "
+                   "concurrent jobs than fit in SIZE (e.g. 512M); logs each job's peak RSS")
+    p.add_argument("--target-ssim", type=float, nargs="?", const=DEFAULT_TARGET, default=None,
+                   metavar="SSIM", help="search the quality of lossy outputs for the smallest file "
+                   f"with at least this SSIM (default {DEFAULT_TARGET})")
+    p.add_argument("--profile", action="store_true",
+                   help="time every decode, transform and encode and list the slowest at the end")
+    p.add_argument("--trace", default=None, metavar="PREFIX",
+                   help="like --profile, and write the spans to PREFIX.jsonl and PREFIX.trace.json "
+                   "(Chrome trace format)")
+    p.add_argument("--fingerprint", action="store_true",
+                   help="then copy the images the pages use to content-hashed names and point the "
+                   "pages at them (see the fingerprint command)")
+
+    p = sub.add_parser("watch", help="build, then rebuild the outputs of every source that changes")
+    p.add_argument("-g", "--group", action="append", help="only build this group (repeatable)")
+    p.add_argument("--no-cache", action="store_true", help="do not use the build cache")
+    p.add_argument("--image-cache", type=parse_size, default=DEFAULT_BUDGET, metavar="SIZE",
+                   help="bytes of decoded masters kept between rebuilds (default 256M)")
+    p.add_argument("--debounce", type=float, default=DEBOUNCE, metavar="SECONDS",
+                   help=f"quiet time that ends a burst of changes (default {DEBOUNCE})")
+    p.add_argument("--poll", action="store_true", help="poll the files instead of using inotify")
+
+    p = sub.add_parser("graph", help="show the dependency graph")
+    p.add_argument("-g", "--group", action="append", help="only show this group (repeatable)")
+    p.add_argument("--dot", action="store_true", help="emit Graphviz dot instead of text")
+
+    p = sub.add_parser("cache", help="inspect or prune the build cache")
+    p.add_argument("action", choices=["stats", "prune", "clear"])
+
+    p = sub.add_parser("picture", help=f"print <picture> markup from {VARIANTS_MANIFEST}")
+    p.add_argument("path", nargs="+", help="image as referenced by the site, e.g. public/SeeSite4.png")
+    p.add_argument("--alt", default="")
+    p.add_argument("--sizes", default=None, help="override the sizes attribute of breakpoint images")
+    p.add_argument("--loading", choices=["lazy", "eager"], default=None)
+
+    for command, (module, text) in SCRIPTS.items():
+        p = sub.add_parser(command, help=f"{text} ({module}.py)")
+        if command == "desktop-banners":
+            p.add_argument("-j", "--jobs", type=int, default=None,
+                           help="worker processes (default: CPU count)")
+            p.add_argument("--legacy", action="store_true",
+                           help="the older foto-0N-site photos instead (create_desktop_images.py)")
+
+    p = sub.add_parser("fingerprint", help="copy the images the pages use to content-hashed names, "
+                       f"rewrite the pages to use them and list them in {ASSET_MANIFEST}")
+    p.add_argument("--pages", nargs="+", default=None, metavar="PAGE",
+                   help="HTML pages to rewrite (default: index.html privacy.html register-*.html)")
+    p.add_argument("-n", "--dry-run", action="store_true", help="print the hashed names, change nothing")
+
+    p = sub.add_parser("favicons", help="favicon.ico, favicon PNGs and apple-touch (with --pwa "
+                       "also the PWA icons and site.webmanifest) from one master, at the root and under public/")
+    p.add_argument("--source", default="logo-icon-blue.png", help="square-able icon master "
+                   "(default logo-icon-blue.png)")
+    p.add_argument("-j", "--jobs", type=int, default=None, help="encoder threads (default: CPU count)")
+    p.add_argument("--no-public", action="store_true", help="do not copy the files to public/")
+    p.add_argument("--pwa", action="store_true", help="also the PWA icons and site.webmanifest "
+                   "(not published yet)")
+
+    p = sub.add_parser("optimize-site", help="audit every image the pages reference and re-encode "
+                       "it for the size it is shown at")
+    p.add_argument("--pages", nargs="+", default=None, metavar="PAGE",
+                   help="HTML pages to scan (default: index.html privacy.html register-*.html)")
+    p.add_argument("--write", action="store_true",
+                   help="rewrite the images that got smaller (outputs of the manifest are left alone)")
+    p.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    p.add_argument("--density", type=float, default=DEFAULT_DENSITY,
+                   help=f"device pixel ratio to keep for images with a known rendered size "
+                   f"(default {DEFAULT_DENSITY})")
+    p.add_argument("--target-ssim", type=float, default=DEFAULT_TARGET, metavar="SSIM",
+                   help=f"SSIM lossy re-encodes must keep (default {DEFAULT_TARGET})")
+
+    args = parser.parse_args(argv)
+
+    if args.command in SCRIPTS:
+        run_script(args.command, getattr(args, "jobs", None), getattr(args, "legacy", False))
+        return 0
+
+    if args.command == "cache":
+        from .imagecache import ImageCache
+        cache = BuildCache(args.cache_dir, args.cache_max_size)
+        if args.action == "prune":
+            print(f"removed {cache.prune()} entries")
+            spilled = ImageCache(0, os.path.join(args.cache_dir, PIXELS_DIR)).prune(args.spill_max_size)
+            if spilled:
+                print(f"removed {spilled} spilled images")
+        elif args.action == "clear":
+            print(f"removed {cache.clear()} entries")
+            spilled = ImageCache(0, os.path.join(args.cache_dir, PIXELS_DIR)).clear()
+            if spilled:
+                print(f"removed {spilled} spilled images")
+        if args.action != "stats":
+            cache.save()
+        print(cache.summary())
+        return 0
+
+    if args.command == "picture":
+        from .variants import load_variants, picture_markup, with_assets
+        base = os.path.dirname(os.path.abspath(args.manifest))
+        entries = load_variants(os.path.join(base, VARIANTS_MANIFEST))
+        assets = load_variants(os.path.join(base, ASSET_MANIFEST))
+        attrs = {"loading": args.loading} if args.loading else {}
+        missing = 0
+        for path in args.path:
+            entry = entries.get("/" + path.lstrip("/"))
+            if entry is None:
+                print(f"⚠️  {path} has no variants in {VARIANTS_MANIFEST} (run build first)", file=sys.stderr)
+                missing += 1
+            else:
+                print(picture_markup(with_assets(entry, assets), args.alt, args.sizes, **attrs))
+        return 1 if missing else 0
+
+    if args.command == "watch":
+        from .watch import watch
+        cache = None if args.no_cache else BuildCache(args.cache_dir, args.cache_max_size)
+        try:
+            watch(args.manifest, args.group, cache, args.debounce, args.poll,
+                  image_cache=(args.image_cache, None))
+        except KeyboardInterrupt:
+            print("\nstopped")
+        return 0
+
+    if args.command == "fingerprint":
+        from .fingerprint import fingerprint
+        base = os.path.dirname(os.path.abspath(args.manifest))
+        pages = [os.path.join(base, p) for p in args.pages] if args.pages else None
+        fingerprint(base, pages, args.dry_run)
+        return 0
+
+    if args.command == "favicons":
+        from .favicons import bundle, make_square
+        from .imagecache import open_image
+        base = os.path.dirname(os.path.abspath(args.manifest))
+        master = make_square(open_image(os.path.join(base, args.source), "RGBA"))
+        bundle(master, base, public=not args.no_public, workers=args.jobs, pwa=args.pwa)
+        return 0
+
+    from .manifest import load_manifest
+    graph = load_manifest(args.manifest)
+
+    if args.command == "optimize-site":
+        from . import site
+        from .variants import load_variants
+        base = os.path.dirname(os.path.abspath(args.manifest))
+        pages = [os.path.join(base, p) for p in args.pages] if args.pages else None
+        # Hashed copies are served as immutable: re-encoding one in place would break that
+        owned = {o.path for o in graph.outputs} | {
+            os.path.join(base, url.lstrip("/")) for url in
+            load_variants(os.path.join(base, ASSET_MANIFEST)).values()}
+        sources = set(graph.source_paths())
+        found = site.audit(base, pages, args.jobs, args.density, args.target_ssim, owned)
+        site.report(base, found, sources)
+        if args.write:
+            print()
+            site.write_results(base, found)
+        return 0
+
+    if args.command == "graph":
+        outputs = graph.select(args.group)
+        print(graph.to_dot(outputs) if args.dot else graph.describe(outputs))
+    else:
+        from .engine import build
+        cache = None if args.no_cache else BuildCache(args.cache_dir, args.cache_max_size)
+        spill_dir = os.path.join(args.cache_dir, PIXELS_DIR) if args.spill_pixels else None
+        stats = build(graph, args.group, dry_run=args.dry_run, cache=cache, workers=args.jobs,
+                      target=args.target_ssim, max_memory=args.max_memory,
+                      profile=args.profile, trace_path=args.trace,
+                      image_cache=(args.image_cache, spill_dir))
+        if spill_dir and not args.dry_run:
+            from .imagecache import ImageCache
+            ImageCache(0, spill_dir).prune(args.spill_max_size)
+        if stats["errors"]:
+            return 1
+        if args.fingerprint and not args.dry_run:
+            from .fingerprint import fingerprint
+            print()
+            fingerprint(os.path.dirname(os.path.abspath(args.manifest)))
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
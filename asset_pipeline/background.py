@@ -0,0 +1,158 @@
+"""
+Background removal for the logos: edge-connected near-white pixels made
+transparent, with a partial-alpha ramp on the border.
+
+fix_logo_backgrounds.py, the manifest's remove_bg op and the maskable PWA
+icons all use remove_background(). The mask is read strip by strip
+(STRIP_ROWS rows of pixels at a time) and kept at one byte per pixel; the
+regions touching the edges come from scipy.ndimage when it is installed
+and from labeling.py or flood_from_edges() otherwise, with the same result.
+"""
+import numpy as np
+from PIL import Image
+
+from .labeling import label
+from .trace import span
+
+THRESHOLD = 230  # pixels with R,G,B all > this are background
+STRIP_ROWS = 256  # rows of pixels read at a time
+
+
+def dilate4(mask):
+    """One step of 4-neighbour dilation (ndimage.binary_dilation's default)."""
+    out = mask.copy()
+    out[1:, :] |= mask[:-1, :]
+    out[:-1, :] |= mask[1:, :]
+    out[:, 1:] |= mask[:, :-1]
+    out[:, :-1] |= mask[:, 1:]
+    return out
+
+
+def background_mask(rgba, threshold=THRESHOLD, rows=STRIP_ROWS):
+    """Pixels with R,G,B all > threshold, read strip by strip.
+
+    Only one strip of pixels is ever held as an array, the mask itself is
+    one byte per pixel.
+    """
+    w, h = rgba.size
+    mask = np.empty((h, w), dtype=bool)
+    for y in range(0, h, rows):
+        strip = np.asarray(rgba.crop((0, y, w, min(h, y + rows))))
+        mask[y:y + strip.shape[0]] = (
+            (strip[..., 0] > threshold) & (strip[..., 1] > threshold) & (strip[..., 2] > threshold))
+    return mask
+
+
+def spread_runs(row, reached):
+    """Pixels of row's runs of True that hold a reached pixel."""
+    ids = np.cumsum(row & ~np.concatenate(([False], row[:-1])))
+    hit = np.zeros(ids[-1] + 1, dtype=bool)
+    hit[ids[reached & row]] = True
+    hit[0] = False
+    return hit[ids] & row
+
+
+def flood_from_edges(mask):
+    """Pixels of mask 4-connected to the image edges, in pure NumPy.
+
+    Sweeps the rows down and then up, each row taking what the previous
+    one reached directly above or below it and spreading it along its own
+    runs, until a round of sweeps adds nothing. Only the result is a full
+    image besides the mask; the run ids are one row at a time.
+    """
+    h, w = mask.shape
+    reached = np.zeros_like(mask)
+    reached[[0, -1], :] = mask[[0, -1], :]
+    reached[:, [0, -1]] = mask[:, [0, -1]]
+    for y in (0, h - 1):
+        reached[y] = spread_runs(mask[y], reached[y])
+    changed = True
+    while changed:
+        changed = False
+        for rows in (range(1, h), range(h - 2, -1, -1)):
+            step = 1 if rows.step > 0 else -1
+            for y in rows:
+                row = reached[y] | (reached[y - step] & mask[y])
+                row = spread_runs(mask[y], row)
+                if (row != reached[y]).any():
+                    reached[y] = row
+                    changed = True
+    return reached
+
+
+def edge_connected(mask, low_memory=False):
+    """Background pixels connected to the image edges (4-connectivity).
+
+    Labels the components and keeps those touching an edge, or with
+    low_memory flood-fills from the edge pixels instead: same result
+    without the int32 label image (scipy.ndimage.binary_propagation, or
+    flood_from_edges() when SciPy is not installed). Without SciPy the
+    labels come from asset_pipeline.labeling (pure NumPy, same labels).
+    """
+    # Use flood-fill approach from corners to only remove connected background
+    try:
+        from scipy import ndimage
+    except ImportError:
+        ndimage = None
+    if low_memory:
+        if ndimage is None:
+            return flood_from_edges(mask)
+        seeds = np.zeros_like(mask)
+        seeds[[0, -1], :] = mask[[0, -1], :]
+        seeds[:, [0, -1]] = mask[:, [0, -1]]
+        return ndimage.binary_propagation(seeds, mask=mask)
+
+    # Label connected components in the background mask
+    if ndimage is not None:
+        labeled, num = ndimage.label(mask)
+    else:
+        labeled, num = label(mask)
+
+    # Lookup table of labels that touch any edge, applied to the whole
+    # label image in one pass (instead of one full-image compare per label)
+    edges = np.concatenate((labeled[0, :], labeled[-1, :], labeled[:, 0], labeled[:, -1]))
+    is_edge = np.zeros(num + 1, dtype=bool)
+    is_edge[edges] = True
+    is_edge[0] = False  # 0 = non-background
+    return is_edge[labeled]
+
+
+def remove_background(img, threshold=THRESHOLD, low_memory=False, rows=STRIP_ROWS):
+    """img with its edge-connected light background made transparent.
+
+    Works on the RGBA image and one-byte masks, never on a full-size copy
+    of the pixels: the alpha band is edited as an array and put back.
+    """
+    rgba = img.convert('RGBA')
+    w, h = rgba.size
+
+    # Only make edge-connected near-white regions transparent
+    with span("remove_bg.mask", "step"):
+        mask = background_mask(rgba, threshold, rows)
+    with span("remove_bg.label", "step", low_memory=low_memory):
+        final_mask = edge_connected(mask, low_memory)
+    del mask
+
+    # Apply transparency with anti-aliasing at edges
+    # For pixels on the border of the mask, use partial transparency
+    with span("remove_bg.alpha", "step"):
+        border = dilate4(final_mask)
+        border &= ~final_mask
+
+        alpha = np.array(rgba.getchannel('A'))
+        alpha[final_mask] = 0  # Fully transparent
+        del final_mask
+
+        # Border pixels get partial transparency for smoother edges
+        for y in range(0, h, rows):
+            ys, xs = np.nonzero(border[y:y + rows])
+            if not len(ys):
+                continue
+            strip = np.asarray(rgba.crop((0, y, w, min(h, y + rows))))
+            luminance = strip[ys, xs, :3].astype(np.int32).sum(axis=1) / 3
+            ramp = luminance > threshold
+            alpha[ys[ramp] + y, xs[ramp]] = np.maximum(
+                255 - (luminance[ramp] - threshold) * (255 / (255 - threshold)), 0).astype(np.uint8)
+
+        rgba.putalpha(Image.fromarray(alpha))
+    return rgba
@@ -0,0 +1,151 @@
+"""
+Responsive breakpoints: the same banner rendered at a ladder of widths.
+
+render() is the fit/cover logic of process_new_desktop_images.py with the
+banner size as a parameter: fit scales the whole photo into the frame and
+letterboxes it with LETTERBOX, cover fills the frame and crops, with
+crop_offset moving the crop up (negative) or down, or with the window
+smartcrop.py chose ("crop": "auto").
+
+An output that declares "breakpoints" (a preset from "breakpoint_presets")
+gets one extra output per width of the ladder, <stem>-<width>w<ext>, all
+computed from the output's single decoded input. The ladder is the preset's
+widths times its densities, without the widths that would only upscale the
+source (browsers upscale for free) and without the output's own width.
+Each rung inherits the output's variants, and image-variants.json lists
+them as srcset candidates next to the preset's "sizes".
+
+Planning only needs sizes, so this module imports nothing heavy at load:
+Pillow comes with the first render, and input sizes are read from the
+file headers (imagesize.py).
+"""
+LETTERBOX = (11, 18, 32)
+# (width, height) of the desktop_banner op and process_new_desktop_images.py
+DESKTOP_SIZE = (1920, 480)
+DEFAULT_WIDTHS = [480, 768, 1024, 1440, 1920, 2560]
+DEFAULT_DENSITIES = [1, 2]
+DEFAULT_SIZES = "100vw"
+
+# Ops whose output size can be changed per breakpoint
+SCALABLE = {"resize", "banner", "desktop_banner"}
+# Ops that keep their input's size, looked through to find the source size
+SIZE_PRESERVING = {"convert", "remove_bg"}
+
+
+def render(img, size, crop_offset=0, fit=False, background=LETTERBOX, log=None, linear=False,
+           window=None):
+    """Fit or cover-crop img into a banner of size (width, height), resampled
+    in linear light when linear (see linear.py). window (fractions of img,
+    see smartcrop.py) replaces the centred cover crop."""
+    from .linear import resample  # NumPy, only once something is rendered
+    width, height = size
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    original_width, original_height = img.size
+
+    if window is not None and not fit:
+        from .smartcrop import source_box
+        box = source_box(window, img.size)
+        if log:
+            log(f"   → Smart crop: window {box[2] - box[0]:.0f}x{box[3] - box[1]:.0f} "
+                f"at ({box[0]:.0f}, {box[1]:.0f})")
+        return resample(img, (width, height), linear, box=box)
+
+    if fit:
+        from PIL import Image
+        # Ajuste para mostrar toda a imagem (fit) - mantém proporção e adiciona barras
+        scale = min(width / original_width, height / original_height)
+        new_width = int(original_width * scale)
+        new_height = int(original_height * scale)
+        img_resized = resample(img, (new_width, new_height), linear)
+        banner = Image.new('RGB', (width, height), tuple(background))
+        banner.paste(img_resized, ((width - new_width) // 2, (height - new_height) // 2))
+        if log:
+            log(f"   → Fit mode: scaled to {new_width}x{new_height}, centered with padding")
+        return banner
+
+    # Redimensionar para cobrir toda a área (crop mode)
+    scale = max(width / original_width, height / original_height)
+    new_width = int(original_width * scale)
+    new_height = int(original_height * scale)
+    img_resized = resample(img, (new_width, new_height), linear)
+
+    left = (new_width - width) // 2 if new_width > width else 0
+    if new_height > height:
+        # Ajuste manual de crop_offset (negativo sobe, positivo desce)
+        top = max(0, ((new_height - height) // 2) + crop_offset)
+        if top + height > new_height:
+            top = new_height - height
+    else:
+        top = 0
+
+    if log:
+        if crop_offset != 0:
+            log(f"   → Crop mode with offset {crop_offset}px (top={top})")
+        else:
+            log(f"   → Crop mode: centered")
+    return img_resized.crop((left, top, left + width, top + height))
+
+
+def ladder(widths=DEFAULT_WIDTHS, densities=DEFAULT_DENSITIES, native=None):
+    """Sorted widths * densities, dropping those above native (when known)."""
+    found = {int(w * d) for w in widths for d in densities}
+    return sorted(w for w in found if native is None or w <= native)
+
+
+def output_size(op, params):
+    """(width, height) an output of a scalable op is rendered at."""
+    if op == "desktop_banner":
+        return DESKTOP_SIZE
+    size = params["size"]
+    return (size, size) if isinstance(size, int) else tuple(size)
+
+
+def input_size(node):
+    """Pixel size of the file behind node, looking through size-preserving ops."""
+    while node.op in SIZE_PRESERVING:
+        node = node.inputs[0]
+    if node.op != "decode":
+        return None
+    from .imagesize import header_size
+    return header_size(node.params["path"])
+
+
+def native_width(op, params, source):
+    """Largest width at which op still downscales source (None: unknown)."""
+    if source is None:
+        return None
+    width, height = output_size(op, params)
+    aspect = width / height
+    src_w, src_h = source
+    if op != "resize" and params.get("fit"):
+        # fit only needs one side of the source to be large enough
+        return int(max(src_w, src_h * aspect))
+    return int(min(src_w, src_h * aspect))
+
+
+def expand(op, params, preset, source):
+    """[(width, op, params)] for the breakpoint outputs of one output."""
+    if op not in SCALABLE:
+        raise ValueError(f"Op '{op}' cannot be rendered at other widths")
+    width, height = output_size(op, params)
+    native = native_width(op, params, source)
+    rungs = []
+    for w in ladder(preset.get("widths", DEFAULT_WIDTHS), preset.get("densities", DEFAULT_DENSITIES), native):
+        if w == width:
+            continue
+        h = round(w * height / width)
+        if op == "resize":
+            rungs.append((w, "resize", {**params, "size": [w, h]}))
+        else:
+            scaled = {k: v for k, v in params.items() if k != "size"}
+            if scaled.get("crop_offset"):
+                scaled["crop_offset"] = round(scaled["crop_offset"] * w / width)
+            rungs.append((w, "banner", {**scaled, "size": [w, h]}))
+    return rungs
+
+
+def srcset(candidates):
+    """'url 480w, url 768w' from (url, width) pairs."""
+    return ", ".join(f"{url} {w}w" for url, w in sorted(candidates, key=lambda c: c[1]))
@@ -0,0 +1,241 @@
+"""
+Persistent content-hash cache for encoded outputs.
+
+An output's key hashes the content of every source file it reads, the op
+and params of every transform on the way, the encoder and its settings and
+the Pillow version. When the key is already cached and the file on disk
+holds those bytes, the output is skipped without decoding anything; when
+only the file is stale it is restored from the cache.
+
+With a quality target (build --target-ssim) the target is part of the key
+of every lossy output, and the quality the search settled on is kept in
+the index per output signature so the search never runs twice for the
+same sources. The crop windows of smartcrop.py are kept the same way.
+
+Layout under .asset-cache/:
+
+    index.json          file hashes, cache entries and their last use,
+                        searched qualities, smart-crop windows
+    objects/ab/abcd...  encoded bytes, one file per key
+"""
+import hashlib
+import json
+import os
+import time
+
+import PIL
+
+from . import BASE_DIR
+from .fanout import materialize, write_file
+
+CACHE_VERSION = 3
+DEFAULT_CACHE_DIR = os.path.join(BASE_DIR, ".asset-cache")
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def digest(*parts):
+    return sha256(json.dumps(parts, sort_keys=True).encode())
+
+
+def parse_size(text):
+    """'200M' -> bytes. Accepts plain numbers and K/M/G suffixes."""
+    text = str(text).strip().upper().rstrip("B")
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+class BuildCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.restored = 0
+        self._signatures = {}
+        self.index = {"version": CACHE_VERSION, "files": {}, "written": {}, "entries": {},
+                      "qualities": {}, "crops": {}}
+        path = self.index_path
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("version") == CACHE_VERSION:
+                index.setdefault("qualities", {})
+                index.setdefault("crops", {})
+                self.index = index
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, "index.json")
+
+    def object_path(self, key):
+        return os.path.join(self.directory, "objects", key[:2], key)
+
+    def file_hash(self, path):
+        """Content hash of path, memoised on (mtime, size) across runs."""
+        if not os.path.exists(path):
+            return None
+        st = os.stat(path)
+        known = self.index["files"].get(path)
+        if known and known[0] == st.st_mtime_ns and known[1] == st.st_size:
+            return known[2]
+        with open(path, "rb") as f:
+            h = sha256(f.read())
+        self.index["files"][path] = [st.st_mtime_ns, st.st_size, h]
+        return h
+
+    def source_signature(self, path):
+        """Hash identifying a source file's content.
+
+        Files this build rewrote in place (logo-vertical.png) keep the
+        signature of the content they were produced from, otherwise every
+        run would see a "new" source and rebuild them forever.
+        """
+        h = self.file_hash(path)
+        if h is None:
+            raise FileNotFoundError(path)
+        written = self.index["written"].get(path)
+        if written and written["sha"] == h and written.get("origin"):
+            return written["origin"]
+        return h
+
+    def reset_signatures(self):
+        """Forget the node signatures of the previous build, for a cache
+        that outlives one (watch.py): sources may have changed since."""
+        self._signatures = {}
+
+    def signature(self, node):
+        sig = self._signatures.get(node.key)
+        if sig is None:
+            if node.op == "decode":
+                sig = self.source_signature(node.params["path"])
+            else:
+                sig = digest(node.op, node.params, [self.signature(d) for d in node.inputs])
+            self._signatures[node.key] = sig
+        return sig
+
+    def output_key(self, out, *extra):
+        """Key of out's bytes; extra settings that change them (a quality
+        target, reduced decodes) are appended when not None."""
+        parts = [CACHE_VERSION, PIL.__version__, self.signature(out.node), out.format, out.save]
+        return digest(*parts, *[e for e in extra if e is not None])
+
+    def quality_key(self, out, target, metric):
+        options = {k: v for k, v in out.save.items() if k != "quality"}
+        return digest(PIL.__version__, self.signature(out.node), out.format, options, target, metric)
+
+    def quality(self, key):
+        """Remembered quality search result for key, or None."""
+        return self.index["qualities"].get(key)
+
+    def remember_quality(self, key, record):
+        self.index["qualities"][key] = {k: record[k] for k in ("quality", "score", "baseline")}
+
+    def crop(self, key):
+        """Remembered smart-crop window for key, or None."""
+        window = self.index["crops"].get(key)
+        return tuple(window) if window is not None else None
+
+    def remember_crop(self, key, window):
+        self.index["crops"][key] = list(window)
+
+    def lookup(self, key):
+        """True when key's bytes are cached; counts the hit or miss."""
+        entry = self.index["entries"].get(key)
+        if entry is None or not os.path.exists(self.object_path(key)):
+            self.misses += 1
+            return False
+        self.hits += 1
+        entry["used"] = time.time()
+        return True
+
+    def restore(self, key, path, origin=None, like=None, hardlink=True):
+        """Bring path up to date from the cache entry key (no-op if it already is),
+        materializing it from like when that file holds the same bytes."""
+        if self.file_hash(path) == self.index["entries"][key]["sha"]:
+            return False
+        data = None
+        if like is None:
+            with open(self.object_path(key), "rb") as f:
+                data = f.read()
+        self.write(path, data, origin, like, hardlink)
+        self.restored += 1
+        return True
+
+    def store(self, key, data):
+        path = self.object_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        self.index["entries"][key] = {"size": len(data), "sha": sha256(data), "used": time.time()}
+
+    def write(self, path, data, origin=None, like=None, hardlink=True):
+        """Write an output and remember its hash so it is not re-read next run.
+
+        With like (a file this build wrote with the same bytes), path is
+        materialized from it instead; returns the fanout.py method then.
+        """
+        method = None
+        if like is None:
+            write_file(path, data)
+            h = sha256(data)
+        else:
+            method = materialize(like, path, hardlink)
+            h = self.index["files"][like][2]
+        st = os.stat(path)
+        self.index["files"][path] = [st.st_mtime_ns, st.st_size, h]
+        prev = self.index["written"].get(path, {})
+        if origin is None and prev.get("sha") == h:
+            origin = prev.get("origin")
+        self.index["written"][path] = {"sha": h, "origin": origin}
+        return method
+
+    def origin_for(self, out):
+        """Signature of out's own path when the output overwrites one of its sources."""
+        stack = [out.node]
+        while stack:
+            node = stack.pop()
+            if node.op == "decode" and node.params["path"] == out.path:
+                return self.signature(node)
+            stack.extend(node.inputs)
+        return None
+
+    def size(self):
+        return sum(e["size"] for e in self.index["entries"].values())
+
+    def prune(self, max_size=None):
+        """Drop least recently used entries until the cache fits max_size."""
+        max_size = self.max_size if max_size is None else max_size
+        entries = self.index["entries"]
+        total = self.size()
+        removed = 0
+        for key, entry in sorted(entries.items(), key=lambda kv: kv[1]["used"]):
+            if total <= max_size:
+                break
+            try:
+                os.remove(self.object_path(key))
+            except FileNotFoundError:
+                pass
+            total -= entry["size"]
+            del entries[key]
+            removed += 1
+        return removed
+
+    def clear(self):
+        return self.prune(0)
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+
+    def summary(self):
+        return (f"cache: {self.hits} hits ({self.restored} restored), {self.misses} misses, "
+                f"{len(self.index['entries'])} entries / {self.size() / 1024 / 1024:.1f} MB")
@@ -0,0 +1,110 @@
+"""
+Encoders turn a computed image into the bytes written to disk.
+
+Defaults match what the scripts have always used (PNG optimize=True,
+JPEG quality=85); the manifest can override them per output via "save".
+PNGs are then recompressed losslessly (see pngopt.py).
+WebP and AVIF are the modern variants emitted next to those fallbacks;
+AVIF is only offered when the local Pillow was built with it.
+"""
+import importlib
+import io
+
+ICO_SIZES = [16, 32, 48, 64]
+# Fastest settings per format for draft builds (watch.py): the same pixels
+# as the final encode, minus palette quantization, in a bigger file
+DRAFT_OPTIONS = {
+    "png": {"optimize": False, "compress_level": 1},
+    "jpeg": {"optimize": False},
+    "webp": {"method": 0},
+    "avif": {"speed": 10},
+}
+# Settings that change the decoded pixels, kept in drafts
+DRAFT_KEEP = {"quality", "lossless", "progressive"}
+
+
+def encode_png(img, optimize=True, recompress=True, quantize=None, **options):
+    """PNG, recompressed losslessly by pngopt.py unless other Pillow options
+    are given; quantize (true or a dict for pngopt.quantize) opts into a
+    palette when it keeps the SSIM bound."""
+    from . import pngopt  # NumPy, only once a PNG is encoded
+    if quantize:
+        reduced = pngopt.quantize(img, **(quantize if isinstance(quantize, dict) else {}))
+        if reduced is not None:
+            img = reduced
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", optimize=optimize, **options)
+    data = buf.getvalue()
+    if recompress and optimize and not options:
+        data = pngopt.recompress(img, data)
+    return data
+
+
+def encode_jpeg(img, quality=85, optimize=True, **options):
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality, optimize=optimize, **options)
+    return buf.getvalue()
+
+
+def encode_ico(img, sizes=ICO_SIZES):
+    """Multi-size ICO of PNG frames, rendered and packed by favicons.py.
+
+    Every frame comes from img itself (the scripts saved frames[0], 16x16,
+    and Pillow silently dropped the larger sizes), sharpened when tiny.
+    """
+    from .favicons import ico_bytes  # NumPy, only once an ICO is encoded
+    return ico_bytes(img, sizes)
+
+
+def encode_webp(img, quality=80, method=6, lossless=False, **options):
+    buf = io.BytesIO()
+    img.save(buf, format="WEBP", quality=quality, method=method, lossless=lossless, **options)
+    return buf.getvalue()
+
+
+def encode_avif(img, quality=55, speed=6, **options):
+    buf = io.BytesIO()
+    img.save(buf, format="AVIF", quality=quality, speed=speed, **options)
+    return buf.getvalue()
+
+
+ENCODERS = {
+    "png": encode_png,
+    "jpeg": encode_jpeg,
+    "ico": encode_ico,
+    "webp": encode_webp,
+    "avif": encode_avif,
+}
+
+EXTENSIONS = {"png": ".png", "jpeg": ".jpg", "ico": ".ico", "webp": ".webp", "avif": ".avif"}
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "ico": "image/x-icon",
+              "webp": "image/webp", "avif": "image/avif"}
+
+
+def available(format):
+    """Whether this Pillow can write format (AVIF and WebP are optional builds).
+
+    Imports the codec module the way PIL.features.check does, without
+    PIL.features itself (which imports PIL.Image), so loading a manifest
+    stays cheap.
+    """
+    if format in ("webp", "avif"):
+        try:
+            importlib.import_module(f"PIL._{format}")
+        except ImportError:
+            return False
+        return True
+    return format in ENCODERS
+
+
+def draft_options(format, options):
+    kept = {k: v for k, v in options.items() if k in DRAFT_KEEP}
+    return {**kept, **DRAFT_OPTIONS.get(format, {})}
+
+
+def encode(img, format, options):
+    if format not in ENCODERS:
+        raise ValueError(f"Unknown output format: {format}")
+    return ENCODERS[format](img, **options)
@@ -0,0 +1,332 @@
+"""
+Execute a build plan: every node runs once, in dependency order, and its
+image is dropped as soon as the last consumer has used it.
+
+The plan is split into independent jobs (one per family of sources) that
+run in a bounded process pool. Workers only compute and encode; files are
+written, cached and logged by the parent in manifest order, so the result
+does not depend on the number of workers. Outputs sharing an encode key
+are encoded once and the other files materialized from the first one
+(fanout.py).
+"""
+import os
+import time
+
+from . import fanout, imagecache, memory, ops, trace
+from .encoders import draft_options, encode
+from .fanout import write_file
+from .imagesize import header_size
+from .parallel import default_workers, run_ordered
+from .pyramid import SizePyramid
+from .variants import VARIANTS_MANIFEST, update_manifest
+
+
+def run_job(job):
+    """Compute a job's nodes and return the encoded bytes of its outputs,
+    with the peak RSS the job reached."""
+    if job.image_cache is not None:
+        imagecache.configure(*job.image_cache)
+    before = imagecache.shared().stats()
+    if job.trace:
+        trace.start()
+    try:
+        with memory.PeakMeter() as meter:
+            result = compute_job(job)
+    finally:
+        events = trace.stop() if job.trace else []
+    result["peak_rss"] = meter.peak
+    result["trace"] = events
+    result["windows"] = job.windows
+    after = imagecache.shared().stats()
+    result["image_cache"] = {k: after[k] - before[k] for k in imagecache.COUNTERS}
+    return result
+
+
+def compute_node(job, node, inputs):
+    if node.key in job.crops:
+        key = job.crops[node.key]
+        if key not in job.windows:
+            from . import smartcrop
+            job.windows[key] = smartcrop.find_window(inputs[0], smartcrop.aspect_of(node))
+        return ops.apply(node, inputs, window=job.windows[key])
+    if node.key in job.decode_hints:
+        return memory.decode_reduced(node.params["path"], job.decode_hints[node.key])
+    if job.low_memory and node.op in memory.LOW_MEMORY_OPS:
+        return ops.apply(node, inputs, low_memory=True)
+    return ops.apply(node, inputs)
+
+
+def compute_job(job):
+    wanted = {id(o): i for i, o in enumerate(job.outputs)}
+    encoded = {}
+    remaining = {n.key: 0 for n in job.nodes}
+    for n in job.nodes:
+        for dep in n.inputs:
+            remaining[dep.key] += 1
+
+    images, pyramids = {}, {}
+    # (encode key, searched quality) -> id of the output encoded for it
+    first = {}
+    result = {"decodes": 0, "transforms": 0, "encodes": 0}
+    for node in job.nodes:
+        if node.op in ops.PYRAMID_OPS:
+            inputs = [pyramids.get(d.key) or pyramids.setdefault(d.key, SizePyramid(images[d.key]))
+                      for d in node.inputs]
+        else:
+            inputs = [images[d.key] for d in node.inputs]
+        kind = "decode" if node.op == "decode" else "transform"
+        with trace.span(node.op, kind, job.label, node=node.label) as s:
+            img = compute_node(job, node, inputs)
+            if trace.recording():
+                if kind == "decode":
+                    s.set(bytes_in=os.path.getsize(node.params["path"]))
+                else:
+                    s.set(pixels_in=sum(i.width * i.height for i in inputs),
+                          bytes_in=sum(trace.image_bytes(i) for i in inputs))
+                s.set(pixels_out=img.width * img.height, bytes_out=trace.image_bytes(img))
+        result[kind + "s"] += 1
+
+        for out in node.outputs:
+            if id(out) not in wanted:
+                continue
+            target = job.targets.get(wanted[id(out)])
+            shared = (out.encode_key, target is not None)
+            if shared in first:
+                encoded[id(out)] = encoded[first[shared]]
+                continue
+            first[shared] = id(out)
+            result["encodes"] += 1
+            with trace.span("encode:" + out.format, "encode", job.label, output=out.path) as s:
+                if job.draft:
+                    data, record = encode(img, out.format, draft_options(out.format, out.save)), None
+                elif target is not None:
+                    from . import quality
+                    data, record = quality.encode_targeted(img, out, *target)
+                else:
+                    data, record = encode(img, out.format, out.save), None
+                s.set(pixels_in=img.width * img.height, bytes_in=trace.image_bytes(img),
+                      bytes_out=len(data))
+            encoded[id(out)] = (data, img.size, record)
+
+        for dep in node.inputs:
+            remaining[dep.key] -= 1
+            if remaining[dep.key] == 0:
+                del images[dep.key]
+                pyramids.pop(dep.key, None)
+        if remaining[node.key]:
+            images[node.key] = img
+
+    result["encoded"] = [encoded[id(o)] for o in job.outputs]
+    return result
+
+
+def plan_crops(job, cache):
+    """Key the smart-crop windows of job's nodes (see smartcrop.py), with
+    those the cache remembers. Without a cache, rungs of one ladder still
+    share a window within the job."""
+    auto = [n for n in job.nodes if n.params.get("crop") == "auto"]
+    if not auto:
+        return
+    from . import smartcrop
+    for node in filter(smartcrop.wants, auto):
+        key = smartcrop.crop_key(cache, node.inputs[0], smartcrop.aspect_of(node))
+        job.crops[node.key] = key
+        known = cache.crop(key) if cache is not None else None
+        if known is not None:
+            job.windows[key] = known
+
+
+def job_memory(job):
+    return memory.estimate_job_memory(job, job.decode_hints, job.base_memory)
+
+
+def estimate_cost(job):
+    """Rough job weight used to start big jobs first.
+
+    Encoding dominates, so the number of outputs counts most; source pixels
+    only break ties (a header read, no decode).
+    """
+    pixels = 0
+    for node in job.nodes:
+        if node.op == "decode":
+            size = header_size(node.params["path"])
+            if size is not None:
+                pixels += size[0] * size[1]
+    return (len(job.outputs), pixels)
+
+
+def build(graph, groups=None, dry_run=False, log=print, cache=None, workers=None, target=None,
+          max_memory=None, profile=False, trace_path=None, image_cache=None, sources=None,
+          draft=False):
+    """Build the outputs of groups (everything when None) and return stats.
+
+    With a BuildCache, outputs whose key is cached are never planned: the
+    nodes only they need are not decoded or computed at all. workers bounds
+    the process pool (CPU count by default, 1 runs everything in-process).
+    target (an SSIM) searches the quality of every lossy output instead of
+    using the manifest's; see quality.py. max_memory (bytes) turns on the
+    memory-bounded mode of memory.py. profile records every stage and logs
+    the slowest ones, trace_path also writes the spans; see trace.py.
+    image_cache is the (budget, spill directory) of the decoded-image cache
+    in the workers (imagecache.py); memory-bounded builds do not keep
+    decoded images around. sources (file paths) limits the build to the
+    outputs computed from those files, and draft writes them with the
+    fastest encoder settings, bypassing the cache (watch.py).
+    """
+    if draft:
+        cache, target = None, None
+    selected = graph.select(groups, sources)
+    if draft:
+        # a draft of a master rewritten in place would become the next build's source
+        masters = set(graph.source_paths())
+        selected = [o for o in selected if o.path not in masters]
+    hints = memory.decode_hints(graph.plan(selected), selected) if max_memory else {}
+    targeted = set()
+    if target is not None:
+        from . import quality
+        targeted = {id(o) for o in selected if quality.searchable(o)}
+    keys, qkeys, origins, hits = {}, {}, {}, []
+    if cache is not None:
+        cache.reset_signatures()
+        for out in selected:
+            reduced = memory.reductions(out.node, hints) if hints else None
+            if id(out) in targeted:
+                keys[id(out)] = cache.output_key(out, target, reduced)
+                qkeys[id(out)] = cache.quality_key(out, target, quality.METRIC)
+            else:
+                keys[id(out)] = cache.output_key(out, None, reduced)
+            origins[id(out)] = cache.origin_for(out)
+        hits = [o for o in selected if cache.lookup(keys[id(o)])]
+    hit_ids = set(map(id, hits))
+    outputs = [o for o in selected if id(o) not in hit_ids]
+    stats = {"outputs": 0, "cached": len(hits), "errors": 0, "decodes": 0, "transforms": 0,
+             "encodes": 0, "bytes": 0}
+
+    if dry_run:
+        log(graph.describe(outputs))
+        if hits:
+            log(f"\n{len(hits)} outputs up to date in the cache")
+        return stats
+
+    start = time.perf_counter()
+    jobs = graph.split(outputs)
+    profile = profile or trace_path is not None
+    budget = None
+    if max_memory:
+        image_cache = (0, None)
+        # This process counts against the ceiling too, and never more
+        # workers than the rest holds
+        budget = max(0, max_memory - (memory.rss() or 0))
+        workers = min(workers or default_workers(), max(1, budget // memory.WORKER_BYTES))
+        base = memory.WORKER_BYTES if workers > 1 else memory.rss() or 0
+    for job in jobs:
+        job.trace = profile
+        job.draft = draft
+        job.image_cache = image_cache
+        plan_crops(job, cache)
+        if max_memory:
+            job.decode_hints = {n.key: hints[n.key] for n in job.nodes if n.key in hints}
+            job.low_memory = True
+            job.base_memory = base
+        for i, out in enumerate(job.outputs):
+            if id(out) in targeted:
+                known = cache.quality(qkeys[id(out)]) if cache is not None else None
+                job.targets[i] = (target, known)
+    searched, events = [], []
+    decoded = dict.fromkeys(imagecache.COUNTERS, 0)
+    shared = graph.fanout(outputs)
+    # Masters rewritten in place get a copy, never a hard link (fanout.py)
+    masters = set(graph.source_paths())
+    fanned, written = dict.fromkeys(fanout.METHODS, 0), set()
+    stats["peak_rss"] = 0
+    for job, result, error in run_ordered(run_job, jobs, workers, priority=estimate_cost,
+                                          budget=budget, weight=job_memory,
+                                          fresh=bool(max_memory)):
+        if error is not None:
+            stats["errors"] += 1
+            log(f"  ❌ Error processing {job.label}: {error}")
+            continue
+        stats["decodes"] += result["decodes"]
+        stats["transforms"] += result["transforms"]
+        stats["encodes"] += result["encodes"]
+        stats["peak_rss"] = max(stats["peak_rss"], result["peak_rss"])
+        for k, v in result["image_cache"].items():
+            decoded[k] += v
+        if cache is not None:
+            for key, window in result["windows"].items():
+                cache.remember_crop(key, window)
+        for event in result["trace"]:
+            if "output" in event:
+                event["output"] = graph.relative(event["output"])
+            events.append(event)
+        if max_memory:
+            warn = "  ⚠️  over --max-memory" if result["peak_rss"] > max_memory else ""
+            log(f"  · {job.label}: peak RSS {memory.megabytes(result['peak_rss'])} "
+                f"(estimated {memory.megabytes(job_memory(job))}){warn}")
+        for out, (data, size, record) in zip(job.outputs, result["encoded"]):
+            if record is not None:
+                searched.append((graph.relative(out.path), record))
+                if cache is not None and record["searched"]:
+                    cache.remember_quality(qkeys[id(out)], record)
+            primary = shared.get(id(out))
+            like = primary.path if primary is not None and primary.path in written else None
+            hardlink = not {out.path, like} & masters
+            if cache is not None:
+                if like is None:
+                    cache.store(keys[id(out)], data)
+                method = cache.write(out.path, data, origins[id(out)], like, hardlink)
+            elif like is not None:
+                method = fanout.materialize(like, out.path, hardlink)
+            else:
+                write_file(out.path, data)
+                method = None
+            if method is not None:
+                fanned[method] += 1
+            written.add(out.path)
+            stats["outputs"] += 1
+            stats["bytes"] += len(data)
+            log(f"  ✓ {graph.relative(out.path)} ({size[0]}x{size[1]})")
+
+    # Restored only now: a hit may overwrite a file a miss above still had to decode.
+    restored = {}
+    for out in hits:
+        first_path = restored.setdefault(keys[id(out)], out.path)
+        like = first_path if first_path != out.path else None
+        if cache.restore(keys[id(out)], out.path, origins[id(out)], like, not {out.path, like} & masters):
+            log(f"  ↺ {graph.relative(out.path)} (restored from cache)")
+        record = cache.quality(qkeys[id(out)]) if id(out) in targeted else None
+        if record is not None:
+            size = cache.index["entries"][keys[id(out)]]["size"]
+            searched.append((graph.relative(out.path), {**record, "bytes": size, "searched": False}))
+
+    entries, saved = update_manifest(graph, selected) if not draft else ({}, 0)
+    if entries:
+        log(f"  ✓ {VARIANTS_MANIFEST} ({len(entries)} images, "
+            f"{saved / 1024:.0f} KB less with modern formats)")
+
+    stats["seconds"] = time.perf_counter() - start
+    log(f"\n{stats['outputs']} outputs from {stats['decodes']} decodes, {stats['transforms']} "
+        f"transforms and {stats['encodes']} encodes in {stats['seconds']:.2f}s")
+    stats["fanout"] = fanned
+    if fanout.summary(fanned):
+        log(fanout.summary(fanned))
+    if stats["peak_rss"]:
+        log(f"peak RSS of the largest job: {memory.megabytes(stats['peak_rss'])}")
+    if imagecache.summary(decoded):
+        log(imagecache.summary(decoded))
+    stats["image_cache"] = decoded
+    if searched:
+        from . import quality
+        quality.report(searched, log)
+    if profile:
+        trace.summary(events, log)
+    if trace_path is not None:
+        lines, chrome = trace.write(events, trace_path)
+        log(f"\ntrace: {lines} ({len(events)} spans), {chrome} (chrome://tracing)")
+    if stats["errors"]:
+        log(f"{stats['errors']} job(s) failed")
+    if cache is not None:
+        cache.prune()
+        cache.save()
+        log(cache.summary())
+    return stats
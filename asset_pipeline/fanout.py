@@ -0,0 +1,94 @@
+"""
+Output fan-out: one encode, several files.
+
+The site serves most icons and logos twice, at the root and under public/,
+from the same image with the same encoder settings. Outputs whose
+(node, format, save options) match share an encode key
+(Output.encode_key): the build encodes the first of them and materializes
+the bytes to the others, and `graph` shows them as "= <first output>".
+generate_icons.py, process_brand_assets.py and fix_logo_backgrounds.py use
+materialize() for their public/ copies the same way.
+
+materialize(src, dst) tries, in order:
+
+- a reflink (FICLONE), a copy-on-write clone on filesystems that have them
+  (Btrfs, XFS, bcachefs): no data is copied and the files stay independent;
+- a hard link, unless the caller forbids it: the two paths then share one
+  inode until either is replaced;
+- a plain copy.
+
+Files are always created under a temporary name and renamed over dst, and
+write_file() does the same, so rewriting one path never changes the other
+paths linked to its old inode. Masters rewritten in place (the logos) are
+never hard-linked: an editor saving over one in place would change the
+copy too.
+"""
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:  # not on Windows
+    fcntl = None
+
+FICLONE = 0x40049409  # linux/fs.h
+# Method -> (singular, plural) for the log, in the order materialize() tries them
+METHODS = {"reflink": ("reflink", "reflinks"), "hardlink": ("hard link", "hard links"),
+           "copy": ("copy", "copies")}
+
+
+def temporary(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return f"{path}.{os.getpid()}.tmp"
+
+
+def write_file(path, data):
+    """Write data to path through a rename, breaking any link to its old inode."""
+    tmp = temporary(path)
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def reflink(src, dst):
+    """Clone src to dst with FICLONE; False where the filesystem cannot."""
+    if fcntl is None:
+        return False
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+
+def materialize(src, dst, hardlink=True):
+    """Make dst hold src's bytes; returns the method used (see METHODS)."""
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return "hardlink"
+    tmp = temporary(dst)
+    if reflink(src, tmp):
+        method = "reflink"
+    else:
+        method = "copy"
+        if hardlink:
+            try:
+                os.link(src, tmp)
+                method = "hardlink"
+            except OSError:
+                pass
+        if method == "copy":
+            shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+    return method
+
+
+def summary(counts):
+    """Log line for {method: files materialized}, None when there were none."""
+    total = sum(counts.values())
+    if not total:
+        return None
+    parts = [f"{counts[m]} {names[counts[m] > 1]}" for m, names in METHODS.items() if counts.get(m)]
+    return f"fan-out: {total} encode{'s' if total > 1 else ''} saved ({', '.join(parts)})"
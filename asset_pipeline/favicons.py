@@ -0,0 +1,206 @@
+"""
+Favicon bundle: every icon a browser, a phone or an installed PWA asks
+for, from one master in one pass.
+
+generate_icons.py, process_brand_assets.py and the manifest's favicons
+group each resized the master to 16/32/48/64 and let Pillow resample the
+frames again inside its ICO writer, then encoded favicon-32x32.png and
+apple-touch-icon.png on their own. bundle():
+
+- takes every size from one SizePyramid of the square master, in linear
+  light up to LINEAR_UP_TO px, where linear.py's dark fringe shows most;
+- sharpens the tiny sizes with the unsharp mask of SHARPEN (LANCZOS alone
+  leaves a 16 px mark soft), on the colour only, so the alpha edge does
+  not ring;
+- encodes every PNG, the ICO frames included, on a thread pool (zlib and
+  most of pngopt's NumPy work release the GIL) with encoders.encode_png
+  and the PALETTE options, so the frames get the same SSIM-bounded palette
+  and lossless recompression as the manifest's icons;
+- packs the frames into favicon.ico itself as PNG entries (read by every
+  browser since IE9), with no second resample by Pillow;
+- with pwa, renders the PWA icons: plain ones, and maskable ones with the
+  light corners cleared (background.remove_background) and the tile scaled
+  to MASKABLE_SCALE over its own edge colour, so launchers can cut any
+  shape without losing the mark, and writes site.webmanifest listing them. They are opt-in until the set is published: the scripts
+  would otherwise write four unused icons on every run;
+- writes public/ copies of everything through fanout.materialize.
+
+encoders.encode_ico packs frames the same way, so the manifest's favicon.ico
+is the bundle's. benchmarks/favicons.py times the bundle against what the
+scripts did before.
+"""
+import json
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageFilter
+
+from .encoders import ICO_SIZES, encode_png
+from .fanout import materialize, write_file
+from .parallel import default_workers
+from .pyramid import SizePyramid
+
+LINEAR_UP_TO = 64
+# size -> (radius, percent) of the unsharp mask; larger sizes are left alone
+SHARPEN = {16: (0.6, 80), 32: (0.5, 60), 48: (0.5, 30)}
+# PNGs besides the ICO, name -> size
+PNG_ICONS = {"favicon-16x16.png": 16, "favicon-32x32.png": 32, "apple-touch-icon.png": 180}
+PWA_SIZES = [192, 512]
+# Share of a maskable icon the tile covers: its mark then stays inside the
+# safe zone (the centred circle of 80% diameter) whatever mask is applied
+MASKABLE_SCALE = 0.8
+# Same bound as the manifest's "palette" save preset
+PALETTE = {"quantize": {"min_ssim": 0.98}}
+WEB_MANIFEST = "site.webmanifest"
+APP = {
+    "name": "TechTrust AutoSolutions",
+    "short_name": "TechTrust",
+    "start_url": "/",
+    "display": "standalone",
+    "background_color": "#0b1220",
+    "theme_color": "#0b1220",
+}
+
+
+def pwa_name(size, maskable=False):
+    return f"icon-{'maskable-' if maskable else ''}{size}.png"
+
+
+def make_square(img):
+    """Make image perfectly square with transparent padding."""
+    size = max(img.size)
+    square = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    offset = ((size - img.width) // 2, (size - img.height) // 2)
+    square.paste(img, offset, img)
+    return square
+
+
+def sharpen(img, size):
+    """img with the unsharp mask SHARPEN gives size (alpha untouched)."""
+    if size not in SHARPEN:
+        return img
+    radius, percent = SHARPEN[size]
+    if "A" not in img.getbands():
+        return img.filter(ImageFilter.UnsharpMask(radius, percent, 0))
+    sharp = img.convert("RGB").filter(ImageFilter.UnsharpMask(radius, percent, 0))
+    sharp.putalpha(img.getchannel("A"))
+    return sharp
+
+
+def frame(pyramid, size):
+    """The size x size icon: linear light when small, sharpened when tiny."""
+    from .linear import resample
+    return sharpen(resample(pyramid, (size, size), size <= LINEAR_UP_TO), size)
+
+
+def edge_colour(img):
+    """Median colour of the opaque pixels on the border of img's bounding box."""
+    import numpy as np
+    left, top, right, bottom = img.getbbox()
+    arr = np.asarray(img)[top:bottom, left:right]
+    border = np.concatenate([arr[0], arr[-1], arr[:, 0], arr[:, -1]])
+    opaque = border[border[:, 3] == 255]
+    if not len(opaque):
+        opaque = border
+    return tuple(int(c) for c in np.median(opaque[:, :3], axis=0))
+
+
+def maskable_tile(pyramid):
+    """(tile, background): the master with its light corners cleared, and
+    its edge colour."""
+    from .background import remove_background
+    master = pyramid.master if isinstance(pyramid, SizePyramid) else pyramid
+    tile = remove_background(master)
+    # One pixel in from the cut, so its light antialiased rim does not show
+    tile.putalpha(tile.getchannel("A").filter(ImageFilter.MinFilter(3)))
+    return tile, edge_colour(tile)
+
+
+def maskable(tile, background, size):
+    """Opaque size x size maskable icon: tile at MASKABLE_SCALE over background."""
+    inner = round(size * MASKABLE_SCALE)
+    canvas = Image.new("RGBA", (size, size), background + (255,))
+    offset = (size - inner) // 2
+    canvas.alpha_composite(tile.resize((inner, inner), Image.LANCZOS), (offset, offset))
+    return canvas.convert("RGB")
+
+
+def pack_ico(frames):
+    """ICO file of {size: PNG bytes}, PNG entries in ascending size."""
+    sizes = sorted(frames)
+    header = struct.pack("<HHH", 0, 1, len(sizes))
+    offset = len(header) + 16 * len(sizes)
+    directory, data = [], []
+    for size in sizes:
+        png = frames[size]
+        side = 0 if size >= 256 else size  # 0 means 256 in the directory
+        directory.append(struct.pack("<BBBBHHII", side, side, 0, 0, 1, 32, len(png), offset))
+        data.append(png)
+        offset += len(png)
+    return header + b"".join(directory) + b"".join(data)
+
+
+def encode_all(images, workers=None):
+    """{name: bytes} of {name: (image, encode_png options)}, encoded concurrently."""
+    workers = min(workers or default_workers(), len(images)) or 1
+    if workers == 1:
+        return {name: encode_png(img, **options) for name, (img, options) in images.items()}
+    # Largest first, so the slow encodes start early
+    order = sorted(images, key=lambda name: images[name][0].width * images[name][0].height, reverse=True)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {name: pool.submit(encode_png, images[name][0], **images[name][1]) for name in order}
+        return {name: futures[name].result() for name in images}
+
+
+def ico_bytes(img, sizes=ICO_SIZES, workers=None):
+    """favicon.ico of img (an Image or SizePyramid) at sizes."""
+    pyramid = img if isinstance(img, SizePyramid) else SizePyramid(img)
+    encoded = encode_all({s: (frame(pyramid, s), PALETTE) for s in sizes}, workers)
+    return pack_ico(encoded)
+
+
+def web_manifest(sizes=PWA_SIZES):
+    icons = [{"src": f"/{pwa_name(s)}", "sizes": f"{s}x{s}", "type": "image/png"} for s in sizes]
+    icons += [{"src": f"/{pwa_name(s, True)}", "sizes": f"{s}x{s}", "type": "image/png",
+               "purpose": "maskable"} for s in sizes]
+    return json.dumps({**APP, "icons": icons}, indent=2, ensure_ascii=False) + "\n"
+
+
+def bundle(master, base, public=True, workers=None, pwa=False, log=print):
+    """Write favicon.ico, PNG_ICONS and, with pwa, the PWA icons and
+    WEB_MANIFEST under base (and copies under base/public); returns
+    {name: bytes written}."""
+    pyramid = master if isinstance(master, SizePyramid) else SizePyramid(master)
+    pwa_sizes = PWA_SIZES if pwa else []
+    if pwa_sizes and max(pwa_sizes) > min(pyramid.size):
+        log(f"  ⚠️  PWA icons up to {max(pwa_sizes)}px from a {min(pyramid.size)}px master (upscaled)")
+    # Every size is rendered and encoded once, whichever files use it
+    sizes = sorted({*ICO_SIZES, *PNG_ICONS.values(), *pwa_sizes})
+    images = {s: (frame(pyramid, s), PALETTE) for s in sizes}
+    if pwa_sizes:
+        tile, background = maskable_tile(pyramid)
+        images.update({("maskable", s): (maskable(tile, background, s), PALETTE) for s in pwa_sizes})
+    encoded = encode_all(images, workers)
+
+    files = {"favicon.ico": pack_ico({s: encoded[s] for s in ICO_SIZES})}
+    files.update({name: encoded[s] for name, s in PNG_ICONS.items()})
+    for s in pwa_sizes:
+        files[pwa_name(s)] = encoded[s]
+        files[pwa_name(s, True)] = encoded[("maskable", s)]
+    if pwa_sizes:
+        files[WEB_MANIFEST] = web_manifest(pwa_sizes).encode("utf-8")
+    labels = {"favicon.ico": ", ".join(f"{s}x{s}" for s in ICO_SIZES),
+              WEB_MANIFEST: f"{len(PWA_SIZES) * 2} icons"}
+    labels.update({name: f"{s}x{s}" for name, s in PNG_ICONS.items()})
+    labels.update({pwa_name(s): f"{s}x{s}" for s in PWA_SIZES})
+    labels.update({pwa_name(s, True): f"{s}x{s} maskable" for s in PWA_SIZES})
+    for name, data in files.items():
+        write_file(os.path.join(base, name), data)
+        log(f"  ✓ {name} ({labels[name]}, {len(data) / 1024:.1f} KB)")
+    if public:
+        for name in files:
+            method = materialize(os.path.join(base, name), os.path.join(base, "public", name))
+            log(f"  ✓ public/{name} ({method})")
+    return {name: len(data) for name, data in files.items()}
+
@@ -0,0 +1,176 @@
+"""
+Content-hashed asset names, so images can be cached for a year.
+
+The pipeline writes fixed names (botao-pequeno.png, logo-horizontal-300w.png,
+hero-brand-desktop.jpg), which a CDN or browser may only cache as long as
+it is willing to serve a stale file. fingerprint():
+
+- finds every image the pages reference (the references site.py scans:
+  <img> src/srcset, <source> srcset, <link> icons, <meta> images, inline
+  style url()s and the url()s of local stylesheets) and every file listed
+  in image-variants.json;
+- copies each one to <stem>.<hash><ext> next to it, hash being the first
+  HASH_LENGTH hex digits of its content's SHA-256 (an existing copy is the
+  same bytes, so it is left alone);
+- writes asset-manifest.json, {logical URL: hashed URL}, e.g.
+  "/botao-pequeno.png": "/botao-pequeno.3f2a9c1b.png";
+- rewrites the references in the pages and stylesheets to the hashed URLs
+  (absolute or relative, as they were written, keeping any query or
+  fragment); nothing else in the files changes;
+- removes the hashed copies of the previous run that are no longer used.
+
+The fixed names stay where they are: they are still what the scripts,
+the manifest and the build cache work with, and what old links point to.
+Pages already rewritten are understood through the previous
+asset-manifest.json, so running it again after a build only swaps the
+hashes of the images that changed.
+
+vercel.json and nginx.conf serve names matching HASHED with
+Cache-Control: public, max-age=31536000, immutable; pages keep the default
+revalidation, so a new deploy is seen at once and unchanged images are
+never requested again.
+"""
+import json
+import os
+import re
+from urllib.parse import quote, urlsplit, urlunsplit
+
+from . import ASSET_MANIFEST, VARIANTS_MANIFEST
+from .cache import sha256
+from .fanout import materialize
+from .site import CSS_URL, ReferenceParser, find_pages, is_image, local_path
+from .variants import load_variants
+
+HASH_LENGTH = 8
+HASHED = re.compile(r"\.[0-9a-f]{%d}\.[^./]+$" % HASH_LENGTH)
+# Characters a URL can sit between in an attribute, a srcset or a url()
+BEFORE, AFTER = r"(?<=[\s\"'(,=])", r"(?=[\s\"'),])"
+
+
+def hashed_name(path, digest):
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def url_of(path, base):
+    return "/" + os.path.relpath(path, base).replace(os.sep, "/")
+
+
+def path_of(url, base):
+    return os.path.join(base, *url.lstrip("/").split("/"))
+
+
+def documents(base, pages):
+    """{page or stylesheet: [URL as written]} of the images they reference."""
+    found = {}
+    for page in pages:
+        parser = ReferenceParser()
+        with open(page, encoding="utf-8") as f:
+            parser.feed(f.read())
+        found[page] = [url for url, _ in parser.found]
+        for href in parser.stylesheets:
+            css = local_path(href, page, base)
+            if css and os.path.exists(css) and css not in found:
+                with open(css, encoding="utf-8") as f:
+                    found[css] = CSS_URL.findall(f.read())
+    return found
+
+
+def write_copy(path, target):
+    """Copy path to target unless it is there already; True when written.
+
+    Never a hard link: the scripts save over the fixed names in place, which
+    would change an immutable copy sharing their inode.
+    """
+    if os.path.exists(target):
+        return False
+    materialize(path, target, hardlink=False)
+    return True
+
+
+def rewrite(text, replacements):
+    """text with every URL in replacements swapped where it stands alone."""
+    if not replacements:
+        return text
+    alternatives = "|".join(re.escape(u) for u in sorted(replacements, key=len, reverse=True))
+    return re.sub(f"{BEFORE}({alternatives}){AFTER}", lambda m: replacements[m.group(1)], text)
+
+
+def fingerprint(base, pages=None, dry_run=False, log=print):
+    """Hash, copy and rewrite the images of the pages under base; returns
+    {"assets", "written", "rewritten", "removed"}."""
+    base = os.path.abspath(base)
+    pages = pages or find_pages(base)
+    manifest_path = os.path.join(base, ASSET_MANIFEST)
+    previous = load_variants(manifest_path)
+    # Hashed URL of the previous run -> the logical URL it stands for
+    logical = {hashed: url for url, hashed in previous.items()}
+    assets, written, missing = {}, 0, set()
+
+    def hashed_url(url):
+        """Hashed URL of a logical one, copying the file the first time."""
+        nonlocal written
+        if url not in assets:
+            path = path_of(url, base)
+            if not os.path.isfile(path):
+                missing.add(url)
+                return None
+            with open(path, "rb") as f:
+                target = hashed_name(path, sha256(f.read()))
+            assets[url] = url_of(target, base)
+            if not dry_run and write_copy(path, target):
+                written += 1
+        return assets.get(url)
+
+    found = documents(base, pages)
+    changes = {}
+    for doc, urls in found.items():
+        replacements = {}
+        for raw in set(urls):
+            path = local_path(raw, doc, base)
+            if path is None or not is_image(path) or not path.startswith(base + os.sep):
+                continue
+            url = url_of(path, base)
+            new = hashed_url(logical.get(url, url))
+            if new is None:
+                continue
+            parts = urlsplit(raw.strip())
+            if not parts.path.startswith("/"):
+                new = os.path.relpath(path_of(new, base), os.path.dirname(doc)).replace(os.sep, "/")
+            target = quote(new, safe="/@")
+            replaced = urlunsplit(("", "", target, parts.query, parts.fragment))
+            if replaced != raw:
+                replacements[raw] = replaced
+        if replacements:
+            changes[doc] = replacements
+
+    for entry in load_variants(os.path.join(base, VARIANTS_MANIFEST)).values():
+        for image in [entry["fallback"], *entry["sources"]]:
+            for url in [u for u, _ in image.get("srcset", [])] or [image["url"]]:
+                hashed_url(url)
+
+    for url in sorted(missing):
+        log(f"  ⚠️  {url} is referenced but does not exist")
+    for doc, replacements in sorted(changes.items()):
+        log(f"  ✓ {os.path.relpath(doc, base)}: {len(replacements)} references")
+
+    removed = [h for h in set(previous.values()) - set(assets.values())
+               if HASHED.search(h) and os.path.exists(path_of(h, base))]
+    if dry_run:
+        for url, hashed in sorted(assets.items()):
+            log(f"  {url} -> {hashed}")
+        return {"assets": len(assets), "written": 0, "rewritten": len(changes), "removed": 0}
+
+    for doc, replacements in changes.items():
+        with open(doc, encoding="utf-8") as f:
+            text = f.read()
+        with open(doc, "w", encoding="utf-8") as f:
+            f.write(rewrite(text, replacements))
+    for url in removed:
+        os.remove(path_of(url, base))
+    data = json.dumps(dict(sorted(assets.items())), indent=2, ensure_ascii=False)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        f.write(data + "\n")
+    log(f"\n{len(assets)} assets fingerprinted ({written} new copies, {len(removed)} stale removed), "
+        f"{len(changes)} files rewritten, {ASSET_MANIFEST} updated")
+    return {"assets": len(assets), "written": written, "rewritten": len(changes), "removed": len(removed)}
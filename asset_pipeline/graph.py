@@ -0,0 +1,270 @@
+"""
+Dependency graph of decode/transform nodes and the outputs hanging off them.
+
+Nodes are keyed on (op, params, inputs), so two outputs asking for the same
+work on the same input end up sharing one node and one computed image.
+"""
+import hashlib
+import json
+import os
+
+
+class Node:
+    """One unit of work: decode a file or apply a transform to other nodes."""
+
+    def __init__(self, key, op, params, inputs, label):
+        self.key = key
+        self.op = op
+        self.params = params
+        self.inputs = inputs
+        self.label = label
+        self.outputs = []
+
+    def __repr__(self):
+        return f"<Node {self.label}>"
+
+
+class Output:
+    """A file written from a node's image with a given encoder."""
+
+    def __init__(self, path, node, format, save, group, variant_of=None, breakpoint_of=None, width=None):
+        self.path = path
+        self.node = node
+        self.format = format
+        self.save = save
+        self.group = group
+        self.variant_of = variant_of
+        self.breakpoint_of = breakpoint_of
+        self.width = width
+        self.sizes = None
+
+    @property
+    def encode_key(self):
+        """Outputs with equal keys encode to the same bytes (see fanout.py)."""
+        return (self.node.key, self.format, json.dumps(self.save, sort_keys=True))
+
+    def __repr__(self):
+        return f"<Output {self.path}>"
+
+
+class Job:
+    """Slice of a plan that shares no nodes and no files with other jobs."""
+
+    def __init__(self, nodes, outputs):
+        self.nodes = nodes
+        self.outputs = outputs
+        # output index -> (target SSIM, remembered quality record or None)
+        self.targets = {}
+        # decode node key -> reduction factor, see memory.py
+        self.decode_hints = {}
+        self.low_memory = False
+        # RSS of the process the job starts in, counted in its estimate
+        self.base_memory = 0
+        # record trace spans, see trace.py
+        self.trace = False
+        # (budget, spill directory) for the decoded-image cache of the
+        # process running the job, see imagecache.py; None keeps it as is
+        self.image_cache = None
+        # encode with encoders.DRAFT_OPTIONS, see watch.py
+        self.draft = False
+        # node key -> smart-crop window key, window key -> window (known
+        # ones from the cache, the rest found by the job), see smartcrop.py
+        self.crops = {}
+        self.windows = {}
+
+    @property
+    def label(self):
+        return self.nodes[0].label
+
+    def __repr__(self):
+        return f"<Job {self.label}: {len(self.outputs)} outputs>"
+
+
+def node_key(op, params, inputs):
+    raw = json.dumps([op, params, [n.key for n in inputs]], sort_keys=True)
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+def describe_params(params):
+    return ", ".join(f"{k}={v}" for k, v in sorted(params.items()))
+
+
+class Graph:
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self.nodes = {}
+        self.outputs = []
+
+    def add(self, op, params=None, inputs=(), label=None):
+        """Return the node for this piece of work, creating it only once."""
+        params = params or {}
+        inputs = list(inputs)
+        key = node_key(op, params, inputs)
+        node = self.nodes.get(key)
+        if node is None:
+            if label is None:
+                label = f"{op}({describe_params(params)})" if params else op
+            node = Node(key, op, params, inputs, label)
+            self.nodes[key] = node
+        return node
+
+    def decode(self, path):
+        path = self.resolve(path)
+        return self.add("decode", {"path": path}, label=self.relative(path))
+
+    def add_output(self, path, node, format, save=None, group=None, variant_of=None,
+                   breakpoint_of=None, width=None):
+        out = Output(self.resolve(path), node, format, save or {}, group, variant_of,
+                     breakpoint_of, width)
+        node.outputs.append(out)
+        self.outputs.append(out)
+        return out
+
+    def resolve(self, path):
+        return os.path.normpath(os.path.join(self.base_dir, path))
+
+    def relative(self, path):
+        return os.path.relpath(path, self.base_dir)
+
+    def groups(self):
+        return sorted({o.group for o in self.outputs if o.group})
+
+    def select(self, groups=None, sources=None):
+        """Outputs belonging to any of groups (all outputs when None) and,
+        when sources is given, reading at least one of those files."""
+        found = list(self.outputs)
+        if groups:
+            unknown = set(groups) - set(self.groups())
+            if unknown:
+                raise ValueError(f"Unknown group(s): {', '.join(sorted(unknown))}")
+            found = [o for o in found if o.group in groups]
+        if sources is not None:
+            sources = {self.resolve(p) for p in sources}
+            found = [o for o in found if sources & self.sources_of(o.node)]
+        return found
+
+    def sources_of(self, node):
+        """Paths of the files node's image is computed from."""
+        if node.op == "decode":
+            return {node.params["path"]}
+        return set().union(*(self.sources_of(dep) for dep in node.inputs))
+
+    def source_paths(self):
+        return sorted(n.params["path"] for n in self.nodes.values() if n.op == "decode")
+
+    def plan(self, outputs):
+        """Topologically ordered nodes needed to produce outputs.
+
+        Sources that are also written by this build (logo-vertical.png has its
+        background removed in place) are decoded before anything else runs, so
+        no consumer ever reads a file this build has already overwritten.
+        """
+        order, seen = [], set()
+
+        def visit(node):
+            if node.key in seen:
+                return
+            seen.add(node.key)
+            for dep in node.inputs:
+                visit(dep)
+            order.append(node)
+
+        for out in outputs:
+            visit(out.node)
+
+        written = {o.path for o in outputs}
+        first = [n for n in order if n.op == "decode" and n.params["path"] in written]
+        return first + [n for n in order if n not in first]
+
+    def split(self, outputs):
+        """Independent jobs covering outputs, in the order outputs are listed.
+
+        Nodes are grouped with their inputs, and a source is grouped with any
+        output that overwrites it, so jobs can run in separate processes.
+        """
+        nodes = self.plan(outputs)
+        parent = {n.key: n.key for n in nodes}
+
+        def find(k):
+            while parent[k] != k:
+                parent[k] = parent[parent[k]]
+                k = parent[k]
+            return k
+
+        def union(a, b):
+            parent[find(a)] = find(b)
+
+        decoders = {n.params["path"]: n for n in nodes if n.op == "decode"}
+        for n in nodes:
+            for dep in n.inputs:
+                union(n.key, dep.key)
+        for out in outputs:
+            if out.path in decoders:
+                union(out.node.key, decoders[out.path].key)
+
+        jobs = {}
+        for out in outputs:
+            jobs.setdefault(find(out.node.key), ([], []))[1].append(out)
+        for n in nodes:
+            jobs[find(n.key)][0].append(n)
+        return [Job(ns, outs) for ns, outs in jobs.values()]
+
+    def fanout(self, outputs):
+        """{id(output): earlier output it can be materialized from} for the
+        outputs of outputs whose encode another one already does."""
+        first, shared = {}, {}
+        for out in outputs:
+            primary = first.setdefault(out.encode_key, out)
+            if primary is not out:
+                shared[id(out)] = primary
+        return shared
+
+    def consumers(self, nodes):
+        """How many times each node's image is still needed within nodes."""
+        counts = {n.key: 0 for n in nodes}
+        for n in nodes:
+            for dep in n.inputs:
+                counts[dep.key] += 1
+        return counts
+
+    def describe(self, outputs=None):
+        """Human readable listing of the plan, one node per line."""
+        outputs = self.outputs if outputs is None else outputs
+        wanted = set(map(id, outputs))
+        nodes = self.plan(outputs)
+        index = {n.key: i for i, n in enumerate(nodes)}
+        uses = self.consumers(nodes)
+        shared = self.fanout(outputs)
+        lines = []
+        for i, n in enumerate(nodes):
+            deps = ",".join(str(index[d.key]) for d in n.inputs)
+            line = f"[{i:>3}] {n.label}"
+            if deps:
+                line += f"  <- [{deps}]"
+            users = uses[n.key] + sum(1 for o in n.outputs if id(o) in wanted)
+            if users > 1:
+                line += f"  (shared x{users})"
+            lines.append(line)
+            for o in n.outputs:
+                if id(o) in wanted:
+                    same = f" = {self.relative(shared[id(o)].path)}" if id(o) in shared else ""
+                    lines.append(f"        -> {self.relative(o.path)} [{o.format}]{same}")
+        return "\n".join(lines)
+
+    def to_dot(self, outputs=None):
+        """Graphviz rendering of the plan (`dot -Tsvg`)."""
+        outputs = self.outputs if outputs is None else outputs
+        wanted = set(map(id, outputs))
+        lines = ["digraph assets {", "  rankdir=LR;", "  node [fontsize=10];"]
+        for n in self.plan(outputs):
+            shape = "folder" if n.op == "decode" else "box"
+            lines.append(f'  "{n.key}" [label="{n.label}", shape={shape}];')
+            for dep in n.inputs:
+                lines.append(f'  "{dep.key}" -> "{n.key}";')
+            for o in n.outputs:
+                if id(o) in wanted:
+                    name = self.relative(o.path)
+                    lines.append(f'  "{name}" [shape=note];')
+                    lines.append(f'  "{n.key}" -> "{name}";')
+        lines.append("}")
+        return "\n".join(lines)
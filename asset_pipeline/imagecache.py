@@ -0,0 +1,207 @@
+"""
+In-process cache of decoded images, bounded by bytes with LRU eviction.
+
+The scripts and the build decode the same masters over and over
+(botao-pequeno@2x.png for every icon variant, the logos for every size).
+open_image(path, mode) decodes a file once per process: the key is the
+file's real path, mtime, size and the mode it is converted to, so a file
+rewritten in place (the logos) is decoded again.
+
+Returned images are shared between callers and must be treated as
+read-only (copy() before drawing on one). Pillow operations such as
+convert/resize/crop already return new images.
+
+With a spill directory, decoded pixels are also written there as raw
+files (<key>.raw with a small header). A miss in memory then maps the
+file instead of decoding, so worker processes (and later builds) share
+the pixels of a master through the page cache, and entries evicted from
+memory stay one mmap away. Pillow maps L, RGBA, RGBX, CMYK, I and F
+buffers zero-copy; other modes are copied out of the mapping, which still
+skips the decode. Only pixels are spilled (not palettes or info).
+
+A master that changes gets a new key, so its old spill file is never read
+again. Mapping a spill file touches its mtime, and prune() removes the
+least recently used files until the directory fits a byte budget
+(DEFAULT_SPILL_SIZE; after a build that spills, and `cache prune`);
+clear() (`cache clear`) removes them all.
+
+stats() returns the hit/miss/eviction counters, which the build adds to
+its summary.
+"""
+import hashlib
+import mmap
+import os
+import struct
+from collections import OrderedDict
+
+from PIL import Image
+
+from . import DEFAULT_BUDGET, DEFAULT_SPILL_SIZE
+
+MAGIC = b"PXL1"
+HEADER = struct.Struct(">4s8sII")  # magic, mode, width, height
+COUNTERS = ("hits", "spill_hits", "misses", "evictions", "spilled")
+# Modes whose pixels alone describe the image (P needs its palette)
+SPILL_MODES = {"1", "L", "LA", "I", "F", "RGB", "RGBA", "RGBX", "CMYK"}
+
+
+def image_bytes(img):
+    return img.width * img.height * Image.getmodebands(img.mode)
+
+
+class ImageCache:
+    def __init__(self, budget=DEFAULT_BUDGET, spill_dir=None):
+        self.budget = budget
+        self.spill_dir = spill_dir
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def key(self, path, mode):
+        path = os.path.realpath(path)
+        st = os.stat(path)
+        raw = f"{path}\0{st.st_mtime_ns}\0{st.st_size}\0{mode or ''}"
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, path, mode=None):
+        """Decoded (and converted to mode) image of path, shared and read-only."""
+        key = self.key(path, mode)
+        img = self.entries.get(key)
+        if img is not None:
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return img
+        img = self.load_spilled(key)
+        if img is not None:
+            self.counters["spill_hits"] += 1
+        else:
+            self.counters["misses"] += 1
+            img = Image.open(path)
+            img.load()
+            if mode is not None and img.mode != mode:
+                img = img.convert(mode)
+            self.spill(key, img)
+        self.insert(key, img)
+        return img
+
+    def insert(self, key, img):
+        size = image_bytes(img)
+        if size > self.budget:
+            return
+        self.entries[key] = img
+        self.bytes += size
+        while self.bytes > self.budget:
+            _, old = self.entries.popitem(last=False)
+            self.bytes -= image_bytes(old)
+            self.counters["evictions"] += 1
+
+    def spill_path(self, key):
+        return os.path.join(self.spill_dir, key[:2], key + ".raw")
+
+    def spill(self, key, img):
+        if self.spill_dir is None or img.mode not in SPILL_MODES:
+            return
+        path = self.spill_path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, img.mode.encode(), img.width, img.height))
+            f.write(img.tobytes())
+        os.replace(tmp, path)
+        self.counters["spilled"] += 1
+
+    def load_spilled(self, key):
+        """Image backed by a read-only mapping of key's spill file, or None."""
+        if self.spill_dir is None:
+            return None
+        path = self.spill_path(key)
+        try:
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            os.utime(path)  # recently used, for prune()
+        except (OSError, ValueError):
+            return None
+        magic, mode, width, height = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            return None
+        mode = mode.rstrip(b"\0").decode()
+        pixels = memoryview(mapped)[HEADER.size:]
+        return Image.frombuffer(mode, (width, height), pixels, "raw", mode, 0, 1)
+
+    def spilled(self):
+        """(mtime, size, path) of every spill file."""
+        found = []
+        if self.spill_dir and os.path.isdir(self.spill_dir):
+            for root, _, files in os.walk(self.spill_dir):
+                for name in files:
+                    if name.endswith(".raw"):
+                        path = os.path.join(root, name)
+                        try:
+                            st = os.stat(path)
+                        except FileNotFoundError:
+                            continue
+                        found.append((st.st_mtime, st.st_size, path))
+        return found
+
+    def prune(self, max_size=DEFAULT_SPILL_SIZE):
+        """Remove the least recently used spill files until they fit
+        max_size bytes; returns the number removed."""
+        files = sorted(self.spilled())
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in files:
+            if total <= max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        """Drop every entry and spill file; returns the number of spill files removed."""
+        self.entries.clear()
+        self.bytes = 0
+        removed = 0
+        if self.spill_dir and os.path.isdir(self.spill_dir):
+            for root, _, files in os.walk(self.spill_dir):
+                for name in files:
+                    os.remove(os.path.join(root, name))
+                    removed += 1
+        return removed
+
+    def stats(self):
+        return {**self.counters, "entries": len(self.entries), "bytes": self.bytes}
+
+
+_shared = ImageCache()
+
+
+def shared():
+    """The process-wide cache open_image() uses."""
+    return _shared
+
+
+def configure(budget=DEFAULT_BUDGET, spill_dir=None):
+    """Replace the process-wide cache when the settings differ (a new cache
+    starts empty, with its counters at zero)."""
+    global _shared
+    if (budget, spill_dir) != (_shared.budget, _shared.spill_dir):
+        _shared = ImageCache(budget, spill_dir)
+    return _shared
+
+
+def open_image(path, mode=None):
+    return _shared.get(path, mode)
+
+
+def summary(stats):
+    looked = stats["hits"] + stats["spill_hits"] + stats["misses"]
+    if not looked:
+        return None
+    return (f"image cache: {stats['hits']} hits, {stats['spill_hits']} mapped from spill, "
+            f"{stats['misses']} decodes, {stats['evictions']} evictions")
@@ -0,0 +1,102 @@
+"""
+Image sizes read from file headers, without Pillow.
+
+Planning a build (graph, build -n, the breakpoint ladders and the memory
+estimates) only needs each source's width and height. Opening the file
+with Pillow for that imports PIL.Image and its format plugins, which took
+most of `python -m asset_pipeline graph`. header_size() reads the few
+bytes that hold the size in PNG, JPEG, GIF and WebP files and falls back
+to Pillow (imported then) for anything else. The size is the one Pillow
+reports: the stored one, before any EXIF orientation.
+"""
+import struct
+
+# JPEG start-of-frame markers (SOF0-SOF15 without DHT, JPG and DAC)
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field
+STANDALONE = set(range(0xD0, 0xDA)) | {0x01}
+
+
+def png_size(f, head):
+    if head[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", head[16:24])
+
+
+def gif_size(f, head):
+    return struct.unpack("<HH", head[6:10])
+
+
+def webp_size(f, head):
+    chunk = head[12:16]
+    if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+        w, h = struct.unpack("<HH", head[26:30])
+        return w & 0x3FFF, h & 0x3FFF
+    if chunk == b"VP8L" and head[20] == 0x2F:
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        return (int.from_bytes(head[24:27], "little") + 1,
+                int.from_bytes(head[27:30], "little") + 1)
+    return None
+
+
+def jpeg_size(f, head):
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = f.read(1)
+        while marker == b"\xff":  # fill bytes
+            marker = f.read(1)
+        if not marker:
+            return None
+        marker = marker[0]
+        if marker in STANDALONE:
+            continue
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        length = struct.unpack(">H", length)[0]
+        if marker in SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack(">HH", data[1:5])
+            return width, height
+        f.seek(length - 2, 1)
+
+
+def sniff(head):
+    """The size reader for the format head starts, or None."""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return png_size
+    if head.startswith(b"\xff\xd8"):
+        return jpeg_size
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return gif_size
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return webp_size
+    return None
+
+
+def header_size(path):
+    """(width, height) of the image at path, or None when it cannot be read."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(32)
+            reader = sniff(head)
+            size = reader(f, head) if reader is not None and len(head) >= 30 else None
+    except (OSError, struct.error, IndexError):
+        return None
+    if size is not None:
+        return tuple(size)
+    from PIL import Image  # other formats (and damaged headers): ask Pillow
+    try:
+        with Image.open(path) as im:
+            return im.size
+    except OSError:
+        return None
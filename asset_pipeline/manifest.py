@@ -0,0 +1,155 @@
+"""
+Load asset-pipeline.json into a Graph.
+
+The manifest has three sections:
+
+    "sources":    name -> {"path": ..., "mode": "RGBA"}
+    "transforms": name -> {"input": name, "op": ..., <params>}
+    "outputs":    [{"path": ..., "input": name, "op": ..., <params>,
+                    "format": "png", "save": {...}, "group": ...,
+                    "variants": ...}]
+
+Sources and transforms share one namespace. Any key that is not reserved is
+passed to the op as a parameter. An output's own op is optional; without it
+the input image is encoded as is.
+
+"variants" re-encodes the same image in other formats next to the output
+(same stem, the format's extension). It is the name of an entry in the
+optional "variant_presets" section, a list of formats, or a dict of
+format -> encoder options. Formats this Pillow cannot write (AVIF on older
+builds) are skipped, and so is the output's own format.
+
+"save" holds encoder options, or names an entry of the optional
+"save_presets" section (e.g. "palette": {"quantize": {...}} for the PNG
+palette quantization of pngopt.py).
+
+"breakpoints" names an entry of "breakpoint_presets" ({"widths": [...],
+"densities": [1, 2], "sizes": "100vw"}) and renders the output again at
+every width of the ladder; see breakpoints.py.
+"""
+import json
+import os
+
+from . import breakpoints
+from .encoders import ENCODERS, EXTENSIONS as FORMAT_EXTENSIONS, available
+from .graph import Graph
+from .ops import OPS
+
+TRANSFORM_KEYS = {"input", "op"}
+OUTPUT_KEYS = {"path", "input", "op", "format", "save", "group", "variants", "breakpoints"}
+EXTENSIONS = {".png": "png", ".jpg": "jpeg", ".jpeg": "jpeg", ".ico": "ico"}
+
+
+def load_manifest(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return build_graph(data, os.path.dirname(os.path.abspath(path)))
+
+
+def build_graph(data, base_dir):
+    graph = Graph(base_dir)
+    sources = data.get("sources", {})
+    transforms = data.get("transforms", {})
+    clash = set(sources) & set(transforms)
+    if clash:
+        raise ValueError(f"Names used as both source and transform: {', '.join(sorted(clash))}")
+
+    resolved = {}
+    resolving = set()
+
+    def resolve(name):
+        if name in resolved:
+            return resolved[name]
+        if name in sources:
+            spec = sources[name]
+            node = graph.decode(spec["path"])
+            if spec.get("mode"):
+                node = graph.add("convert", {"mode": spec["mode"]}, [node], label=name)
+        elif name in transforms:
+            if name in resolving:
+                raise ValueError(f"Transform cycle through '{name}'")
+            resolving.add(name)
+            spec = transforms[name]
+            node = transform(resolve(spec["input"]), spec, TRANSFORM_KEYS, name)
+            resolving.discard(name)
+        else:
+            raise ValueError(f"Unknown source or transform '{name}'")
+        resolved[name] = node
+        return node
+
+    def transform(node, spec, reserved, label=None):
+        op = spec.get("op")
+        if op is None:
+            return node
+        if op not in OPS:
+            raise ValueError(f"Unknown op '{op}'")
+        params = {k: v for k, v in spec.items() if k not in reserved}
+        return graph.add(op, params, [node], label=label)
+
+    presets = data.get("variant_presets", {})
+    save_presets = data.get("save_presets", {})
+    ladders = data.get("breakpoint_presets", {})
+    for spec in data.get("outputs", []):
+        source = resolve(spec["input"])
+        node = transform(source, spec, OUTPUT_KEYS)
+        stem, ext = os.path.splitext(spec["path"])
+        fmt = spec.get("format") or EXTENSIONS.get(ext.lower())
+        if fmt not in ENCODERS:
+            raise ValueError(f"No encoder for {spec['path']}")
+        variants = variant_formats(spec.get("variants"), presets, spec["path"])
+        save = save_options(spec.get("save"), save_presets, spec["path"])
+
+        def add(path, node, **kw):
+            out = graph.add_output(path, node, fmt, save, spec.get("group"), **kw)
+            base = os.path.splitext(path)[0]
+            for vfmt, options in variants:
+                if vfmt != fmt and available(vfmt):
+                    graph.add_output(base + FORMAT_EXTENSIONS[vfmt], node, vfmt, options,
+                                     spec.get("group"), variant_of=out, width=out.width)
+            return out
+
+        primary = add(spec["path"], node)
+        if spec.get("breakpoints") is not None:
+            name = spec["breakpoints"]
+            if name not in ladders:
+                raise ValueError(f"Unknown breakpoint preset '{name}' for {spec['path']}")
+            params = {k: v for k, v in spec.items() if k not in OUTPUT_KEYS}
+            rungs = breakpoints.expand(spec.get("op"), params, ladders[name],
+                                       breakpoints.input_size(source))
+            primary.width = breakpoints.output_size(spec["op"], params)[0]
+            primary.sizes = ladders[name].get("sizes", breakpoints.DEFAULT_SIZES)
+            for width, op, bparams in rungs:
+                add(f"{stem}-{width}w{ext}", graph.add(op, bparams, [source]),
+                    breakpoint_of=primary, width=width)
+
+    seen = {}
+    for out in graph.outputs:
+        if out.path in seen:
+            raise ValueError(f"{graph.relative(out.path)} is produced by more than one output")
+        seen[out.path] = out
+    return graph
+
+
+def save_options(save, presets, path):
+    """Encoder options from an output's "save" value (dict or preset name)."""
+    if isinstance(save, str):
+        if save not in presets:
+            raise ValueError(f"Unknown save preset '{save}' for {path}")
+        return dict(presets[save])
+    return save
+
+
+def variant_formats(variants, presets, path):
+    """[(format, encoder options)] from an output's "variants" value."""
+    if variants is None:
+        return []
+    if isinstance(variants, str):
+        if variants not in presets:
+            raise ValueError(f"Unknown variant preset '{variants}' for {path}")
+        variants = presets[variants]
+    if isinstance(variants, list):
+        variants = {fmt: {} for fmt in variants}
+    for fmt in variants:
+        if fmt not in ENCODERS:
+            raise ValueError(f"No encoder for variant '{fmt}' of {path}")
+    return [(fmt, options or {}) for fmt, options in variants.items()]
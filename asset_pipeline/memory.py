@@ -0,0 +1,277 @@
+"""
+Memory-bounded builds: peak-RSS measurement, reduced decodes and a memory
+ceiling for the process pool.
+
+Peak RSS per job is the kernel's high-water mark (VmHWM), reset before the
+job with /proc/self/clear_refs. Where that is not available (macOS,
+old kernels) the process-lifetime maximum from getrusage is reported
+instead, which is only an upper bound for jobs after the first. Peaks
+include the interpreter itself (~50 MB with NumPy and Pillow loaded).
+
+estimate_job_memory() predicts that peak from the headers and the
+manifest: the RSS the job starts from (WORKER_BYTES for the fresh worker
+each job gets in a memory-bounded build), the libraries its ops load
+(OP_LIBRARY_BYTES), the decoded frames (BYTES_PER_PIXEL per source pixel)
+and the largest encode of the job, whose working memory dwarfs the
+frames: ENCODE_BYTES_PER_PIXEL per output pixel for the format, or
+QUANTIZE_BYTES_PER_PIXEL and SEARCH_BYTES_PER_PIXEL for palette
+quantization and quality searches.
+Those rates are the worst peaks measured on synthetic photos and icons of
+1024 and 2048 px in a fresh process, rounded up.
+
+With build --max-memory:
+
+- Decodes whose every use is a downscale are reduced at decode time:
+  JPEG via draft() (the DCT scales down, the full frame is never
+  allocated), other formats with reduce() right after loading so the full
+  frame is not kept alive. The factor keeps the result at least
+  pyramid.DEFAULT_GAP times larger than the largest size asked for, so the
+  final LANCZOS pass has the same margin the size pyramid uses.
+- Ops that can trade speed for memory (remove_bg's flood fill) are told to.
+- Every job runs in a new worker process, and jobs are only started while
+  the estimated memory of the running ones stays under the ceiling minus
+  the build process's own RSS; one job always runs, however large.
+- Every job's measured peak is logged, with a warning past the ceiling.
+"""
+import os
+import resource
+import sys
+
+from PIL import Image
+
+from .imagesize import header_size
+from .pyramid import DEFAULT_GAP
+
+# Rough bytes held per decoded source pixel: the RGBA frame, the pyramid's
+# premultiplied copy and reductions, and one full-size intermediate
+BYTES_PER_PIXEL = 12
+# RSS of a new worker once a job has loaded NumPy, Pillow's codecs and the
+# pipeline (46 MB measured), before any image
+WORKER_BYTES = 64 * 1024 * 1024
+# Libraries some ops load on top of that: SciPy for the background removal
+# (19 MB measured)
+OP_LIBRARY_BYTES = {"remove_bg": 32 * 1024 * 1024, "maskable": 32 * 1024 * 1024}
+# Peak bytes per output pixel while encoding (pngopt's filters and zlib,
+# libwebp and libavif's buffers; WebP with alpha is the worst case)
+ENCODE_BYTES_PER_PIXEL = {"png": 56, "ico": 56, "jpeg": 6, "webp": 80, "avif": 50}
+# png with "quantize" (k-means and SSIM in float64)
+QUANTIZE_BYTES_PER_PIXEL = 200
+# Quality searches (quality.py): encodes, decodes and SSIM maps
+SEARCH_BYTES_PER_PIXEL = 175
+# Ops that accept low_memory=True
+LOW_MEMORY_OPS = {"remove_bg"}
+PAGE_SIZE = resource.getpagesize()
+
+
+def _status(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def rss():
+    """Current resident set size in bytes (None when not available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def reset_peak():
+    """Restart the kernel's peak-RSS counter; False when not supported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss():
+    """Peak resident set size in bytes since the last reset_peak()."""
+    peak = _status("VmHWM")
+    if peak is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        peak *= 1 if sys.platform == "darwin" else 1024
+    return peak
+
+
+class PeakMeter:
+    """with PeakMeter() as m: ...  then m.peak holds the peak RSS in bytes
+    and m.growth how far it rose above the RSS at the start (None when the
+    peak could not be reset)."""
+
+    def __enter__(self):
+        self.exact = reset_peak()
+        self.start = _status("VmRSS") if self.exact else None
+        self.peak = None
+        return self
+
+    def __exit__(self, *exc):
+        self.peak = peak_rss()
+        return False
+
+    @property
+    def growth(self):
+        if self.start is None or self.peak is None:
+            return None
+        return max(0, self.peak - self.start)
+
+
+def megabytes(n):
+    return f"{n / 1024 / 1024:.0f} MB"
+
+
+def needed_size(node, users, wanted, source):
+    """(width, height) node's image must still resolve for its consumers;
+    0 leaves a side unconstrained and None means full resolution."""
+    if any(id(o) in wanted for o in node.outputs):
+        return None
+    need = [0, 0]
+    for user in users.get(node.key, []):
+        if user.op == "convert":
+            size = needed_size(user, users, wanted, source)
+        elif user.op in ("resize", "icon"):
+            s = user.params["size"]
+            size = (s, s) if isinstance(s, int) else tuple(s)
+        elif user.op == "resize_width":
+            size = (user.params["width"], 0)
+        elif user.op == "resize_height":
+            size = (0, user.params["height"])
+        elif user.op in ("banner", "desktop_banner"):
+            from .breakpoints import output_size
+            w, h = output_size(user.op, user.params)
+            scale = (min if user.params.get("fit") else max)(w / source[0], h / source[1])
+            size = (source[0] * scale, source[1] * scale)
+        else:
+            size = None
+        if size is None:
+            return None
+        need = [max(need[0], size[0]), max(need[1], size[1])]
+    return tuple(need)
+
+
+def decode_hints(nodes, outputs, gap=DEFAULT_GAP):
+    """{decode node key: reduction factor} for decodes that can be reduced."""
+    users = {}
+    for n in nodes:
+        for dep in n.inputs:
+            users.setdefault(dep.key, []).append(n)
+    wanted = set(map(id, outputs))
+    hints = {}
+    for node in nodes:
+        if node.op != "decode":
+            continue
+        source = header_size(node.params["path"])
+        if source is None:
+            continue
+        need = needed_size(node, users, wanted, source)
+        if need is None or need == (0, 0):
+            continue
+        factor = 1
+        while (source[0] / (factor * 2) >= gap * need[0]
+               and source[1] / (factor * 2) >= gap * need[1]):
+            factor *= 2
+        if factor > 1:
+            hints[node.key] = factor
+    return hints
+
+
+def decode_reduced(path, factor):
+    """Decode path at 1/factor of its size (draft for JPEG, reduce otherwise)."""
+    img = Image.open(path)
+    w, h = img.size
+    target = (max(1, w // factor), max(1, h // factor))
+    if img.format == "JPEG":
+        img.draft(img.mode, target)
+    img.load()
+    remaining = max(1, min(img.width // target[0], img.height // target[1]))
+    return img.reduce(remaining) if remaining > 1 else img
+
+
+def reductions(node, hints):
+    """Sorted (path, factor) of the reduced decodes node depends on."""
+    found, stack, seen = set(), [node], set()
+    while stack:
+        n = stack.pop()
+        if n.key in seen:
+            continue
+        seen.add(n.key)
+        if n.key in hints:
+            found.add((os.path.basename(n.params["path"]), hints[n.key]))
+        stack.extend(n.inputs)
+    return sorted(found) or None
+
+
+def node_size(node, hints, sizes):
+    """(width, height) of node's image, from the headers and the op
+    parameters (None when unknown); sizes memoises it by node key."""
+    if node.key in sizes:
+        return sizes[node.key]
+    inputs = [node_size(d, hints, sizes) for d in node.inputs]
+    source = inputs[0] if inputs else None
+    op, params = node.op, node.params
+    if op == "decode":
+        size = header_size(params["path"])
+        factor = hints.get(node.key, 1)
+        if size is not None:
+            size = (max(1, size[0] // factor), max(1, size[1] // factor))
+    elif op in ("resize", "icon", "maskable"):
+        s = params["size"]
+        size = (s, s) if isinstance(s, int) else tuple(s)
+    elif op in ("banner", "desktop_banner"):
+        from .breakpoints import output_size
+        size = output_size(op, params)
+    elif source is None:
+        size = None
+    elif op == "resize_width":
+        size = (params["width"], max(1, source[1] * params["width"] // source[0]))
+    elif op == "resize_height":
+        size = (max(1, source[0] * params["height"] // source[1]), params["height"])
+    elif op == "square":
+        size = (max(source),) * 2
+    else:
+        size = source
+    sizes[node.key] = size
+    return size
+
+
+def encode_memory(out, pixels, searched):
+    """Peak bytes of encoding out from an image of pixels pixels."""
+    if searched:
+        rate = SEARCH_BYTES_PER_PIXEL
+    elif out.format == "png" and out.save.get("quantize"):
+        rate = QUANTIZE_BYTES_PER_PIXEL
+    else:
+        rate = ENCODE_BYTES_PER_PIXEL.get(out.format, max(ENCODE_BYTES_PER_PIXEL.values()))
+    return pixels * rate
+
+
+def estimate_job_memory(job, hints=None, base=0):
+    """Rough bytes of a job's peak RSS: base (the RSS of the process it
+    starts in), its decoded frames, its ops' libraries and its largest encode."""
+    hints = hints or {}
+    sizes = {}
+    total = base + max([OP_LIBRARY_BYTES.get(n.op, 0) for n in job.nodes], default=0)
+    for node in job.nodes:
+        if node.op == "decode":
+            size = node_size(node, hints, sizes)
+            if size:
+                total += size[0] * size[1] * BYTES_PER_PIXEL
+    encodes = [0]
+    for i, out in enumerate(job.outputs):
+        size = node_size(out.node, hints, sizes)
+        if size is None:
+            continue
+        target = job.targets.get(i)
+        # A remembered quality is encoded straight away, without a search
+        searched = target is not None and target[1] is None
+        encodes.append(encode_memory(out, size[0] * size[1], searched))
+    return total + max(encodes)
@@ -0,0 +1,108 @@
+"""
+Transforms available to the manifest.
+
+Each op takes the decoded input image(s) plus the parameters declared in
+asset-pipeline.json and returns a new image. They reuse the functions from
+the standalone scripts so both paths produce the same pixels. Those (and
+NumPy) are imported when an op runs, so loading a manifest and planning a
+build stay cheap.
+"""
+from .breakpoints import DESKTOP_SIZE, LETTERBOX, render
+
+
+def decode(path):
+    from .imagecache import open_image
+    return open_image(path)
+
+
+def convert(img, mode):
+    return img if img.mode == mode else img.convert(mode)
+
+
+def square(img):
+    from .favicons import make_square
+    return make_square(img)
+
+
+def resize(img, size, linear=False):
+    from .linear import resample
+    if isinstance(size, int):
+        size = (size, size)
+    return resample(img, size, linear)
+
+
+def resize_width(img, width, linear=False):
+    from fix_logo_backgrounds import resize_width
+    return resize_width(img, width, linear)
+
+
+def resize_height(img, height, linear=False):
+    from fix_logo_backgrounds import resize_height
+    return resize_height(img, height, linear)
+
+
+def icon(img, size):
+    from .favicons import frame
+    return frame(img, size)
+
+
+def maskable(img, size):
+    from .favicons import maskable, maskable_tile
+    return maskable(*maskable_tile(img), size)
+
+
+def remove_bg(img, threshold=230, low_memory=False):
+    from .background import remove_background
+    return remove_background(img, threshold, low_memory)
+
+
+def crop_window(img, aspect, crop, window):
+    """The window to crop to: the one the build passes, or found now."""
+    if crop is None or window is not None:
+        return window
+    if crop != "auto":
+        raise ValueError(f"Unknown crop mode '{crop}' (only \"auto\")")
+    from .smartcrop import find_window
+    return find_window(img, aspect)
+
+
+def desktop_banner(img, fit=False, crop_offset=0, crop=None, window=None):
+    from process_new_desktop_images import render_desktop
+    window = None if fit else crop_window(img, DESKTOP_SIZE[0] / DESKTOP_SIZE[1], crop, window)
+    return render_desktop(img, crop_offset, fit, window=window)
+
+
+def banner(img, size, fit=False, crop_offset=0, background=LETTERBOX, linear=False, crop=None,
+           window=None):
+    window = None if fit else crop_window(img, size[0] / size[1], crop, window)
+    return render(img, tuple(size), crop_offset, fit, background, linear=linear, window=window)
+
+
+# Ops that receive a SizePyramid of their input instead of the image, so
+# every size taken from the same image shares one chain of reductions
+PYRAMID_OPS = {"resize", "resize_width", "resize_height", "banner", "icon"}
+
+OPS = {
+    "convert": convert,
+    "square": square,
+    "resize": resize,
+    "resize_width": resize_width,
+    "resize_height": resize_height,
+    "icon": icon,
+    "maskable": maskable,
+    "remove_bg": remove_bg,
+    "desktop_banner": desktop_banner,
+    "banner": banner,
+}
+
+
+def apply(node, images, **options):
+    """Run node's op on the already computed images (or pyramids) of its inputs.
+
+    options are extra keyword arguments that do not change the result
+    (low_memory, a smart-crop window found earlier), so they are not part
+    of the node's key.
+    """
+    if node.op == "decode":
+        return decode(node.params["path"])
+    return OPS[node.op](*images, **node.params, **options)
@@ -0,0 +1,63 @@
+"""
+Bounded process pool for independent image jobs.
+
+Results come back in input order whatever order the workers finish in, so
+logs and written files are the same as a serial run. A job that raises
+does not stop the others: its exception is handed back with its item,
+like the per-image try/except in the banner scripts.
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def run_ordered(func, items, workers=None, priority=None, budget=None, weight=None,
+                fresh=False):
+    """Yield (item, result, error) for func(item) over items, in input order.
+
+    priority(item) -> sortable weight decides submission order (largest
+    first) so long jobs start early; it never changes the order results are
+    yielded. With budget, an item is only started while the weight(item) of
+    everything running stays within it (one item always runs). fresh runs
+    every item in a new worker process, so none inherits the memory an
+    earlier one left allocated.
+    """
+    items = list(items)
+    workers = min(workers or default_workers(), len(items))
+    if workers <= 1:
+        for item in items:
+            try:
+                yield item, func(item), None
+            except Exception as e:
+                yield item, None, e
+        return
+
+    order = list(range(len(items)))
+    if priority is not None:
+        order.sort(key=lambda i: priority(items[i]), reverse=True)
+    weights = [weight(item) if budget is not None else 0 for item in items]
+    options = {"max_tasks_per_child": 1} if fresh else {}
+    with ProcessPoolExecutor(max_workers=workers, **options) as pool:
+        futures, running = {}, {}
+
+        def admit():
+            while order and (budget is None or not running
+                             or sum(running.values()) + weights[order[0]] <= budget):
+                i = order.pop(0)
+                futures[i] = pool.submit(func, items[i])
+                running[i] = weights[i]
+
+        admit()
+        for i, item in enumerate(items):
+            while i not in futures or not futures[i].done():
+                wait([futures[k] for k in running], return_when=FIRST_COMPLETED)
+                for k in [k for k in running if futures[k].done()]:
+                    del running[k]
+                admit()
+            try:
+                yield item, futures[i].result(), None
+            except Exception as e:
+                yield item, None, e
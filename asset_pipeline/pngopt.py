@@ -0,0 +1,281 @@
+"""
+Lossless PNG recompression, plus opt-in palette quantization.
+
+Pillow's optimize=True writes the image in whatever mode it is in, with
+adaptive filtering and one zlib setting, so flat-colour logos and UI
+screenshots ship as full RGBA truecolor. recompress() tries instead:
+
+- the smallest mode that holds the same pixels: RGB when alpha is always
+  255, L/LA when every pixel is gray, and an exact palette (with per-entry
+  alpha in tRNS, packed to 1/2/4 bits when it is small enough) when there
+  are at most 256 distinct colours;
+- the per-row minimum sum of absolute differences heuristic libpng uses,
+  and the Paeth and Up filters on every row, each compressed with the
+  default, filtered and RLE zlib strategies at level 9;
+- Pillow's own optimize=True encoding of the image as given.
+
+The smallest candidate wins, and only after it decodes back to exactly
+the input's RGBA pixels; otherwise Pillow's encoding of the original is
+kept. Big images get a shorter sweep (SWEEP_PIXELS), and only the filtered
+rows a candidate uses are built, FILTER_ROWS rows at a time, so filtering
+a photo holds one strip of predictors besides its output.
+
+quantize() is lossy and only runs when an output asks for it ("save":
+{"quantize": true or {"colors": [...], "min_ssim": ...}}, e.g. through the
+"palette" entry of "save_presets"). Pillow's octree palette is refined by
+k-means over the image's distinct premultiplied RGBA colours, weighted by
+how often they occur, and the image is mapped to the nearest entry
+without dithering. Palettes of QUANTIZE_COLORS sizes are tried from the
+largest down; the smallest one whose SSIM against the original (colour and
+alpha, see quality.py) stays at or above min_ssim is used, and the
+original when none does. The lossless path then stores it as an exact
+palette.
+"""
+import io
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image
+
+SIGNATURE = b"\x89PNG\r\n\x1a\n"
+STRATEGIES = (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED, zlib.Z_RLE)
+FILTERS = ("none", "sub", "up", "average", "paeth")
+# Filters tried on truecolor and gray images: the others never won on the
+# site's logos, icons and photos
+SWEEP_FILTERS = ("adaptive", "paeth", "up")
+# Above this many pixels only adaptive filtering with Z_FILTERED is tried
+# (a full sweep of a photo-sized PNG takes seconds for a few hundred bytes)
+SWEEP_PIXELS = 250_000
+# Rows filtered at a time (each strip holds the five predictors as int16)
+FILTER_ROWS = 64
+QUANTIZE_COLORS = (256, 128, 64, 32, 16)
+QUANTIZE_MIN_SSIM = 0.98
+QUANTIZE_ITERATIONS = 40
+# Distinct colours k-means is fitted on (a fixed sample above that)
+QUANTIZE_SAMPLE = 32768
+SUPPORTED = {"1", "L", "LA", "P", "PA", "RGB", "RGBA"}
+# PNG colour types
+GRAY, RGB, PALETTE, GRAY_ALPHA, RGB_ALPHA = 0, 2, 3, 4, 6
+
+
+def _chunk(kind, data):
+    body = kind + data
+    return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+
+def png_bytes(width, height, bit_depth, color_type, idat, palette=None, alpha=None):
+    """A minimal PNG: IHDR, PLTE/tRNS for palettes, one IDAT and IEND."""
+    out = [SIGNATURE, _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, bit_depth,
+                                                   color_type, 0, 0, 0))]
+    if palette is not None:
+        out.append(_chunk(b"PLTE", palette.astype(np.uint8).tobytes()))
+        if alpha is not None:
+            out.append(_chunk(b"tRNS", alpha.astype(np.uint8).tobytes()))
+    out.append(_chunk(b"IDAT", idat))
+    out.append(_chunk(b"IEND", b""))
+    return b"".join(out)
+
+
+def pack_bits(indices, bits):
+    """Pack palette indices (h, w) into rows of bits-per-pixel samples."""
+    if bits == 8:
+        return indices.astype(np.uint8)
+    per_byte = 8 // bits
+    h, w = indices.shape
+    padded = np.zeros((h, -(-w // per_byte) * per_byte), dtype=np.uint8)
+    padded[:, :w] = indices
+    groups = padded.reshape(h, -1, per_byte)
+    shifts = np.arange(per_byte - 1, -1, -1, dtype=np.uint8) * bits
+    return (groups << shifts).sum(axis=2, dtype=np.uint16).astype(np.uint8)
+
+
+def filter_strip(x, above, bpp, wanted):
+    """{filter type: filtered bytes} of the int16 rows x for the filter
+    types in wanted; above is the row before x (zeros for the first)."""
+    left = np.zeros_like(x)
+    left[:, bpp:] = x[:, :-bpp]
+    up = np.concatenate([above, x[:-1]])
+    upleft = np.zeros_like(x)
+    upleft[:, bpp:] = up[:, :-bpp]
+    out = {}
+    for t in wanted:
+        if t == 0:
+            pred = 0
+        elif t == 1:
+            pred = left
+        elif t == 2:
+            pred = up
+        elif t == 3:
+            pred = (left + up) // 2
+        else:
+            p = left + up - upleft
+            pa, pb, pc = np.abs(p - left), np.abs(p - up), np.abs(p - upleft)
+            pred = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, upleft))
+        out[t] = ((x - pred) & 0xFF).astype(np.uint8)
+    return out
+
+
+def filtered(rows, bpp, kinds=(*FILTERS, "adaptive")):
+    """{kind: (h, 1 + rowbytes) rows with their filter type byte} for kinds:
+    PNG filters and "adaptive", the per-row choice libpng makes. Computed
+    FILTER_ROWS rows at a time, only for the filters kinds need."""
+    h, n = rows.shape
+    wanted = sorted(range(5) if "adaptive" in kinds else {FILTERS.index(k) for k in kinds})
+    found = {kind: np.empty((h, n + 1), dtype=np.uint8) for kind in kinds}
+    above = np.zeros((1, n), dtype=np.int16)
+    for y in range(0, h, FILTER_ROWS):
+        x = rows[y:y + FILTER_ROWS].astype(np.int16)
+        strip = filter_strip(x, above, bpp, wanted)
+        above = x[-1:]
+        for kind, out in found.items():
+            if kind != "adaptive":
+                t = FILTERS.index(kind)
+                out[y:y + len(x), 0] = t
+                out[y:y + len(x), 1:] = strip[t]
+                continue
+            # libpng's heuristic: least sum of the filtered bytes read as signed
+            costs = np.stack([np.abs(strip[t].view(np.int8).astype(np.int16)).sum(axis=1)
+                              for t in range(5)])
+            best = costs.argmin(axis=0)
+            out[y:y + len(x), 0] = best
+            for t in range(5):
+                chosen = best == t
+                out[y:y + len(x), 1:][chosen] = strip[t][chosen]
+    return found
+
+
+def compress(data, strategy):
+    z = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+    return z.compress(data) + z.flush()
+
+
+def reduced_forms(rgba):
+    """[(bit_depth, color_type, rows, bpp, palette, alpha)] that hold rgba exactly."""
+    h, w, _ = rgba.shape
+    opaque = bool((rgba[..., 3] == 255).all())
+    gray = bool(((rgba[..., 0] == rgba[..., 1]) & (rgba[..., 1] == rgba[..., 2])).all())
+    forms = []
+    if gray:
+        if opaque:
+            forms.append((8, GRAY, rgba[..., 0], 1, None, None))
+        else:
+            forms.append((8, GRAY_ALPHA, rgba[..., [0, 3]].reshape(h, w * 2), 2, None, None))
+    elif opaque:
+        forms.append((8, RGB, rgba[..., :3].reshape(h, w * 3), 3, None, None))
+    else:
+        forms.append((8, RGB_ALPHA, rgba.reshape(h, w * 4), 4, None, None))
+
+    packed = rgba.view(np.uint32).reshape(h, w)
+    # Indices only once the colours fit a palette (a photo has millions)
+    colors = np.unique(packed)
+    if len(colors) <= 256:
+        indices = np.searchsorted(colors, packed).astype(np.uint8)
+        entries = colors.view(np.uint8).reshape(-1, 4)
+        # Opaque entries last, so tRNS can stop at the last translucent one
+        order = np.argsort(entries[:, 3] == 255, kind="stable")
+        remap = np.empty_like(order)
+        remap[order] = np.arange(len(order))
+        entries = entries[order]
+        indices = remap[indices.reshape(h, w)]
+        translucent = int((entries[:, 3] < 255).sum())
+        bits = next(b for b in (1, 2, 4, 8) if len(entries) <= 1 << b)
+        forms.append((bits, PALETTE, pack_bits(indices, bits), 1, entries[:, :3],
+                      entries[:translucent, 3] if translucent else None))
+    return forms
+
+
+def candidates(rgba, pixels):
+    """Encoded PNGs of every reduced form, filter and strategy swept."""
+    h, w, _ = rgba.shape
+    full = pixels <= SWEEP_PIXELS
+    for bit_depth, color_type, rows, bpp, palette, alpha in reduced_forms(rgba):
+        # Palette images compress best unfiltered (the PNG spec's advice)
+        if color_type == PALETTE:
+            kinds = ("none", "adaptive") if full else ("none",)
+        else:
+            kinds = SWEEP_FILTERS if full else ("adaptive",)
+        found = filtered(rows, bpp, kinds)
+        for kind in kinds:
+            data = found[kind].data
+            for strategy in STRATEGIES if full else (zlib.Z_FILTERED,):
+                yield png_bytes(w, h, bit_depth, color_type, compress(data, strategy), palette, alpha)
+
+
+def as_rgba(img):
+    return np.asarray(img.convert("RGBA"))
+
+
+def decodes_to(data, rgba):
+    with Image.open(io.BytesIO(data)) as im:
+        return np.array_equal(as_rgba(im), rgba)
+
+
+def recompress(img, baseline):
+    """Smallest verified lossless encoding of img, or baseline (Pillow's bytes)."""
+    if img.mode not in SUPPORTED:
+        return baseline
+    rgba = np.ascontiguousarray(as_rgba(img))
+    best = baseline
+    for data in candidates(rgba, img.width * img.height):
+        if len(data) < len(best):
+            best = data
+    if best is not baseline and not decodes_to(best, rgba):
+        return baseline
+    return best
+
+
+def nearest(points, centres):
+    centres = centres.astype(np.float32)
+    d = (centres ** 2).sum(axis=1)[None, :] - 2 * points.astype(np.float32) @ centres.T
+    return d.argmin(axis=1)
+
+
+def palette_for(img, points, weights, n):
+    """n premultiplied RGBA centres: the octree palette refined by k-means."""
+    octree = np.asarray(img.quantize(n, method=Image.Quantize.FASTOCTREE).convert("RGBA"))
+    # Distinct colours as big-endian words: the rows' order, without the
+    # slow row-wise unique (most of a 512 px icon's quantize time)
+    words = np.unique(np.ascontiguousarray(octree).view(">u4"))
+    seeds = words.astype(">u4").view(np.uint8).reshape(-1, 4).astype(np.float64)
+    centres = np.concatenate([seeds[:, :3] * seeds[:, 3:] / 255, seeds[:, 3:]], axis=1)
+    everything = points
+    if len(points) > QUANTIZE_SAMPLE:
+        pick = np.random.default_rng(0).choice(len(points), QUANTIZE_SAMPLE, replace=False)
+        points, weights = points[pick], weights[pick]
+    labels = None
+    for _ in range(QUANTIZE_ITERATIONS):
+        found = nearest(points, centres)
+        if labels is not None and np.array_equal(found, labels):
+            break
+        labels = found
+        total = np.bincount(labels, weights, len(centres))
+        used = total > 0
+        for k in range(4):
+            centres[used, k] = np.bincount(labels, weights * points[:, k], len(centres))[used] / total[used]
+    return centres, nearest(everything, centres)
+
+
+def quantize(img, colors=QUANTIZE_COLORS, min_ssim=QUANTIZE_MIN_SSIM):
+    """Palette version of img (RGBA, at most max(colors) colours) with the
+    fewest colours still scoring min_ssim, or None when none does."""
+    from .quality import ssim
+    rgba = img.convert("RGBA")
+    arr = np.ascontiguousarray(np.asarray(rgba))
+    distinct, inverse, counts = np.unique(arr.view(np.uint32).ravel(), return_inverse=True,
+                                          return_counts=True)
+    entries = distinct.view(np.uint8).reshape(-1, 4).astype(np.float64)
+    points = np.concatenate([entries[:, :3] * entries[:, 3:] / 255, entries[:, 3:]], axis=1)
+    found = None
+    for n in sorted(colors, reverse=True):
+        if n >= len(distinct):
+            continue
+        centres, labels = palette_for(rgba, points, counts.astype(np.float64), n)
+        alpha = centres[:, 3:]
+        colour = np.where(alpha > 0, centres[:, :3] * 255 / np.maximum(alpha, 1e-9), 0)
+        palette = np.clip(np.rint(np.concatenate([colour, alpha], axis=1)), 0, 255).astype(np.uint8)
+        candidate = Image.fromarray(palette[labels][inverse.ravel()].reshape(arr.shape))
+        if ssim(rgba, candidate) < min_ssim:
+            break
+        found = candidate
+    return found
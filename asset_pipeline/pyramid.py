@@ -0,0 +1,142 @@
+"""
+Size pyramid: serve many downscales of one master from a cached chain of
+halvings instead of running LANCZOS over the full master every time.
+
+This is Pillow's reducing_gap idea with the reductions shared: levels are
+built once with Image.reduce(2) (a cheap box filter) and each requested size
+gets its final LANCZOS pass from the smallest level still at least `gap`
+times larger. The fractional extent of odd-sized levels is passed as the
+resize box, so no level shifts the image by half a pixel. Alpha images are
+premultiplied once up front instead of on every resize.
+
+Masters under MIN_PIXELS are always resized directly: there is nothing
+to save and their hard edges are the most sensitive to the box
+pre-filter. That covers every icon master (the squared icons are ~200 to
+340 px), so for icons the pyramid is only a memo: the same size asked for
+twice (root and public/ copies, ICO frames and PNGs) is computed once, and
+a size asked for once costs a direct resize plus a copy. Only the logos,
+the hero and the photos go through the chain of reductions.
+
+SizePyramid duck-types the bits of Image the scripts use (resize, size,
+width, height, mode), so it can be passed wherever a master was.
+
+With max_error set, every size served from a level is compared with a
+direct LANCZOS resize of the master and replaced by it when any channel
+differs by more than max_error (the quality gate). Errors are measured on
+premultiplied colour, so the invisible RGB of transparent pixels does not
+count. Builds and scripts leave max_error unset (the extra direct resize
+would undo the savings); benchmarks/pyramid.py runs the same check over
+the real masters instead.
+"""
+from PIL import Image
+
+DEFAULT_GAP = 3.0
+MIN_PIXELS = 512 * 512
+PREMULTIPLIED = {"RGBA": "RGBa", "LA": "La"}
+
+
+def premultiplied(img):
+    import numpy as np  # only for the quality gate, keeps planning NumPy-free
+    arr = np.asarray(img, dtype=np.float32)
+    if img.mode in PREMULTIPLIED:
+        arr = arr.copy()
+        arr[..., :-1] *= arr[..., -1:] / 255
+    return arr
+
+
+def max_channel_error(a, b):
+    """Largest per-channel difference between two same-size images (premultiplied)."""
+    diff = abs(premultiplied(a) - premultiplied(b.convert(a.mode)))
+    return float(diff.max()) if diff.size else 0.0
+
+
+class SizePyramid:
+    def __init__(self, master, gap=DEFAULT_GAP, max_error=None, min_pixels=MIN_PIXELS):
+        self.master = master
+        self.gap = gap
+        self.max_error = max_error
+        self.min_pixels = min_pixels
+        self.fallbacks = 0
+        self._levels = None
+        self._served = {}
+
+    @classmethod
+    def open(cls, path, largest=None, gap=DEFAULT_GAP, **kwargs):
+        """Pyramid over a file, letting JPEG decode at a reduced scale (draft)
+        when no requested size needs the full resolution."""
+        img = Image.open(path)
+        if largest is not None and img.format == "JPEG":
+            w, h = (largest, largest) if isinstance(largest, int) else largest
+            img.draft(img.mode, (int(w * gap), int(h * gap)))
+        img.load()
+        return cls(img, gap, **kwargs)
+
+    @property
+    def size(self):
+        return self.master.size
+
+    @property
+    def width(self):
+        return self.master.width
+
+    @property
+    def height(self):
+        return self.master.height
+
+    @property
+    def mode(self):
+        return self.master.mode
+
+    def level_for(self, size):
+        """(level, scale) of the smallest level at least gap times larger than
+        size; scale 1 is the master itself."""
+        w, h = size
+        if self.master.width * self.master.height < self.min_pixels:
+            return self.master, 1
+        if self._levels is None:
+            mode = PREMULTIPLIED.get(self.master.mode)
+            self._levels = [self.master.convert(mode) if mode else self.master]
+        i = 0
+        while True:
+            level = self._levels[i]
+            if (level.width + 1) // 2 < self.gap * w or (level.height + 1) // 2 < self.gap * h:
+                return level, 2 ** i
+            if i + 1 == len(self._levels):
+                self._levels.append(level.reduce(2))
+            i += 1
+
+    def _from_level(self, size):
+        level, scale = self.level_for(size)
+        if scale == 1:
+            return self.master.resize(size, Image.LANCZOS), 1
+        box = (0, 0, self.master.width / scale, self.master.height / scale)
+        img = level.resize(size, Image.LANCZOS, box=box)
+        if img.mode != self.master.mode:
+            img = img.convert(self.master.mode)
+        return img, scale
+
+    def resize(self, size, resample=Image.LANCZOS, **kwargs):
+        size = tuple(size)
+        if resample != Image.LANCZOS or kwargs:
+            return self.master.resize(size, resample, **kwargs)
+        img = self._served.get(size)
+        if img is None:
+            img, scale = self._from_level(size)
+            if self.max_error is not None and scale > 1:
+                direct = self.master.resize(size, Image.LANCZOS)
+                if max_channel_error(img, direct) > self.max_error:
+                    img = direct
+                    self.fallbacks += 1
+            self._served[size] = img
+        # callers may paste into / draw on what they get back
+        return img.copy()
+
+    def check(self, sizes):
+        """{size: (max channel error, reduction used)} against direct LANCZOS."""
+        report = {}
+        for size in sizes:
+            size = (size, size) if isinstance(size, int) else tuple(size)
+            img, scale = self._from_level(size)
+            report[size] = (max_channel_error(img, self.master.resize(size, Image.LANCZOS)), scale)
+        return report
+
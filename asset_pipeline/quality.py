@@ -0,0 +1,148 @@
+"""
+Perceptual-quality-targeted encoding.
+
+Instead of a fixed quality (85 for the hero JPEGs), each lossy output is
+encoded at the lowest quality whose decoded pixels still reach a target
+SSIM against the image the encoder was given. Quality is binary-searched
+between QUALITY_MIN and QUALITY_MAX; of the candidates that meet the
+target the smallest file wins.
+
+SSIM is the usual single-scale index (8x8 sliding windows, K1=0.01,
+K2=0.03) on BT.601 luma, computed with summed-area tables in NumPy. Images
+with alpha are compared premultiplied, and the alpha plane is scored too;
+the lower of the two counts.
+
+The search runs in the build workers. The quality it settles on is kept in
+the build cache per output signature (source hashes + transforms + format
++ target), so it only ever runs once per source content: later builds hit
+the output cache, and if the bytes were evicted they are re-encoded
+straight at the remembered quality.
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+from . import DEFAULT_TARGET
+from .encoders import encode
+from .pyramid import PREMULTIPLIED, premultiplied
+
+QUALITY_MIN = 40
+QUALITY_MAX = 95
+WINDOW = 8
+LUMA = np.array([0.299, 0.587, 0.114])
+METRIC = "ssim-luma-8"
+
+
+def searchable(out):
+    """Whether out's encoder has a quality knob worth searching."""
+    if out.format in ("jpeg", "avif"):
+        return True
+    return out.format == "webp" and not out.save.get("lossless")
+
+
+def _window_mean(x, size=WINDOW):
+    c = np.zeros((x.shape[0] + 1, x.shape[1] + 1))
+    c[1:, 1:] = x.cumsum(0).cumsum(1)
+    return (c[size:, size:] - c[:-size, size:] - c[size:, :-size] + c[:-size, :-size]) / (size * size)
+
+
+def ssim_plane(x, y):
+    if min(x.shape) < WINDOW:
+        return 1.0 if np.array_equal(x, y) else 0.0
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mx, my = _window_mean(x), _window_mean(y)
+    vx = _window_mean(x * x) - mx * mx
+    vy = _window_mean(y * y) - my * my
+    cov = _window_mean(x * y) - mx * my
+    s = ((2 * mx * my + c1) * (2 * cov + c2)) / ((mx * mx + my * my + c1) * (vx + vy + c2))
+    return float(s.mean())
+
+
+def planes(img):
+    arr = premultiplied(img).astype(np.float64)
+    if arr.ndim == 2:
+        return [arr]
+    colour = arr[..., :3] @ LUMA if arr.shape[2] >= 3 else arr[..., 0]
+    return [colour, arr[..., -1]] if img.mode in PREMULTIPLIED else [colour]
+
+
+def ssim(reference, img):
+    """SSIM of img against reference (same size); 1.0 means identical."""
+    if img.mode != reference.mode:
+        img = img.convert(reference.mode)
+    return min(ssim_plane(x, y) for x, y in zip(planes(reference), planes(img)))
+
+
+def reference_for(img, format):
+    """What a format can represent of img (JPEG drops alpha)."""
+    if format == "jpeg" and img.mode not in ("RGB", "L"):
+        return img.convert("RGB")
+    return img
+
+
+def score(img, data):
+    with Image.open(io.BytesIO(data)) as decoded:
+        decoded.load()
+        return ssim(img, decoded)
+
+
+def encode_at(img, format, options, quality):
+    return encode(img, format, {**options, "quality": quality})
+
+
+def search(img, format, options, target=DEFAULT_TARGET, lo=QUALITY_MIN, hi=QUALITY_MAX):
+    """Binary-search quality for the smallest encoding with SSIM >= target.
+
+    Returns (data, quality, score); quality is None when even hi misses the
+    target, in which case the output is encoded with its own options.
+    """
+    reference = reference_for(img, format)
+    best = None
+    while lo <= hi:
+        q = (lo + hi) // 2
+        data = encode_at(img, format, options, q)
+        s = score(reference, data)
+        if s >= target:
+            if best is None or len(data) < len(best[0]):
+                best = (data, q, s)
+            hi = q - 1
+        else:
+            lo = q + 1
+    if best is None:
+        data = encode(img, format, options)
+        return data, None, score(reference, data)
+    return best
+
+
+def encode_targeted(img, out, target, known=None):
+    """Encode out at target, reusing a remembered quality when there is one.
+
+    Returns (data, record) where record describes the search for the
+    cache and the report. A remembered search also carries the size of
+    the encoding at out's own options, so only one encode runs then.
+    """
+    if known is not None:
+        data = encode_at(img, out.format, out.save, known["quality"]) \
+            if known["quality"] is not None else encode(img, out.format, out.save)
+        return data, {**known, "bytes": len(data), "searched": False}
+    baseline = len(encode(img, out.format, out.save))
+    data, quality, s = search(img, out.format, out.save, target)
+    return data, {"quality": quality, "score": round(s, 5), "bytes": len(data),
+                  "baseline": baseline, "searched": True}
+
+
+def report(rows, log=print):
+    """Log bytes saved per asset: rows are (relative path, record)."""
+    if not rows:
+        return
+    log("\nquality search (target SSIM):")
+    before = after = 0
+    for path, rec in rows:
+        q = "own" if rec["quality"] is None else f"q{rec['quality']}"
+        note = "" if rec["searched"] else "  (cached quality)"
+        before += rec["baseline"]
+        after += rec["bytes"]
+        log(f"  {path:<40} {q:>4}  ssim {rec['score']:.4f}  {rec['baseline'] / 1024:7.1f} KB -> "
+            f"{rec['bytes'] / 1024:7.1f} KB  saved {(rec['baseline'] - rec['bytes']) / 1024:6.1f} KB{note}")
+    log(f"  total {before / 1024:.0f} KB -> {after / 1024:.0f} KB ({(before - after) / 1024:.0f} KB saved)")
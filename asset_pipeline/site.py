@@ -0,0 +1,348 @@
+"""
+Whole-site image audit: what the pages reference, what each image would
+weigh re-encoded for the size it is shown at, and what is dead weight.
+
+    python -m asset_pipeline optimize-site [--write] [--pages index.html ...]
+
+The served tree is everything under the site root (vercel serves "."),
+without hidden directories and Python/Node internals. References come from
+the pages (index.html, privacy.html, register-*.html by default): <img>
+src/srcset, <source> srcset, <link> icons, <meta> images, inline style
+url()s and the url()s of local stylesheets; files listed in
+image-variants.json count as referenced too.
+
+Every referenced image is re-encoded in its own format, so no URL changes:
+
+- downscaled to the largest size it is rendered at (width/height
+  attributes or px in its inline style) times --density, when every use
+  of it declares one and it is bigger than that;
+- PNG through the lossless recompression of pngopt.py, JPEG and lossy
+  WebP at the lowest quality reaching the SSIM target (quality.py);
+- and WebP/AVIF encodings are measured to report what a format switch
+  would save on top.
+
+The report lists per image bytes before/after, the totals, unreferenced
+images (marking dead intermediates such as *.orig/*.bak and "-new"/"-old"
+copies, and the manifest's sources, which must stay), groups of
+byte-identical files and references to files that do not exist.
+
+Nothing is written without --write, and then only images that got
+smaller and are not outputs of asset-pipeline.json (change the manifest
+for those, or the next build undoes it). Images are processed in parallel
+(-j).
+"""
+import fnmatch
+import os
+import re
+from html.parser import HTMLParser
+from urllib.parse import unquote, urlsplit
+
+from PIL import Image
+
+from . import DEFAULT_DENSITY, quality
+from .cache import sha256
+from .encoders import available, encode_png, encode_webp
+from .fanout import write_file
+from .parallel import run_ordered
+from .variants import VARIANTS_MANIFEST, load_variants
+
+DEFAULT_PAGES = ["index.html", "privacy.html", "register-*.html"]
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".avif", ".gif", ".ico"}
+# Suffixes and stem endings of intermediates that are never served on purpose
+DEAD_SUFFIXES = (".orig", ".bak", ".bak2", ".old", ".tmp")
+DEAD_STEMS = ("-new", "-old", "-backup")
+SKIP_DIRS = {"node_modules", "__pycache__", "asset_pipeline", "benchmarks", "api"}
+# Downscale only when the file is at least this much larger than needed
+RESIZE_MARGIN = 1.1
+FORMATS = {".png": "png", ".jpg": "jpeg", ".jpeg": "jpeg", ".webp": "webp"}
+CSS_URL = re.compile(r"url\(\s*['\"]?([^'\")]+)['\"]?\s*\)")
+STYLE_PX = re.compile(r"(?<![-\w])(width|height)\s*:\s*(\d+(?:\.\d+)?)px")
+
+
+def is_image(path):
+    name = path.lower()
+    for suffix in DEAD_SUFFIXES:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return os.path.splitext(name)[1] in IMAGE_EXTENSIONS
+
+
+def is_dead(path):
+    name = os.path.basename(path).lower()
+    if name.endswith(DEAD_SUFFIXES):
+        return True
+    return os.path.splitext(name)[0].endswith(DEAD_STEMS)
+
+
+def served_images(base):
+    """Every image file under base (sorted absolute paths)."""
+    found = []
+    for root, dirs, files in os.walk(base):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d not in SKIP_DIRS)
+        found.extend(os.path.join(root, f) for f in files if is_image(f))
+    return sorted(found)
+
+
+def find_pages(base, patterns=DEFAULT_PAGES):
+    names = sorted(os.listdir(base))
+    return [os.path.join(base, n) for p in patterns for n in fnmatch.filter(names, p)]
+
+
+def local_path(url, page, base):
+    """File a URL on page points to, or None for external and data URLs."""
+    parts = urlsplit(url.strip())
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    path = unquote(parts.path)
+    if path.startswith("/"):
+        return os.path.normpath(os.path.join(base, path.lstrip("/")))
+    return os.path.normpath(os.path.join(os.path.dirname(page), path))
+
+
+def srcset_urls(value):
+    return [c.strip().split()[0] for c in value.split(",") if c.strip()]
+
+
+def display_size(attrs):
+    """(width, height) in CSS px an <img> declares, 0 for an unknown side."""
+    size = {"width": 0, "height": 0}
+    for side in size:
+        try:
+            size[side] = int(float(attrs.get(side) or 0))
+        except ValueError:
+            pass
+    for side, value in STYLE_PX.findall(attrs.get("style") or ""):
+        size[side] = int(float(value))
+    return size["width"], size["height"]
+
+
+class ReferenceParser(HTMLParser):
+    """Collects (url, display size or None) and stylesheet URLs of a page."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.found, self.stylesheets = [], []
+        self._in_style = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "img":
+            size = display_size(attrs)
+            if attrs.get("src"):
+                self.found.append((attrs["src"], None if attrs.get("srcset") else size))
+            for url in srcset_urls(attrs.get("srcset") or ""):
+                self.found.append((url, None))
+        elif tag == "source":
+            for url in srcset_urls(attrs.get("srcset") or ""):
+                self.found.append((url, None))
+        elif tag == "link":
+            rel = (attrs.get("rel") or "").lower()
+            if "stylesheet" in rel and attrs.get("href"):
+                self.stylesheets.append(attrs["href"])
+            elif attrs.get("href"):
+                self.found.append((attrs["href"], None))
+        elif tag == "meta" and attrs.get("content", "").startswith(("/", "./")):
+            self.found.append((attrs["content"], None))
+        elif tag == "style":
+            self._in_style = True
+        for url in CSS_URL.findall(attrs.get("style") or ""):
+            self.found.append((url, None))
+
+    def handle_endtag(self, tag):
+        if tag == "style":
+            self._in_style = False
+
+    def handle_data(self, data):
+        if self._in_style:
+            self.found.extend((url, None) for url in CSS_URL.findall(data))
+
+
+def scan_references(pages, base):
+    """({image path: {"pages": set, "sizes": [display size or None]}}, missing).
+
+    missing maps referenced paths that do not exist to the pages using them.
+    """
+    refs, missing = {}, {}
+
+    def add(url, page, size, relative_to):
+        path = local_path(url, relative_to, base)
+        if path is None or not is_image(path):
+            return
+        if not os.path.exists(path):
+            missing.setdefault(path, set()).add(os.path.relpath(page, base))
+            return
+        ref = refs.setdefault(path, {"pages": set(), "sizes": []})
+        ref["pages"].add(os.path.relpath(page, base))
+        ref["sizes"].append(size)
+
+    for page in pages:
+        parser = ReferenceParser()
+        with open(page, encoding="utf-8", errors="replace") as f:
+            parser.feed(f.read())
+        for url, size in parser.found:
+            add(url, page, size, page)
+        for href in parser.stylesheets:
+            css = local_path(href, page, base)
+            if css and os.path.exists(css):
+                with open(css, encoding="utf-8", errors="replace") as f:
+                    for url in CSS_URL.findall(f.read()):
+                        add(url, page, None, css)
+
+    variants = load_variants(os.path.join(base, VARIANTS_MANIFEST))
+    for entry in variants.values():
+        for image in [entry["fallback"], *entry["sources"]]:
+            urls = [u for u, _ in image.get("srcset", [])] or [image["url"]]
+            for url in urls:
+                add(url, os.path.join(base, VARIANTS_MANIFEST), None, base)
+    return refs, missing
+
+
+def needed_size(sizes, source, density):
+    """Pixel size an image must keep for every use, None to keep it as is."""
+    if not sizes or any(s is None or s == (0, 0) for s in sizes):
+        return None
+    w, h = source
+    scale = 0
+    for dw, dh in sizes:
+        side = max(dw / w if dw else 0, dh / h if dh else 0)
+        scale = max(scale, side * density)
+    if scale * RESIZE_MARGIN >= 1:
+        return None
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+
+def encode_best(img, format, target):
+    """Bytes of img in format: lossless recompression for PNG, the lowest
+    quality that reaches target for lossy formats."""
+    if format == "png":
+        return encode_png(img)
+    if format == "webp" and img.info.get("lossless"):
+        return encode_webp(img, lossless=True)
+    data, _, _ = quality.search(img, format, {}, target)
+    return data
+
+
+def alternatives(img, target):
+    """{format: bytes} of the modern formats img could be served as."""
+    found = {}
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+    if available("webp"):
+        found["webp"] = len(encode_webp(img, lossless=True) if has_alpha
+                            else quality.search(img, "webp", {}, target)[0])
+    if available("avif") and not has_alpha:
+        found["avif"] = len(quality.search(img, "avif", {}, target)[0])
+    return found
+
+
+def optimize_image(item):
+    """Re-encode one image (run in a worker): returns its record and bytes."""
+    path, sizes, density, target = item["path"], item["sizes"], item["density"], item["target"]
+    original = os.path.getsize(path)
+    format = FORMATS.get(os.path.splitext(path)[1].lower())
+    with Image.open(path) as im:
+        im.load()
+        img = im if im.mode in ("RGB", "RGBA", "L", "LA", "P") else im.convert("RGBA")
+        if img.mode == "P":
+            img = img.convert("RGBA")
+        source = img.size
+        record = {"size": list(source), "bytes": original, "new_size": list(source),
+                  "new_bytes": original, "format": format, "alternatives": {}}
+        if format is None or getattr(im, "is_animated", False):
+            return record, None
+        size = needed_size(sizes, source, density)
+        if size is not None:
+            img = img.resize(size, Image.LANCZOS)
+        data = encode_best(img, format, target)
+        record["alternatives"] = alternatives(img, target)
+    if len(data) >= original:
+        return record, None
+    record.update(new_size=list(img.size), new_bytes=len(data))
+    return record, data
+
+
+def audit(base, pages=None, workers=None, density=DEFAULT_DENSITY, target=quality.DEFAULT_TARGET,
+          owned=()):
+    """Scan and optimize the site under base; returns a report dict."""
+    pages = pages or find_pages(base)
+    refs, missing = scan_references(pages, base)
+    images = served_images(base)
+
+    hashes = {}
+    for path in images:
+        with open(path, "rb") as f:
+            hashes.setdefault(sha256(f.read()), []).append(path)
+    duplicates = sorted(group for group in hashes.values() if len(group) > 1)
+
+    items = [{"path": p, "sizes": refs[p]["sizes"], "density": density, "target": target}
+             for p in sorted(refs)]
+    results = []
+    for item, result, error in run_ordered(optimize_image, items, workers,
+                                           priority=lambda i: os.path.getsize(i["path"])):
+        path = item["path"]
+        if error is not None:
+            results.append((path, None, None, str(error)))
+            continue
+        record, data = result
+        record["owned"] = path in owned
+        results.append((path, record, data, None))
+
+    unreferenced = [p for p in images if p not in refs]
+    return {"pages": pages, "images": images, "results": results, "missing": missing,
+            "unreferenced": unreferenced, "duplicates": duplicates}
+
+
+def report(base, found, sources=(), log=print):
+    def rel(path):
+        return os.path.relpath(path, base)
+
+    log(f"{len(found['images'])} images served, {len(found['results'])} referenced by "
+        f"{', '.join(rel(p) for p in found['pages'])}\n")
+    before = after = alt = 0
+    for path, record, _, error in found["results"]:
+        if error is not None:
+            log(f"  ❌ {rel(path)}: {error}")
+            continue
+        before += record["bytes"]
+        after += record["new_bytes"]
+        best = min(record["alternatives"].items(), key=lambda kv: kv[1], default=None)
+        alt += min(record["new_bytes"], best[1]) if best else record["new_bytes"]
+        resized = "" if record["new_size"] == record["size"] else \
+            f" → {record['new_size'][0]}x{record['new_size'][1]}"
+        switch = f"  ({best[0]}: {best[1] / 1024:.0f} KB)" if best and best[1] < record["new_bytes"] else ""
+        owner = "  [asset-pipeline.json]" if record["owned"] else ""
+        log(f"  {rel(path):<40} {record['size'][0]}x{record['size'][1]}{resized:<12} "
+            f"{record['bytes'] / 1024:7.0f} KB -> {record['new_bytes'] / 1024:7.0f} KB{switch}{owner}")
+    log(f"\n  referenced images: {before / 1024:.0f} KB -> {after / 1024:.0f} KB "
+        f"({(before - after) / 1024:.0f} KB saved in place, {(before - alt) / 1024:.0f} KB if served "
+        f"as WebP/AVIF where smaller)")
+
+    if found["unreferenced"]:
+        size = sum(os.path.getsize(p) for p in found["unreferenced"])
+        log(f"\nunreferenced ({len(found['unreferenced'])} files, {size / 1024:.0f} KB):")
+        for path in found["unreferenced"]:
+            note = "pipeline source, keep" if path in sources else \
+                "dead intermediate" if is_dead(path) else ""
+            log(f"  {rel(path):<48} {os.path.getsize(path) / 1024:7.0f} KB  {note}")
+    if found["duplicates"]:
+        wasted = sum(os.path.getsize(g[0]) * (len(g) - 1) for g in found["duplicates"])
+        log(f"\nidentical content ({len(found['duplicates'])} groups, {wasted / 1024:.0f} KB in copies):")
+        for group in found["duplicates"]:
+            log("  " + " = ".join(rel(p) for p in group))
+    if found["missing"]:
+        log("\nmissing (referenced but not on disk):")
+        for path, pages in sorted(found["missing"].items()):
+            log(f"  {rel(path)} (in {', '.join(sorted(pages))})")
+
+
+def write_results(base, found, log=print):
+    """Write the smaller encodings of images the manifest does not own."""
+    written = saved = 0
+    for path, record, data, _ in found["results"]:
+        if data is None or record["owned"]:
+            continue
+        # Through a rename, so an interrupted write never leaves half an image
+        write_file(path, data)
+        written += 1
+        saved += record["bytes"] - record["new_bytes"]
+        log(f"  ✓ {os.path.relpath(path, base)} ({record['new_size'][0]}x{record['new_size'][1]})")
+    log(f"\n{written} images rewritten, {saved / 1024:.0f} KB saved")
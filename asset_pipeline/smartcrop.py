@@ -0,0 +1,169 @@
+"""
+Smart crop: choose a banner's crop window from a cheap saliency map.
+
+The desktop banners are 4:1 strips cut from 16:9 and 3:2 photos. A
+centred cover crop cut through faces (create_desktop_images.py tuned
+crop_offset by hand for foto-03), so process_new_desktop_images.py fell
+back to letterboxing everything with fit, wasting most of the banner.
+"crop": "auto" on a banner or desktop_banner output picks the window
+instead:
+
+- the photo is analysed on a proxy whose longest side is PROXY pixels
+  (from the SizePyramid, so it costs one cheap reduction);
+- detail is edge energy (luma gradient magnitude, normalised by its
+  mean), box-blurred over BLUR of the proxy so the window is drawn to
+  regions rather than to single edges;
+- faces are skin tones (the usual YCbCr box plus the RGB rules that keep
+  grey asphalt and shadows out) in small blobs (blurred skin minus its
+  SURROUND average, so a warm wall, a tan jacket or sunlit dirt does not
+  count) that also hold detail (eyes, mouth, hair lines);
+- saliency is detail plus SKIN_WEIGHT times faces. The window is the
+  largest one of the target aspect ratio (a cover crop), slid along the
+  axis the aspect leaves free: the saliency it holds is summed for every
+  offset at once from a cumulative profile, minus CUT_WEIGHT times the
+  faces its two edges would slice through, and CENTER_BIAS pulls
+  near-ties (flat photos) back to the centre.
+
+The window is returned as fractions of the source, (left, top, right,
+bottom), so every rung of a breakpoint ladder shares it. The build keeps
+it in the cache index per signature of the input (source hashes and
+transforms) and aspect ratio (crop_key), so the analysis only runs
+again when the photo changes; process_new_desktop_images.py keys its
+windows through crop_key too, on the decode -> convert chain the manifest
+builds for the same photo (photo_source), so the script and the build find
+each other's windows.
+"""
+import os
+
+import numpy as np
+from PIL import Image
+
+from .cache import digest
+
+# Bump when the analysis changes, so remembered windows are recomputed
+VERSION = 1
+PROXY = 256
+# Radii as fractions of the proxy's longest side
+BLUR = 1 / 32
+SURROUND = 1 / 32
+SKIN_WEIGHT = 1.0
+CUT_WEIGHT = 0.2
+CENTER_BIAS = 0.1
+# Ops that take "crop": "auto"
+CROP_OPS = {"banner", "desktop_banner"}
+
+
+def wants(node):
+    """Whether node's op crops with an automatic window."""
+    return node.op in CROP_OPS and node.params.get("crop") == "auto" and not node.params.get("fit")
+
+
+def aspect_of(node):
+    """Width / height of the banner node renders."""
+    from .breakpoints import output_size
+    width, height = output_size(node.op, node.params)
+    return width / height
+
+
+def window_key(signature, aspect):
+    return digest("crop", VERSION, signature, round(aspect, 3))
+
+
+def crop_key(cache, source, aspect):
+    """Key of the window cropping source (the node a banner reads) to
+    aspect: from its cache signature, or its node key without a cache."""
+    signature = cache.signature(source) if cache is not None else source.key
+    return window_key(signature, aspect)
+
+
+def photo_source(path, mode="RGB"):
+    """The node the manifest builds for a source at path with this mode
+    (decode, then convert), to key a window outside a build."""
+    from .graph import Graph
+    path = os.path.abspath(path)
+    graph = Graph(os.path.dirname(path))
+    return graph.add("convert", {"mode": mode}, [graph.decode(path)])
+
+
+def box_blur(a, radius):
+    """Mean over a (2 radius + 1)^2 box, from a summed-area table."""
+    if radius < 1:
+        return a
+    padded = np.pad(a, radius + 1, mode="edge")
+    table = padded.cumsum(0).cumsum(1)
+    k = 2 * radius + 1
+    total = table[k:, k:] - table[:-k, k:] - table[k:, :-k] + table[:-k, :-k]
+    return total[:a.shape[0], :a.shape[1]] / (k * k)
+
+
+def skin(rgb):
+    """Boolean mask of skin-tone pixels of an (h, w, 3) float array."""
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    cb = 128 - 0.168736 * r - 0.331264 * g + 0.5 * b
+    cr = 128 + 0.5 * r - 0.418688 * g - 0.081312 * b
+    spread = np.maximum(np.maximum(r, g), b) - np.minimum(np.minimum(r, g), b)
+    return ((cb >= 77) & (cb <= 127) & (cr >= 133) & (cr <= 173)
+            & (r > 95) & (g > 40) & (b > 20) & (spread > 15) & (r - g > 15) & (r > b))
+
+
+def saliency(img):
+    """(saliency, faces): (h, w) float arrays of an RGB proxy image."""
+    rgb = np.asarray(img.convert("RGB"), dtype=np.float32)
+    luma = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    edges = np.zeros_like(luma)
+    edges[:, 1:] += np.abs(np.diff(luma, axis=1))
+    edges[1:] += np.abs(np.diff(luma, axis=0))
+    edges /= max(float(edges.mean()), 1e-6)
+    n = max(luma.shape)
+    radius = round(n * BLUR)
+    detail = box_blur(edges, radius)
+    mask = skin(rgb).astype(np.float32)
+    blobs = np.clip(box_blur(mask, max(1, radius // 2)) - box_blur(mask, round(n * SURROUND)), 0, None)
+    faces = blobs * detail
+    faces /= max(float(faces.mean()), 1e-6)
+    return detail + SKIN_WEIGHT * faces, faces
+
+
+def best_offset(profile, cuts, length):
+    """Start of the length-long span of profile holding the most saliency,
+    less the cuts (faces per line) its edges slice through, with near-ties
+    resolved towards the centre."""
+    spans = len(profile) - length + 1
+    if spans <= 1:
+        return 0
+    sums = np.concatenate([[0], np.cumsum(profile, dtype=np.float64)])
+    held = sums[length:] - sums[:-length]
+    sliced = cuts[:spans] + cuts[length - 1:length - 1 + spans]
+    distance = np.abs(np.arange(spans) - (spans - 1) / 2) / ((spans - 1) / 2)
+    score = (held / max(float(held.max()), 1e-6)
+             - CUT_WEIGHT * sliced / max(2 * float(cuts.max()), 1e-6)
+             - CENTER_BIAS * distance)
+    return int(np.argmax(score))
+
+
+def find_window(img, aspect):
+    """(left, top, right, bottom) fractions of img (an Image or SizePyramid)
+    of the most salient crop with width / height == aspect."""
+    width, height = img.size
+    scale = PROXY / max(width, height)
+    proxy_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    sal, faces = saliency(img.resize(proxy_size, Image.LANCZOS))
+    if width / height > aspect:
+        # Too wide: full height, slide horizontally
+        span = height * aspect / width
+        length = max(1, round(span * proxy_size[0]))
+        offset = best_offset(sal.sum(axis=0), faces.sum(axis=0), length)
+        left = min(offset / proxy_size[0], 1 - span)
+        return (left, 0.0, left + span, 1.0)
+    span = width / aspect / height
+    length = max(1, round(span * proxy_size[1]))
+    offset = best_offset(sal.sum(axis=1), faces.sum(axis=1), length)
+    top = min(offset / proxy_size[1], 1 - span)
+    return (0.0, top, 1.0, top + span)
+
+
+def source_box(window, size):
+    """Pixel box of a fractional window on an image of size."""
+    width, height = size
+    left, top, right, bottom = window
+    return (left * width, top * height, right * width, bottom * height)
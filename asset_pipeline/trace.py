@@ -0,0 +1,157 @@
+"""
+Per-stage tracing of a build: where the time, bytes and memory go.
+
+With build --trace PREFIX (or --profile for the summary only), every
+decode, transform and encode a worker runs is recorded as a span:
+
+    {"name": "remove_bg", "cat": "transform", "asset": "logo-vertical.png",
+     "ts": 1760000000123456, "dur": 412345, "pid": 4242,
+     "pixels_in": 2359296, "pixels_out": 2359296, "bytes_out": 9437184,
+     "rss_delta": 18874368}
+
+ts and dur are microseconds (ts is wall-clock time, so spans from
+different worker processes line up). bytes_in/bytes_out are file bytes
+for decodes and encodes, raw pixel bytes for transforms. rss_delta is
+how much the resident set grew over the span; memory freed inside a span
+makes it negative. Code run by a stage can open its own spans
+(remove_bg's mask, labeling and alpha steps do), which nest inside the
+stage's span in the Chrome view.
+
+PREFIX.jsonl gets one span per line and PREFIX.trace.json the same spans
+in the Chrome trace event format (chrome://tracing, ui.perfetto.dev).
+The build ends with a table of the slowest stages and assets.
+
+Recording is per process and off by default: span() then costs one
+global lookup.
+"""
+import json
+import os
+import time
+
+from PIL import Image
+
+from .memory import rss
+
+_events = None
+SUMMARY_ROWS = 10
+
+
+def start():
+    """Start recording spans in this process."""
+    global _events
+    _events = []
+
+
+def stop():
+    """Stop recording and return the spans recorded since start()."""
+    global _events
+    events, _events = _events, None
+    return events or []
+
+
+def recording():
+    return _events is not None
+
+
+class Span:
+    """Context manager recording one span; set() adds fields before it ends."""
+
+    def __init__(self, name, cat="stage", asset=None, **fields):
+        self.name, self.cat, self.asset, self.fields = name, cat, asset, fields
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        if _events is not None:
+            self.rss = rss()
+            self.ts = time.time_ns() // 1000
+            self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if _events is None:
+            return False
+        dur = time.perf_counter() - self.t0
+        event = {"name": self.name, "cat": self.cat, "asset": self.asset, "ts": self.ts,
+                 "dur": round(dur * 1e6), "pid": os.getpid()}
+        event.update(self.fields)
+        after = rss()
+        if after is not None and self.rss is not None:
+            event["rss_delta"] = after - self.rss
+        if exc[0] is not None:
+            event["error"] = exc[0].__name__
+        _events.append(event)
+        return False
+
+
+def span(name, cat="stage", asset=None, **fields):
+    return Span(name, cat, asset, **fields)
+
+
+def image_bytes(img):
+    """Raw pixel bytes of an image (or SizePyramid)."""
+    return img.width * img.height * Image.getmodebands(img.mode)
+
+
+def write_jsonl(events, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+def chrome_trace(events):
+    """Chrome trace event format: complete ("X") events, one row per process."""
+    origin = min((e["ts"] for e in events), default=0)
+    trace = []
+    for e in events:
+        args = {k: v for k, v in e.items() if k not in ("name", "cat", "ts", "dur", "pid")}
+        trace.append({"name": e["name"], "cat": e["cat"], "ph": "X", "ts": e["ts"] - origin,
+                      "dur": e["dur"], "pid": e["pid"], "tid": e["pid"], "args": args})
+    return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+
+def write(events, prefix):
+    """Write PREFIX.jsonl and PREFIX.trace.json; returns their paths."""
+    directory = os.path.dirname(prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    lines, chrome = prefix + ".jsonl", prefix + ".trace.json"
+    write_jsonl(events, lines)
+    with open(chrome, "w", encoding="utf-8") as f:
+        json.dump(chrome_trace(events), f)
+    return lines, chrome
+
+
+def aggregate(events, field):
+    """{value of field: [count, total µs, max µs, bytes_out, rss_delta]}, top-level spans only."""
+    found = {}
+    for e in events:
+        if e["cat"] == "step" or e.get(field) is None:
+            continue
+        row = found.setdefault(e[field], [0, 0, 0, 0, 0])
+        row[0] += 1
+        row[1] += e["dur"]
+        row[2] = max(row[2], e["dur"])
+        row[3] += e.get("bytes_out", 0)
+        row[4] = max(row[4], e.get("rss_delta", 0))
+    return found
+
+
+def summary(events, log=print, rows=SUMMARY_ROWS):
+    """Log the slowest stages (by op/encoder) and assets of a build."""
+    if not events:
+        return
+
+    def table(title, found):
+        log(f"\n{title:<34} {'count':>5} {'total':>9} {'mean':>9} {'max':>9} {'out':>9} {'rss +':>7}")
+        for key, (count, total, longest, out, grew) in sorted(
+                found.items(), key=lambda kv: -kv[1][1])[:rows]:
+            log(f"  {str(key)[:32]:<32} {count:>5} {total / 1e3:>7.1f}ms {total / count / 1e3:>7.1f}ms "
+                f"{longest / 1e3:>7.1f}ms {out / 1024:>6.0f} KB {grew / 1024 / 1024:>4.0f} MB")
+
+    table("slowest stages", aggregate(events, "name"))
+    steps = [{**e, "cat": "stage"} for e in events if e["cat"] == "step"]
+    if steps:
+        table("slowest steps inside stages", aggregate(steps, "name"))
+    table("slowest assets", aggregate(events, "asset"))
@@ -0,0 +1,168 @@
+"""
+image-variants.json: the formats built for every output that declares
+"variants", so <picture>/srcset markup can be generated from it.
+
+Entries are keyed by the URL of the primary output (the file index.html
+already references):
+
+    "/public/SeeSite4.png": {
+        "width": 1200, "height": 480,
+        "fallback": {"url": "/public/SeeSite4.jpg", "type": "image/jpeg", "bytes": ...},
+        "sources": [{"url": "/public/SeeSite4.avif", "type": "image/avif", "bytes": ...},
+                    {"url": "/public/SeeSite4.webp", "type": "image/webp", "bytes": ...}]
+    }
+
+The fallback is the smallest of the formats every browser decodes (JPEG,
+PNG). Modern formats are only listed when they beat it, smallest first, so
+the browser's first supported <source> is also the lightest one.
+
+Outputs with breakpoints also get "sizes" and, per format, a "srcset" of
+[url, width] pairs covering every rung of the ladder.
+"""
+import json
+import os
+from urllib.parse import quote
+
+from PIL import Image
+
+from . import VARIANTS_MANIFEST
+from .encoders import MIME_TYPES
+
+UNIVERSAL = ("jpeg", "png")
+
+
+def url_for(graph, path):
+    return "/" + graph.relative(path).replace(os.sep, "/")
+
+
+def root(out):
+    out = out.variant_of or out
+    return out.breakpoint_of or out
+
+
+def families(graph, outputs):
+    """{primary: (members, rungs)} for the outputs with variants or breakpoints.
+
+    members are the primary and its other formats; rungs the same lists for
+    each of its breakpoint outputs.
+    """
+    selected = {id(root(o)) for o in outputs}
+    formats = {}
+    for out in graph.outputs:
+        if out.variant_of is not None:
+            formats.setdefault(id(out.variant_of), []).append(out)
+    found = {}
+    for out in graph.outputs:
+        if out.variant_of is not None or id(root(out)) not in selected:
+            continue
+        members = [out, *formats.get(id(out), [])]
+        if out.breakpoint_of is None:
+            found.setdefault(out, ([], []))[0].extend(members)
+        else:
+            found.setdefault(out.breakpoint_of, ([], []))[1].append(members)
+    return {p: f for p, f in found.items() if len(f[0]) > 1 or f[1]}
+
+
+def entry_for(graph, primary, members, rungs):
+    files = [(o, os.path.getsize(o.path)) for o in members if os.path.exists(o.path)]
+    if not files:
+        return None
+
+    def describe(out, size):
+        found = {"url": url_for(graph, out.path), "type": MIME_TYPES[out.format], "bytes": size}
+        if rungs:
+            candidates = [(o, o.width) for rung in rungs for o in rung
+                          if o.format == out.format and os.path.exists(o.path)]
+            found["srcset"] = sorted([[url_for(graph, o.path), w]
+                                      for o, w in [(out, primary.width), *candidates]],
+                                     key=lambda c: c[1])
+        return found
+
+    universal = [f for f in files if f[0].format in UNIVERSAL] or files[:1]
+    fallback = min(universal, key=lambda f: f[1])
+    modern = sorted((f for f in files if f[0].format not in UNIVERSAL and f[1] < fallback[1]),
+                    key=lambda f: f[1])
+    with Image.open(fallback[0].path) as im:
+        width, height = im.size
+    entry = {
+        "width": width,
+        "height": height,
+        "fallback": describe(*fallback),
+        "sources": [describe(*f) for f in modern],
+    }
+    if rungs:
+        entry["sizes"] = primary.sizes
+    return entry
+
+
+def load_variants(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_manifest(graph, outputs, path=None):
+    """Refresh the entries of outputs in image-variants.json.
+
+    Entries of other groups are kept, so a partial build (-g) does not drop
+    them; entries whose output no longer declares variants are removed.
+    Returns (refreshed entries, bytes a browser with every format saves
+    over the primary files).
+    """
+    path = path or os.path.join(graph.base_dir, VARIANTS_MANIFEST)
+    found = families(graph, outputs)
+    if not found and not os.path.exists(path):
+        return {}, 0
+    entries = load_variants(path)
+    known = {url_for(graph, o.path) for o in families(graph, graph.outputs)}
+    entries = {url: e for url, e in entries.items() if url in known}
+    refreshed, saved = {}, 0
+    for primary, (members, rungs) in found.items():
+        entry = entry_for(graph, primary, members, rungs)
+        if entry is not None:
+            refreshed[url_for(graph, primary.path)] = entry
+            best = (entry["sources"] or [entry["fallback"]])[0]["bytes"]
+            if os.path.exists(primary.path):
+                saved += max(0, os.path.getsize(primary.path) - best)
+    entries.update(refreshed)
+    data = json.dumps(dict(sorted(entries.items())), indent=2, ensure_ascii=False)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(data + "\n")
+    return refreshed, saved
+
+
+def with_assets(entry, assets):
+    """entry with its URLs replaced by their hashed names in assets
+    (asset-manifest.json, see fingerprint.py) where they have one."""
+    def swap(image):
+        image = {**image, "url": assets.get(image["url"], image["url"])}
+        if "srcset" in image:
+            image["srcset"] = [[assets.get(url, url), width] for url, width in image["srcset"]]
+        return image
+
+    return {**entry, "fallback": swap(entry["fallback"]), "sources": [swap(s) for s in entry["sources"]]}
+
+
+def srcset_attr(image):
+    if "srcset" not in image:
+        return quote(image["url"])
+    return ", ".join(f"{quote(url)} {width}w" for url, width in image["srcset"])
+
+
+def picture_markup(entry, alt="", sizes=None, **attrs):
+    """<picture> element for one image-variants.json entry."""
+    sizes = sizes or entry.get("sizes")
+    sizes_attr = f' sizes="{sizes}"' if sizes else ""
+    lines = ["<picture>"]
+    for source in entry["sources"]:
+        lines.append(f'  <source type="{source["type"]}" srcset="{srcset_attr(source)}"{sizes_attr}>')
+    fallback = entry["fallback"]
+    if "srcset" in fallback:
+        attrs = {"srcset": srcset_attr(fallback), "sizes": sizes, **attrs}
+    extra = "".join(f' {k.replace("_", "-")}="{v}"' for k, v in attrs.items())
+    lines.append(f'  <img src="{quote(fallback["url"])}" width="{entry["width"]}" '
+                 f'height="{entry["height"]}" alt="{alt}"{extra}>')
+    lines.append("</picture>")
+    return "\n".join(lines)
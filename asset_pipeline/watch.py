@@ -0,0 +1,194 @@
+"""
+Watch mode: rebuild the outputs of a source file as soon as it changes.
+
+watch() builds once, then waits for changes to the manifest's source
+files and to the manifest itself:
+
+- on Linux the directories holding them are watched with inotify (through
+  ctypes, no extra dependency); elsewhere, or when inotify is unavailable,
+  the files are polled every POLL_INTERVAL seconds;
+- a burst of events (an editor's save, a copy of several photos) is
+  collected until DEBOUNCE seconds pass without a new one, then handled as
+  a single rebuild;
+- a file only counts as changed when its mtime or size differs from what
+  was last seen, and the masters a build rewrites in place (the logos) are
+  looked at again after it, so they do not trigger another build; changes
+  made while a build runs are picked up once it is done;
+- only the outputs computed from the changed files are rebuilt
+  (Graph.select(sources=...)); a manifest change reloads it and rebuilds
+  everything, with the build cache skipping what did not change;
+- those outputs are first written as drafts (encoders.DRAFT_OPTIONS: same
+  pixels, fastest settings, no palette quantization), which takes a
+  fraction of a second for an icon, and then encoded for real. The final
+  encode of the icons (PNG sweeps, quantization, lossless WebP) takes
+  seconds and would otherwise be the whole edit-to-output latency.
+
+Builds run in this process (no worker pool), so the decoded-image cache of
+imagecache.py keeps every unchanged master decoded between rebuilds.
+"""
+import ctypes
+import os
+import select
+import struct
+import time
+
+from . import DEBOUNCE, imagecache
+from .engine import build
+from .manifest import load_manifest
+
+POLL_INTERVAL = 0.5
+# inotify(7)
+IN_ATTRIB, IN_CLOSE_WRITE = 0x4, 0x8
+IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x40, 0x80, 0x100, 0x200
+IN_NONBLOCK, IN_CLOEXEC = 0o4000, 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+
+def file_state(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class InotifyWatcher:
+    """Changed paths under a set of directories, from inotify events."""
+
+    def __init__(self, paths):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths = set(paths)
+        self.directories = {}
+        for directory in sorted({os.path.dirname(p) for p in self.paths}):
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"cannot watch {directory}")
+            self.directories[wd] = directory
+
+    def wait(self, timeout=None):
+        """Watched paths with events within timeout seconds (empty when none)."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed, offset = set(), 0
+        while offset < len(data):
+            wd, _, _, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            path = os.path.join(self.directories.get(wd, ""), os.fsdecode(name))
+            if path in self.paths:
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Changed paths found by comparing mtime and size every interval."""
+
+    def __init__(self, paths, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.states = {p: file_state(p) for p in paths}
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = set()
+            for path, state in self.states.items():
+                now = file_state(path)
+                if now != state:
+                    self.states[path] = now
+                    changed.add(path)
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            pause = self.interval if deadline is None else min(self.interval, deadline - time.monotonic())
+            time.sleep(max(pause, 0))
+
+    def close(self):
+        pass
+
+
+def open_watcher(paths, poll=False, log=print):
+    if not poll:
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError) as e:
+            log(f"⚠️  inotify unavailable ({e}), polling every {POLL_INTERVAL}s")
+    return PollingWatcher(paths)
+
+
+def collect(watcher, debounce=DEBOUNCE):
+    """Block until something changes, then gather the rest of the burst."""
+    changed = watcher.wait()
+    while True:
+        more = watcher.wait(debounce)
+        if not more:
+            return changed
+        changed |= more
+
+
+def watch(manifest_path, groups=None, cache=None, debounce=DEBOUNCE, poll=False, log=print,
+          image_cache=None, rebuilds=None):
+    """Build, then rebuild what each change to a source or the manifest
+    affects, until interrupted (or after rebuilds rebuilds, when given)."""
+    manifest_path = os.path.abspath(manifest_path)
+    graph = load_manifest(manifest_path)
+    graph.select(groups)  # unknown groups fail here, not after the first change
+    build(graph, groups, cache=cache, workers=1, log=log, image_cache=image_cache)
+    watcher, done = None, 0
+    try:
+        while rebuilds is None or done < rebuilds:
+            if watcher is None:
+                watched = [manifest_path] + graph.source_paths()
+                states = {p: file_state(p) for p in watched}
+                watcher = open_watcher(watched, poll, log)
+                log(f"\n👀 watching {len(watched) - 1} sources and {os.path.basename(manifest_path)} "
+                    "(Ctrl+C to stop)")
+            changed = {p for p in collect(watcher, debounce) if file_state(p) != states[p]}
+            if not changed:
+                continue
+            for path in changed:
+                states[path] = file_state(path)
+
+            start = time.perf_counter()
+            for path in sorted(changed):
+                log(f"\n↻ {graph.relative(path)} changed")
+            if manifest_path in changed:
+                try:
+                    graph = load_manifest(manifest_path)
+                except (OSError, ValueError) as e:
+                    log(f"  ❌ manifest not reloaded: {e}")
+                    continue
+                watcher.close()
+                watcher = None
+                stats = build(graph, groups, cache=cache, workers=1, log=log, image_cache=image_cache)
+            else:
+                drafts = build(graph, groups, workers=1, log=lambda *_: None, image_cache=image_cache,
+                               sources=changed, draft=True)
+                log(f"⚡ {drafts['outputs']} drafts written in {time.perf_counter() - start:.2f}s, "
+                    "encoding the final files...")
+                stats = build(graph, groups, cache=cache, workers=1, log=log, image_cache=image_cache,
+                              sources=changed)
+                # Masters the build rewrote in place are not changes to react to
+                for out in graph.outputs:
+                    if out.path in states:
+                        states[out.path] = file_state(out.path)
+            done += 1
+            log(f"⏱  {stats['outputs']} outputs rebuilt in {time.perf_counter() - start:.2f}s "
+                f"({imagecache.shared().stats()['entries']} images kept decoded)")
+    finally:
+        if watcher is not None:
+            watcher.close()
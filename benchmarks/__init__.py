@@ -0,0 +1 @@
+"""Standalone benchmarks for the image scripts: python -m benchmarks.<name>."""
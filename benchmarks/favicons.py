@@ -0,0 +1,138 @@
+"""
+Time the favicon bundle (asset_pipeline/favicons.py) against the three
+favicon paths it replaces, on the real icon masters.
+
+    python -m benchmarks.favicons [--repeat 3] [-j N]
+
+Before the bundle, a full regeneration ran three separate favicon paths,
+each resizing its master again and encoding favicon.ico (Pillow resizing
+the frames once more), favicon-32x32.png and apple-touch-icon.png on its
+own, then copying them to public/:
+
+- generate_icons.py, from botao-pequeno@2x.png;
+- process_brand_assets.py, from logo-icon-blue.png (32 px in linear light);
+- the manifest's favicons group (palette PNGs, ICO resized by Pillow).
+
+They are reproduced here as they were, each writing into a temporary
+directory. The bundle then runs from logo-icon-blue.png twice: without the
+PWA icons (the same favicons plus favicon-16x16.png), which is what it
+replaces, and whole (plus the PWA and maskable icons and site.webmanifest,
+which nothing produced before). Times are the best of --repeat runs and
+include decoding the master; bytes are those of the root files. The run
+fails when the bundle without PWA icons is not faster than the three paths
+together.
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+from PIL import Image
+
+from asset_pipeline.encoders import ICO_SIZES, encode_png
+from asset_pipeline.fanout import materialize, write_file
+from asset_pipeline.favicons import PALETTE, bundle
+from asset_pipeline.linear import resample
+from asset_pipeline.pyramid import SizePyramid
+from process_brand_assets import make_square
+
+ICON = "logo-icon-blue.png"
+BUTTON = "botao-pequeno@2x.png"
+LEGACY_FILES = ["favicon.ico", "favicon-32x32.png", "apple-touch-icon.png"]
+
+
+def load(name):
+    return make_square(Image.open(name).convert("RGBA"))
+
+
+def old_ico(img):
+    """favicon.ico as the scripts saved it: frames[0] and Pillow's resizes."""
+    frames = [img.resize((s, s), Image.LANCZOS) for s in ICO_SIZES]
+    buf = io.BytesIO()
+    frames[0].save(buf, format="ICO", sizes=[(s, s) for s in ICO_SIZES])
+    return buf.getvalue()
+
+
+def old_png(img):
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def write_all(files, out):
+    for name, data in files.items():
+        write_file(os.path.join(out, name), data)
+        materialize(os.path.join(out, name), os.path.join(out, "public", name))
+    return files
+
+
+def generate_icons(out):
+    src = SizePyramid(load(BUTTON))
+    return write_all({"favicon.ico": old_ico(src),
+                      "favicon-32x32.png": old_png(src.resize((32, 32))),
+                      "apple-touch-icon.png": old_png(src.resize((180, 180)))}, out)
+
+
+def process_brand_assets(out):
+    blue = SizePyramid(load(ICON))
+    return write_all({"favicon.ico": old_ico(blue),
+                      "favicon-32x32.png": old_png(resample(blue, (32, 32), True)),
+                      "apple-touch-icon.png": old_png(resample(blue, (180, 180)))}, out)
+
+
+def manifest_group(out):
+    square = load(ICON)
+    buf = io.BytesIO()
+    square.save(buf, format="ICO", sizes=[(s, s) for s in ICO_SIZES])
+    pyramid = SizePyramid(square)
+    return write_all({"favicon.ico": buf.getvalue(),
+                      "favicon-32x32.png": encode_png(resample(pyramid, (32, 32), True), **PALETTE),
+                      "apple-touch-icon.png": encode_png(resample(pyramid, (180, 180)), **PALETTE)}, out)
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as out:
+            t = time.perf_counter()
+            written = func(out)
+            elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best, written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="bundle encoder threads")
+    args = parser.parse_args(argv)
+
+    print(f"{'path':<28} {'time':>8} {'files':>6} {'bytes':>8}")
+    total = 0.0
+    for name, func in [("generate_icons.py", generate_icons),
+                       ("process_brand_assets.py", process_brand_assets),
+                       ("manifest favicons group", manifest_group)]:
+        elapsed, files = timed(func, args.repeat)
+        total += elapsed
+        print(f"{name:<28} {elapsed * 1000:>6.0f}ms {len(files):>6} "
+              f"{sum(len(d) for d in files.values()):>8}")
+    print(f"{'three paths together':<28} {total * 1000:>6.0f}ms {len(LEGACY_FILES):>6}")
+
+    results = {}
+    for pwa in (False, True):
+        label = "bundle" if pwa else "bundle without PWA icons"
+        elapsed, sizes = timed(lambda out: bundle(load(ICON), out, workers=args.jobs, pwa=pwa,
+                                                  log=lambda *_: None), args.repeat)
+        results[pwa] = elapsed
+        same = sum(sizes[name] for name in LEGACY_FILES)
+        print(f"{label:<28} {elapsed * 1000:>6.0f}ms {len(sizes):>6} {sum(sizes.values()):>8}"
+              f"  ({same} for the same three files)")
+    print(f"\nsame favicons: {total / results[False]:.1f}x the speed of the three paths; "
+          f"PWA icons and site.webmanifest add {(results[True] - results[False]) * 1000:.0f}ms")
+    if results[False] >= total:
+        raise SystemExit("the bundle is slower than the paths it replaces")
+
+
+if __name__ == "__main__":
+    main()
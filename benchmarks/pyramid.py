@@ -0,0 +1,66 @@
+"""
+Time SizePyramid against direct LANCZOS resizes of the real masters and
+report the worst per-channel error of every served size (quality gate).
+
+    python -m benchmarks.pyramid [--max-error 8] [--repeat 5]
+"""
+import argparse
+import time
+
+from PIL import Image
+
+from asset_pipeline.pyramid import SizePyramid, max_channel_error
+from process_brand_assets import make_square
+
+ICON_SIZES = [340, 180, 170, 64, 48, 32, 16]
+MASTERS = [
+    ("logo-icon-blue.png", ICON_SIZES),
+    ("logo-icon-white.png", ICON_SIZES),
+    ("logo-icon-red.png", ICON_SIZES),
+    ("logo-icon-red-alt.png", ICON_SIZES),
+    ("logo-horizontal.png", ICON_SIZES),
+    ("hero-brand-bg.png", ICON_SIZES),
+    ("foto-03-site-desktop-new.png", ICON_SIZES),
+]
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--max-error", type=float, default=8.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    failed = False
+    total_direct = total_pyramid = 0.0
+    print(f"{'master':<30} {'direct':>8} {'pyramid':>8}  worst error (size)")
+    for name, sizes in MASTERS:
+        master = make_square(Image.open(name).convert("RGBA"))
+        squares = [(s, s) for s in sizes]
+        t_direct, direct = timed(lambda: [master.resize(s, Image.LANCZOS) for s in squares], args.repeat)
+        t_pyr, served = timed(lambda: [SizePyramid(master).resize(s) for s in squares], args.repeat)
+        errors = [max_channel_error(p, d) for p, d in zip(served, direct)]
+        worst = max(range(len(errors)), key=errors.__getitem__)
+        total_direct += t_direct
+        total_pyramid += t_pyr
+        flag = "" if errors[worst] <= args.max_error else "  FAIL"
+        failed |= bool(flag)
+        print(f"{name:<30} {t_direct * 1000:>6.1f}ms {t_pyr * 1000:>6.1f}ms  "
+              f"{errors[worst]:.1f} ({sizes[worst]}px){flag}")
+    print(f"{'total':<30} {total_direct * 1000:>6.1f}ms {total_pyramid * 1000:>6.1f}ms  "
+          f"({total_direct / total_pyramid:.1f}x)")
+    if failed:
+        raise SystemExit(f"pyramid exceeds max error {args.max_error} vs direct LANCZOS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark asset_pipeline.background.remove_background against the original
+per-label / per-pixel implementation on synthetic logos of growing size,
+and check that both produce bit-identical alpha, and that
+asset_pipeline.labeling.label numbers the background exactly like the
+reference labeler.
+
+    python -m benchmarks.remove_bg [--sizes 512 1024 2048 4096] [--repeat 3] [--low-memory]
+
+The reference needs no SciPy: it labels with reference_label(), a
+breadth-first fill in plain Python (scipy.ndimage.label's numbering, which
+the original called), so the check means the same thing on machines where
+the pipeline itself falls back to labeling.py. Its times include that
+fill, and are slower than the original's were.
+"""
+import argparse
+import functools
+import time
+from collections import deque
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from asset_pipeline.background import THRESHOLD, remove_background
+from asset_pipeline.labeling import label
+
+
+def reference_label(mask):
+    """(labels, count) of mask's 4-connected components, numbered from 1 in
+    raster order of their first pixel, by a breadth-first fill per component."""
+    h, w = mask.shape
+    inside = mask.ravel().tolist()
+    labels = [0] * (h * w)
+    count = 0
+    for start in np.flatnonzero(mask).tolist():
+        if labels[start]:
+            continue
+        count += 1
+        labels[start] = count
+        queue = deque([start])
+        while queue:
+            p = queue.popleft()
+            x = p % w
+            for q, ok in ((p - 1, x > 0), (p + 1, x < w - 1), (p - w, p >= w), (p + w, p + w < h * w)):
+                if ok and inside[q] and not labels[q]:
+                    labels[q] = count
+                    queue.append(q)
+    return np.array(labels, dtype=np.int32).reshape(h, w), count
+
+
+def reference_mask(img, threshold=THRESHOLD):
+    """Pixels with R,G,B all > threshold."""
+    arr = np.asarray(img.convert('RGB'))
+    return (arr[:, :, 0] > threshold) & (arr[:, :, 1] > threshold) & (arr[:, :, 2] > threshold)
+
+
+def remove_background_reference(img, threshold=THRESHOLD):
+    """The loop-based implementation remove_background() replaced."""
+    arr = np.array(img.convert('RGBA'))
+    r, g, b = arr[:, :, 0], arr[:, :, 1], arr[:, :, 2]
+    bg_mask = (r > threshold) & (g > threshold) & (b > threshold)
+    labeled, num = reference_label(bg_mask)
+
+    edge_labels = set()
+    edge_labels.update(labeled[0, :].tolist())
+    edge_labels.update(labeled[-1, :].tolist())
+    edge_labels.update(labeled[:, 0].tolist())
+    edge_labels.update(labeled[:, -1].tolist())
+    edge_labels.discard(0)
+
+    final_mask = np.zeros_like(bg_mask)
+    for lbl in edge_labels:
+        final_mask |= (labeled == lbl)
+
+    # One step of binary dilation with the cross structure, outside as False
+    padded = np.pad(final_mask, 1)
+    dilated = (padded[1:-1, 1:-1] | padded[:-2, 1:-1] | padded[2:, 1:-1]
+               | padded[1:-1, :-2] | padded[1:-1, 2:])
+    border = dilated & ~final_mask
+    arr[final_mask, 3] = 0
+    for y, x in zip(*np.where(border)):
+        luminance = (int(arr[y, x, 0]) + int(arr[y, x, 1]) + int(arr[y, x, 2])) / 3
+        if luminance > threshold:
+            arr[y, x, 3] = max(0, int(255 - (luminance - threshold) * (255 / (255 - threshold))))
+    return Image.fromarray(arr)
+
+
+SCENARIOS = {
+    # clean master: flat white background
+    "clean": (250, 4),
+    # scanned/JPEG-ish master: background noise straddles the threshold and
+    # breaks into thousands of small edge-touching regions
+    "noisy": (240, 12),
+}
+
+
+def synthetic_logo(width, background=250, noise=4, seed=0):
+    """Logo-like test image: dark marks with white holes on a noisy near-white
+    background, split by full-height bars into several edge-touching regions."""
+    rng = np.random.default_rng(seed)
+    height = width // 2
+    img = Image.new("RGB", (width, height), (background,) * 3)
+    draw = ImageDraw.Draw(img)
+    unit = max(width // 64, 2)
+    for i in range(1, 8):
+        x = i * width // 8
+        draw.rectangle([x - unit // 2, 0, x + unit // 2, height], fill=(20, 40, 90))
+        cx, cy, rad = x - width // 16, height // 2, width // 24
+        draw.ellipse([cx - rad, cy - rad, cx + rad, cy + rad], fill=(200, 30, 50))
+        draw.ellipse([cx - rad // 2, cy - rad // 2, cx + rad // 2, cy + rad // 2], fill=(252, 252, 252))
+    img = img.filter(ImageFilter.GaussianBlur(unit / 4))
+    jitter = rng.integers(-noise, noise + 1, size=(height, width, 3))
+    arr = np.clip(np.asarray(img, dtype=np.int16) + jitter, 0, 255).astype(np.uint8)
+    return Image.fromarray(arr)
+
+
+def best_of(func, img, repeat):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = func(img)
+        times.append(time.perf_counter() - t)
+    return min(times), out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 2048, 4096])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="time the flood-fill (low_memory=True) path instead of labeling")
+    args = parser.parse_args(argv)
+    vectorized = functools.partial(remove_background, low_memory=args.low_memory)
+
+    warmup = synthetic_logo(64)  # imports and first-call costs
+    remove_background_reference(warmup)
+    vectorized(warmup)
+
+    print(f"{'scenario':<8} {'size':>11} {'reference':>10} {'vectorized':>10} {'speedup':>8}  "
+          f"{'alpha':<9}  labels")
+    for scenario in args.scenario or list(SCENARIOS):
+        background, noise = SCENARIOS[scenario]
+        for width in args.sizes:
+            img = synthetic_logo(width, background, noise)
+            t_ref, ref = best_of(remove_background_reference, img, args.repeat)
+            t_new, new = best_of(vectorized, img, args.repeat)
+            same = np.array_equal(np.asarray(ref), np.asarray(new))
+            mask = reference_mask(img)
+            expected, count = reference_label(mask)
+            labeled, found = label(mask)
+            same_labels = found == count and np.array_equal(labeled, expected)
+            print(f"{scenario:<8} {width:>5}x{img.height:<5} {t_ref:>9.3f}s {t_new:>9.3f}s "
+                  f"{t_ref / t_new:>7.1f}x  {'identical' if same else 'DIFFERENT':<9}  "
+                  f"{'identical' if same_labels else 'DIFFERENT'} ({count})")
+            if not same:
+                raise SystemExit("remove_background() no longer matches the reference")
+            if not same_labels:
+                raise SystemExit("labeling.label() no longer matches the reference labeler")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Benchmark every transform and encoder of the image pipeline on synthetic
+inputs and track regressions against a stored baseline.
+
+    python -m benchmarks.suite [--size small medium huge] [--case remove_bg ...]
+                               [--repeat 3] [--threshold 0.2]
+                               [--baseline benchmarks/baseline.json] [--save-baseline] [--ci]
+
+Each case runs on small (256px), medium (1024px) and huge (4096px) inputs
+generated locally, so nothing depends on the site's files. For every
+case/size it records the best wall time and CPU time over --repeat runs,
+the peak memory growth of the first run and the output bytes (encoded size
+for encoders, raw pixel bytes for transforms). Results go to
+benchmarks/results/latest.json.
+
+Whenever png_encode runs, a photo-sized PNG (PHOTO_WIDTH, synthetic) is
+also encoded in a fresh process, decoded from a file so nothing freed
+before counts as reused memory, and the run fails when its peak RSS grows
+by more than PHOTO_PEAK_PER_BYTE times its pixel bytes plus
+PHOTO_PEAK_FIXED: pngopt once held every filter of the whole image at
+once (70x the pixels).
+
+With a baseline, a case that got slower, used more memory or produced more
+bytes by more than --threshold (relative, ignoring differences below
+MIN_SECONDS / MIN_MEMORY) is reported and the run exits with status 1.
+--save-baseline writes the current results as the new baseline.
+
+No baseline is committed: times only compare on the machine that recorded
+them, so each machine (or CI runner image) saves its own, and the baseline
+notes the environment it came from. Without a baseline the run only prints
+its results, except with --ci (or the CI environment variable set), where
+a missing baseline fails the run instead of passing it unchecked.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+import numpy as np
+import PIL
+from PIL import Image
+
+import fix_logo_backgrounds
+import generate_icons
+import generate_variants
+from asset_pipeline.background import remove_background
+from asset_pipeline.breakpoints import render
+from asset_pipeline.compositing import composite_variants
+from asset_pipeline.encoders import encode_ico, encode_jpeg, encode_png
+from asset_pipeline.memory import PeakMeter, megabytes
+from benchmarks.remove_bg import synthetic_logo
+from process_brand_assets import make_square
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(HERE, "results", "latest.json")
+SIZES = {"small": 256, "medium": 1024, "huge": 4096}
+BANNER = (1920, 480)
+MIN_SECONDS = 0.005
+MIN_MEMORY = 4 * 1024 * 1024
+PHOTO_WIDTH = 2400
+PHOTO_PEAK_PER_BYTE = 16
+PHOTO_PEAK_FIXED = 32 * 1024 * 1024
+
+
+def synthetic_icon(width):
+    """RGBA logo on a transparent, non-square canvas (like the icon masters)."""
+    arr = np.asarray(synthetic_logo(width))
+    alpha = np.where(arr.min(axis=2) > 235, 0, 255).astype(np.uint8)
+    return Image.fromarray(np.dstack([arr, alpha]))
+
+
+def synthetic_photo(width, seed=0):
+    """Smooth gradients plus grain, 16:9, standing in for the banner photos."""
+    rng = np.random.default_rng(seed)
+    height = width * 9 // 16
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([x / width * 200, y / height * 180, (x + y) / (width + height) * 255], axis=2)
+    grain = rng.normal(0, 6, size=base.shape)
+    return Image.fromarray(np.clip(base + grain, 0, 255).astype(np.uint8))
+
+
+def load_source_from(path):
+    with mock.patch.object(generate_icons, "SRC", path):
+        return generate_icons.load_source()
+
+
+# name -> (input generator, function of the input)
+CASES = {
+    "make_square": (synthetic_icon, make_square),
+    "load_source": ("icon.png", load_source_from),
+    "resize_width": (synthetic_icon, lambda img: fix_logo_backgrounds.resize_width(img, img.width // 4)),
+    "resize_height": (synthetic_icon, lambda img: fix_logo_backgrounds.resize_height(img, img.height // 4)),
+    "resize_width_linear": (synthetic_icon,
+                            lambda img: fix_logo_backgrounds.resize_width(img, img.width // 4, linear=True)),
+    "remove_bg": (synthetic_logo, remove_background),
+    "banner_fit": (synthetic_photo, lambda img: render(img, BANNER, fit=True)),
+    "banner_cover": (synthetic_photo, lambda img: render(img, BANNER, crop_offset=-40)),
+    "icon_variants": (lambda w: make_square(synthetic_icon(w)),
+                      lambda img: composite_variants(img, generate_variants.BACKGROUNDS, tuple(generate_variants.SIZES))),
+    "ico": (lambda w: make_square(synthetic_icon(w)), encode_ico),
+    "png_encode": (synthetic_icon, encode_png),
+    "jpeg_encode": (synthetic_photo, encode_jpeg),
+}
+
+
+def make_input(kind, width, tmpdir):
+    if kind == "icon.png":
+        path = os.path.join(tmpdir, f"icon-{width}.png")
+        synthetic_icon(width).save(path)
+        return path
+    return kind(width)
+
+
+def output_bytes(result):
+    if isinstance(result, bytes):
+        return len(result)
+    if isinstance(result, dict):
+        return sum(output_bytes(r) for r in result.values())
+    return result.width * result.height * len(result.getbands())
+
+
+def measure(func, arg, repeat):
+    wall = cpu = None
+    with PeakMeter() as meter:
+        result = func(arg)
+    for _ in range(repeat):
+        w, c = time.perf_counter(), time.process_time()
+        func(arg)
+        w, c = time.perf_counter() - w, time.process_time() - c
+        wall = w if wall is None else min(wall, w)
+        cpu = c if cpu is None else min(cpu, c)
+    return {"wall": wall, "cpu": cpu, "peak": meter.growth, "bytes": output_bytes(result)}
+
+
+def encode_peak(path):
+    """(peak RSS growth, pixel bytes) of encode_png on the image at path."""
+    with Image.open(path) as img:
+        img.load()
+        with PeakMeter() as meter:
+            encode_png(img)
+        return meter.growth, img.width * img.height * len(img.getbands())
+
+
+def check_photo_peak(tmpdir):
+    """Encode a photo-sized PNG in a fresh process; (growth, limit) or None
+    when the peak cannot be measured here."""
+    path = os.path.join(tmpdir, "photo.png")
+    synthetic_photo(PHOTO_WIDTH).save(path)
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        growth, raw = pool.submit(encode_peak, path).result()
+    if growth is None:
+        return None
+    return growth, raw * PHOTO_PEAK_PER_BYTE + PHOTO_PEAK_FIXED
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results, baseline, threshold):
+    """[(key, metric, old, new)] of the metrics that regressed."""
+    floors = {"wall": MIN_SECONDS, "cpu": MIN_SECONDS, "peak": MIN_MEMORY, "bytes": 0}
+    regressions = []
+    for key, new in results.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        for metric, floor in floors.items():
+            a, b = old.get(metric), new.get(metric)
+            if a is None or b is None:
+                continue
+            if b - a > floor and b > a * (1 + threshold):
+                regressions.append((key, metric, a, b))
+    return regressions
+
+
+def fmt(metric, value):
+    if value is None:
+        return "-"
+    if metric in ("wall", "cpu"):
+        return f"{value * 1000:.1f}ms"
+    if metric == "peak":
+        return megabytes(value)
+    return f"{value / 1024:.0f} KB"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", choices=list(SIZES), action="append")
+    parser.add_argument("--case", choices=list(CASES), action="append")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown/growth that counts as a regression (default 0.2)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--ci", action="store_true", default=bool(os.environ.get("CI")),
+                        help="fail when there is no baseline (default when CI is set)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'case':<24} {'input':>10} {'wall':>9} {'cpu':>9} {'peak':>7} {'output':>9}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in args.case or list(CASES):
+            kind, func = CASES[name]
+            func(make_input(kind, 64, tmpdir))  # imports and first-call costs
+            for size in args.size or list(SIZES):
+                arg = make_input(kind, SIZES[size], tmpdir)
+                r = measure(func, arg, args.repeat)
+                if isinstance(arg, str):
+                    with Image.open(arg) as im:
+                        r["input"] = f"{im.width}x{im.height}"
+                else:
+                    r["input"] = f"{arg.width}x{arg.height}"
+                results[f"{name}/{size}"] = r
+                print(f"{name + '/' + size:<24} {r['input']:>10} {fmt('wall', r['wall']):>9} "
+                      f"{fmt('cpu', r['cpu']):>9} {fmt('peak', r['peak']):>7} {fmt('bytes', r['bytes']):>9}")
+        photo_peak = check_photo_peak(tmpdir) if "png_encode" in (args.case or CASES) else None
+    if photo_peak is not None:
+        growth, limit = photo_peak
+        print(f"\npng_encode of a {PHOTO_WIDTH}px photo: peak +{megabytes(growth)} "
+              f"(limit {megabytes(limit)})")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+    print(f"\nresults: {os.path.relpath(args.output)}")
+    if photo_peak is not None and photo_peak[0] > photo_peak[1]:
+        raise SystemExit(f"png_encode peak memory over its limit: {megabytes(photo_peak[0])} > "
+                         f"{megabytes(photo_peak[1])}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+        print(f"baseline saved: {os.path.relpath(args.baseline)}")
+        return
+
+    if not os.path.exists(args.baseline):
+        if args.ci:
+            raise SystemExit(f"no baseline at {os.path.relpath(args.baseline)}: nothing was "
+                             "checked (save one on this runner with --save-baseline)")
+        print("no baseline to compare with (run with --save-baseline)")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    current = environment()
+    changed = [k for k in ("python", "pillow", "numpy", "machine", "cpus")
+               if baseline.get("environment", {}).get(k) != current[k]]
+    if changed:
+        print(f"note: baseline recorded with a different {', '.join(changed)}")
+    regressions = compare(results, baseline["results"], args.threshold)
+    for key, metric, old, new in regressions:
+        change = f" ({(new / old - 1) * 100:+.0f}%)" if old else ""
+        print(f"  REGRESSION {key} {metric}: {fmt(metric, old)} -> {fmt(metric, new)}{change}")
+    if regressions:
+        raise SystemExit(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+    print(f"no regressions over {args.threshold:.0%} against {os.path.relpath(args.baseline)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,15 @@
 """Remove white/light-gray backgrounds from logo images and regenerate web sizes."""
-from PIL import Image
 import numpy as np
-import shutil
 
-THRESHOLD = 230  # pixels with R,G,B all > this are background
+from asset_pipeline.background import THRESHOLD, remove_background
+from asset_pipeline.fanout import materialize
+from asset_pipeline.imagecache import open_image
+from asset_pipeline.linear import resample
+from asset_pipeline.pyramid import SizePyramid
 
 def remove_bg(path, threshold=THRESHOLD):
     """Remove near-white background, replacing with transparency."""
-    img = Image.open(path).convert('RGBA')
-    arr = np.array(img)
-    
-    # Identify near-white/light pixels
-    r, g, b, a = arr[:,:,0], arr[:,:,1], arr[:,:,2], arr[:,:,3]
-    bg_mask = (r > threshold) & (g > threshold) & (b > threshold)
-    
-    # Use flood-fill approach from corners to only remove connected background
-    from scipy import ndimage
-    # Label connected components in the background mask
-    labeled, num = ndimage.label(bg_mask)
-    
-    # Find labels that touch any edge
-    edge_labels = set()
-    h, w = labeled.shape
-    edge_labels.update(labeled[0, :].tolist())      # top
-    edge_labels.update(labeled[-1, :].tolist())     # bottom
-    edge_labels.update(labeled[:, 0].tolist())      # left
-    edge_labels.update(labeled[:, -1].tolist())     # right
-    edge_labels.discard(0)  # 0 = non-background
-    
-    # Only make edge-connected white regions transparent
-    final_mask = np.zeros_like(bg_mask)
-    for lbl in edge_labels:
-        final_mask |= (labeled == lbl)
-    
-    # Apply transparency with anti-aliasing at edges
-    # For pixels on the border of the mask, use partial transparency
-    from scipy.ndimage import binary_dilation
-    dilated = binary_dilation(final_mask, iterations=1)
-    border = dilated & ~final_mask
-    
-    arr[final_mask, 3] = 0  # Fully transparent
-    # Border pixels get partial transparency for smoother edges
-    for y, x in zip(*np.where(border)):
-        luminance = (int(arr[y,x,0]) + int(arr[y,x,1]) + int(arr[y,x,2])) / 3
-        if luminance > threshold:
-            arr[y, x, 3] = max(0, int(255 - (luminance - threshold) * (255 / (255 - threshold))))
-    
-    result = Image.fromarray(arr)
-    return result
+    return remove_background(open_image(path), threshold)
 
 
 def process_and_save(src, dest, threshold=THRESHOLD):
@@ -58,31 +20,24 @@ def process_and_save(src, dest, threshold=THRESHOLD):
     return img
 
 
-def resize_height(img, h):
+def resize_height(img, h, linear=False):
     ratio = h / img.height
     w = int(img.width * ratio)
-    return img.resize((w, h), Image.LANCZOS)
+    return resample(img, (w, h), linear)
 
 
-def resize_width(img, w):
+def resize_width(img, w, linear=False):
     ratio = w / img.width
     h = int(img.height * ratio)
-    return img.resize((w, h), Image.LANCZOS)
+    return resample(img, (w, h), linear)
 
 
-if __name__ == '__main__':
-    try:
-        from scipy import ndimage
-    except ImportError:
-        import subprocess, sys
-        subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'scipy', '-q'])
-        from scipy import ndimage
-    
+def main():
     print("=== Removing backgrounds from logos ===\n")
     
     # 1. Logo Vertical
     print("Logo Vertical:")
-    vert = process_and_save('logo-vertical.png', 'logo-vertical.png')
+    vert = SizePyramid(process_and_save('logo-vertical.png', 'logo-vertical.png'))
     v200 = resize_height(vert, 200)
     v200.save('logo-vertical-200h.png', 'PNG', optimize=True)
     print(f"  ✓ logo-vertical-200h.png ({v200.size[0]}x{v200.size[1]})")
@@ -92,7 +47,7 @@ if __name__ == '__main__':
     
     # 2. Logo Horizontal
     print("\nLogo Horizontal:")
-    horiz = process_and_save('logo-horizontal.png', 'logo-horizontal.png')
+    horiz = SizePyramid(process_and_save('logo-horizontal.png', 'logo-horizontal.png'))
     for w in [400, 300, 200]:
         h = resize_width(horiz, w)
         name = f'logo-horizontal-{w}w.png'
@@ -101,26 +56,32 @@ if __name__ == '__main__':
     
     # 3. Logo Emboss (has slightly darker bg ~237)
     print("\nLogo Emboss:")
-    emb = process_and_save('logo-emboss.png', 'logo-emboss.png', threshold=225)
+    emb = SizePyramid(process_and_save('logo-emboss.png', 'logo-emboss.png', threshold=225))
     for w in [300, 200]:
         e = resize_width(emb, w)
         name = f'logo-emboss-{w}w.png'
         e.save(name, 'PNG', optimize=True)
         print(f"  ✓ {name} ({e.size[0]}x{e.size[1]})")
     
-    # Copy to public/
+    # Copy to public/ (linked or cloned; the masters above are never hard-linked,
+    # an editor saving over one in place would change the copy too)
     import os
     pub = 'public'
+    masters = ('logo-vertical.png', 'logo-horizontal.png', 'logo-emboss.png')
     for f in os.listdir('.'):
         if f.startswith(('logo-vertical','logo-horizontal','logo-emboss')) and f.endswith('.png'):
-            shutil.copy2(f, os.path.join(pub, f))
+            materialize(f, os.path.join(pub, f), hardlink=f not in masters)
     
     print("\n✅ All logos processed with transparent backgrounds!")
     
     # Verify
     for f in ['logo-vertical-200h.png', 'logo-horizontal-300w.png', 'logo-emboss-300w.png']:
-        img = Image.open(f)
+        img = open_image(f)
         arr = np.array(img)
         alpha_min = arr[:,:,3].min()
         transparent_pct = (arr[:,:,3] == 0).sum() / (arr.shape[0]*arr.shape[1]) * 100
         print(f"  {f}: transparent pixels = {transparent_pct:.1f}%")
+
+
+if __name__ == '__main__':
+    main()
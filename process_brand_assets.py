@@ -5,39 +5,37 @@ Uses logo-icon-blue.png as the primary icon for favicon and header.
 from PIL import Image
 import os
 
-BASE = "/workspaces/Site-TechTrust"
+from asset_pipeline.fanout import materialize
+from asset_pipeline.favicons import bundle, make_square
+from asset_pipeline.imagecache import open_image
+from asset_pipeline.linear import resample
+from asset_pipeline.pyramid import SizePyramid
 
-def make_square(img):
-    """Make image perfectly square with transparent padding."""
-    size = max(img.size)
-    square = Image.new("RGBA", (size, size), (0, 0, 0, 0))
-    offset = ((size - img.width) // 2, (size - img.height) // 2)
-    square.paste(img, offset, img)
-    return square
+BASE = os.path.dirname(os.path.abspath(__file__))
 
-def save_png(img, size, path):
-    resized = img.resize((size, size), Image.LANCZOS)
+def save_png(img, size, path, linear=False):
+    resized = resample(img, (size, size), linear)
     resized.save(path, format="PNG", optimize=True)
     print(f"  ✓ {os.path.basename(path)} ({size}x{size})")
 
-def save_ico(img, path):
-    sizes = [(16, 16), (32, 32), (48, 48), (64, 64)]
-    frames = [img.resize(s, Image.LANCZOS) for s in sizes]
-    frames[0].save(path, format="ICO", sizes=sizes)
-    print(f"  ✓ {os.path.basename(path)} (multi-size ICO)")
+def copy_to_public(name):
+    """Same bytes as the root file under public/, linked or cloned instead of encoded again."""
+    method = materialize(os.path.join(BASE, name), os.path.join(BASE, "public", name))
+    print(f"  ✓ public/{name} ({method})")
 
 def process_icon(src_name, out_prefix):
     """Process an icon image into all needed sizes."""
-    src = Image.open(os.path.join(BASE, src_name)).convert("RGBA")
-    sq = make_square(src)
+    src = open_image(os.path.join(BASE, src_name), "RGBA")
+    # All icon sizes are served from one chain of reductions of the square
+    sq = SizePyramid(make_square(src))
     
     # Header icons
     save_png(sq, 170, os.path.join(BASE, f"{out_prefix}.png"))
     save_png(sq, 340, os.path.join(BASE, f"{out_prefix}@2x.png"))
     
     # Copy to public/
-    save_png(sq, 170, os.path.join(BASE, "public", f"{out_prefix}.png"))
-    save_png(sq, 340, os.path.join(BASE, "public", f"{out_prefix}@2x.png"))
+    copy_to_public(f"{out_prefix}.png")
+    copy_to_public(f"{out_prefix}@2x.png")
     
     return sq
 
@@ -47,27 +45,22 @@ def main():
     
     # Generate favicons from blue icon
     print("\n  Favicons:")
-    save_ico(blue, os.path.join(BASE, "favicon.ico"))
-    save_png(blue, 32, os.path.join(BASE, "favicon-32x32.png"))
-    save_png(blue, 180, os.path.join(BASE, "apple-touch-icon.png"))
-    save_ico(blue, os.path.join(BASE, "public", "favicon.ico"))
-    save_png(blue, 32, os.path.join(BASE, "public", "favicon-32x32.png"))
-    save_png(blue, 180, os.path.join(BASE, "public", "apple-touch-icon.png"))
+    bundle(blue, BASE)
     
     print("\n=== Processing WHITE icon ===")
     white = process_icon("logo-icon-white.png", "icon-white")
     # Also save small version for inline use
-    save_png(white, 64, os.path.join(BASE, "icon-white-sm.png"))
+    save_png(white, 64, os.path.join(BASE, "icon-white-sm.png"), linear=True)
     
     print("\n=== Processing RED icon ===")
     red = process_icon("logo-icon-red.png", "icon-red")
-    save_png(red, 64, os.path.join(BASE, "icon-red-sm.png"))
+    save_png(red, 64, os.path.join(BASE, "icon-red-sm.png"), linear=True)
     
     print("\n=== Processing RED ALT icon ===")
     red_alt = process_icon("logo-icon-red-alt.png", "icon-red-alt")
     
     print("\n=== Processing HORIZONTAL logo ===")
-    logo_h = Image.open(os.path.join(BASE, "logo-horizontal.png")).convert("RGBA")
+    logo_h = SizePyramid(open_image(os.path.join(BASE, "logo-horizontal.png"), "RGBA"))
     # Save at good web sizes
     for w in [400, 300, 200]:
         ratio = w / logo_h.width
@@ -78,7 +71,7 @@ def main():
         print(f"  ✓ logo-horizontal-{w}w.png ({w}x{h})")
     
     print("\n=== Processing VERTICAL logo ===")
-    logo_v = Image.open(os.path.join(BASE, "logo-vertical.png")).convert("RGBA")
+    logo_v = SizePyramid(open_image(os.path.join(BASE, "logo-vertical.png"), "RGBA"))
     for h in [200, 150]:
         ratio = h / logo_v.height
         w = int(logo_v.width * ratio)
@@ -88,7 +81,7 @@ def main():
         print(f"  ✓ logo-vertical-{h}h.png ({w}x{h})")
     
     print("\n=== Processing EMBOSS logo ===")
-    logo_e = Image.open(os.path.join(BASE, "logo-emboss.png")).convert("RGBA")
+    logo_e = SizePyramid(open_image(os.path.join(BASE, "logo-emboss.png"), "RGBA"))
     for w in [300, 200]:
         ratio = w / logo_e.width
         h = int(logo_e.height * ratio)
@@ -98,7 +91,7 @@ def main():
         print(f"  ✓ logo-emboss-{w}w.png ({w}x{h})")
     
     print("\n=== Processing HERO BRAND background ===")
-    hero = Image.open(os.path.join(BASE, "hero-brand-bg.png")).convert("RGB")
+    hero = open_image(os.path.join(BASE, "hero-brand-bg.png"), "RGB")
     # Desktop hero: 1920x480
     hero_desktop = hero.resize((1920, 480), Image.LANCZOS)
     hero_desktop.save(os.path.join(BASE, "hero-brand-desktop.jpg"), format="JPEG", quality=85, optimize=True)
@@ -112,7 +105,7 @@ def main():
     print(f"  ✓ hero-brand-bg.jpg ({hero.size[0]}x{hero.size[1]})")
     
     print("\n=== Processing BRAND SHOWCASE ===")
-    showcase = Image.open(os.path.join(BASE, "brand-showcase.png")).convert("RGBA")
+    showcase = open_image(os.path.join(BASE, "brand-showcase.png"), "RGBA")
     showcase.save(os.path.join(BASE, "brand-showcase.png"), format="PNG", optimize=True)
     print(f"  ✓ brand-showcase.png ({showcase.size[0]}x{showcase.size[1]})")
     
@@ -2,86 +2,92 @@
 from PIL import Image
 import os
 
-TARGET_WIDTH = 1920
-TARGET_HEIGHT = 480
+from asset_pipeline.breakpoints import DESKTOP_SIZE, render
+from asset_pipeline.cache import BuildCache
+from asset_pipeline.parallel import run_ordered
 
-# Configuração das novas imagens - TODAS com modo FIT (mostrar imagem completa)
+TARGET_WIDTH, TARGET_HEIGHT = DESKTOP_SIZE
+
+# Configuração das novas imagens - crop automático (janela escolhida por saliência,
+# asset_pipeline/smartcrop.py); 'fit': True mostra a imagem completa, com barras
 images = [
-    {'file': 'foto-02-site-desktop-new.jpg', 'output': 'foto-02-site-desktop.png', 'fit': True},
-    {'file': 'foto-03-site-desktop-new.png', 'output': 'foto-03-site-desktop.png', 'fit': True},
-    {'file': 'foto-04-site-desktop-new.jpg', 'output': 'foto-04-site-desktop.png', 'fit': True},
-    {'file': 'foto-05-site-desktop-new.jpg', 'output': 'foto-05-site-desktop.png', 'fit': True},
-    {'file': 'foto-06-site-desktop-new.jpg', 'output': 'foto-06-site-desktop.png', 'fit': True},
-    {'file': 'foto-07-site-desktop-new.jpg', 'output': 'foto-07-site-desktop.png', 'fit': True},
+    {'file': 'foto-02-site-desktop-new.jpg', 'output': 'foto-02-site-desktop.png', 'crop': 'auto'},
+    {'file': 'foto-03-site-desktop-new.png', 'output': 'foto-03-site-desktop.png', 'crop': 'auto'},
+    {'file': 'foto-04-site-desktop-new.jpg', 'output': 'foto-04-site-desktop.png', 'crop': 'auto'},
+    {'file': 'foto-05-site-desktop-new.jpg', 'output': 'foto-05-site-desktop.png', 'crop': 'auto'},
+    {'file': 'foto-06-site-desktop-new.jpg', 'output': 'foto-06-site-desktop.png', 'crop': 'auto'},
+    {'file': 'foto-07-site-desktop-new.jpg', 'output': 'foto-07-site-desktop.png', 'crop': 'auto'},
 ]
 
-for img_cfg in images:
+
+def render_desktop(img, crop_offset=0, fit_mode=False, log=None, window=None):
+    """Fit or cover-crop one photo into the TARGET_WIDTH x TARGET_HEIGHT banner
+    (to window, fractions of the photo, when given; see asset_pipeline/smartcrop.py)."""
+    return render(img, (TARGET_WIDTH, TARGET_HEIGHT), crop_offset, fit_mode, log=log, window=window)
+
+
+def process_image(img_cfg):
+    """Build one desktop banner; returns the log lines and the smart-crop
+    window used, if any (runs in a worker process)."""
     img_name = img_cfg['file']
     output_name = img_cfg['output']
     crop_offset = img_cfg.get('crop_offset', 0)
     fit_mode = img_cfg.get('fit', False)
+    window = img_cfg.get('window')
+    lines = []
 
     if not os.path.exists(img_name):
-        print(f"⚠️  {img_name} not found, skipping...")
-        continue
-
-    try:
-        img = Image.open(img_name)
-        # Converter para RGB se necessário (caso seja RGBA ou outro formato)
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        original_width, original_height = img.size
-        print(f"📷 Processing {img_name} ({original_width}x{original_height})...")
-
-        aspect_ratio = original_width / original_height
-
-        if fit_mode:
-            # Ajuste para mostrar toda a imagem (fit) - mantém proporção e adiciona barras
-            scale = min(TARGET_WIDTH / original_width, TARGET_HEIGHT / original_height)
-            new_width = int(original_width * scale)
-            new_height = int(original_height * scale)
-            img_resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            img_cropped = Image.new('RGB', (TARGET_WIDTH, TARGET_HEIGHT), (11, 18, 32))
-            paste_x = (TARGET_WIDTH - new_width) // 2
-            paste_y = (TARGET_HEIGHT - new_height) // 2
-            img_cropped.paste(img_resized, (paste_x, paste_y))
-            print(f"   → Fit mode: scaled to {new_width}x{new_height}, centered with padding")
-        else:
-            # Redimensionar para cobrir toda a área (crop mode)
-            scale = max(TARGET_WIDTH / original_width, TARGET_HEIGHT / original_height)
-            new_width = int(original_width * scale)
-            new_height = int(original_height * scale)
-            img_resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-            # Crop vertical e horizontal para 1920x480
-            if new_width > TARGET_WIDTH:
-                left = (new_width - TARGET_WIDTH) // 2
-            else:
-                left = 0
-            
-            if new_height > TARGET_HEIGHT:
-                # Ajuste manual de crop_offset (negativo sobe, positivo desce)
-                top = max(0, ((new_height - TARGET_HEIGHT) // 2) + crop_offset)
-                if top + TARGET_HEIGHT > new_height:
-                    top = new_height - TARGET_HEIGHT
-            else:
-                top = 0
-            
-            img_cropped = img_resized.crop((left, top, left + TARGET_WIDTH, top + TARGET_HEIGHT))
-            
-            if crop_offset != 0:
-                print(f"   → Crop mode with offset {crop_offset}px (top={top})")
-            else:
-                print(f"   → Crop mode: centered")
-
-        # Salvar versão desktop
-        img_cropped.save(output_name, 'PNG', optimize=True, quality=95)
-        
-        file_size = os.path.getsize(output_name) / 1024
-        print(f"✅ Created {output_name} ({TARGET_WIDTH}x{TARGET_HEIGHT}, {file_size:.0f}KB)")
-        
-    except Exception as e:
-        print(f"❌ Error processing {img_name}: {e}")
-
-print("\n🎉 Done! New desktop images processed successfully.")
+        lines.append(f"⚠️  {img_name} not found, skipping...")
+        return lines, None
+
+    img = Image.open(img_name)
+    original_width, original_height = img.size
+    lines.append(f"📷 Processing {img_name} ({original_width}x{original_height})...")
+
+    if img_cfg.get('crop') == 'auto' and not fit_mode and window is None:
+        from asset_pipeline.smartcrop import find_window
+        window = find_window(img.convert('RGB'), TARGET_WIDTH / TARGET_HEIGHT)
+
+    img_cropped = render_desktop(img, crop_offset, fit_mode, log=lines.append, window=window)
+
+    # Salvar versão desktop
+    img_cropped.save(output_name, 'PNG', optimize=True)
+
+    file_size = os.path.getsize(output_name) / 1024
+    lines.append(f"✅ Created {output_name} ({TARGET_WIDTH}x{TARGET_HEIGHT}, {file_size:.0f}KB)")
+    return lines, window
+
+
+def with_windows(cache):
+    """images, with the smart-crop windows the build cache remembers for
+    each photo's content (the analysis only runs for new photos). Keyed
+    like the manifest's RGB sources, so windows the build found are used
+    here and the other way round."""
+    from asset_pipeline.smartcrop import crop_key, photo_source
+    found = []
+    for img_cfg in images:
+        if img_cfg.get('crop') == 'auto' and os.path.exists(img_cfg['file']):
+            key = crop_key(cache, photo_source(img_cfg['file'], 'RGB'), TARGET_WIDTH / TARGET_HEIGHT)
+            img_cfg = {**img_cfg, 'window_key': key, 'window': cache.crop(key)}
+        found.append(img_cfg)
+    return found
+
+
+def main(workers=None):
+    cache = BuildCache()
+    # Uma imagem por processo; os logs saem na ordem da lista
+    for img_cfg, result, error in run_ordered(process_image, with_windows(cache), workers):
+        if error is not None:
+            print(f"❌ Error processing {img_cfg['file']}: {error}")
+            continue
+        lines, window = result
+        print("\n".join(lines))
+        if window is not None and 'window_key' in img_cfg:
+            cache.remember_crop(img_cfg['window_key'], window)
+    cache.save()
+
+    print("\n🎉 Done! New desktop images processed successfully.")
+
+
+if __name__ == '__main__':
+    main()
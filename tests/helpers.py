@@ -0,0 +1,29 @@
+"""Tiny synthetic images and manifests shared by the tests."""
+import numpy as np
+from PIL import Image
+
+from asset_pipeline.manifest import build_graph
+
+
+def icon(size=16, seed=0):
+    """size x size RGBA image: a noisy disc on a transparent background."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[:size, :size]
+    inside = (x - size / 2) ** 2 + (y - size / 2) ** 2 < (size / 3) ** 2
+    arr = rng.integers(0, 256, (size, size, 4), dtype=np.uint8)
+    arr[..., 3] = np.where(inside, 255, 0)
+    return Image.fromarray(arr, "RGBA")
+
+
+def logo(size=24):
+    """RGB logo on a white background that touches every edge."""
+    arr = np.full((size, size, 3), 255, dtype=np.uint8)
+    arr[size // 4:-size // 4, size // 4:-size // 4] = (20, 60, 160)
+    return Image.fromarray(arr, "RGB")
+
+
+def graph_of(base, sources, outputs, transforms=None):
+    """Graph of a manifest with sources {name: path} and the given outputs."""
+    data = {"sources": {name: {"path": path} for name, path in sources.items()},
+            "transforms": transforms or {}, "outputs": outputs}
+    return build_graph(data, str(base))
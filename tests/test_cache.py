@@ -0,0 +1,98 @@
+"""BuildCache invalidation, through in-process builds of a tiny manifest."""
+import os
+
+from PIL import Image
+
+from asset_pipeline.cache import BuildCache
+from asset_pipeline.engine import build
+from tests.helpers import graph_of, icon, logo
+
+
+def quiet(*args):
+    pass
+
+
+def run(tmp_path, outputs, sources=None):
+    """Build outputs with a cache under tmp_path; returns (stats, cache)."""
+    graph = graph_of(tmp_path, sources or {"icon": "icon.png"}, outputs)
+    cache = BuildCache(str(tmp_path / ".asset-cache"))
+    return build(graph, log=quiet, cache=cache, workers=1), cache
+
+
+def resize(size):
+    return [{"path": "out.png", "input": "icon", "op": "resize", "size": size}]
+
+
+def save_source(img, path):
+    img.save(path)
+    # A new mtime even on filesystems with coarse timestamps
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_unchanged_build_is_cached(tmp_path):
+    save_source(icon(), tmp_path / "icon.png")
+    stats, _ = run(tmp_path, resize(8))
+    assert (stats["outputs"], stats["cached"]) == (1, 0)
+    stats, cache = run(tmp_path, resize(8))
+    assert (stats["outputs"], stats["cached"], stats["decodes"]) == (0, 1, 0)
+    assert cache.hits == 1
+
+
+def test_source_edit_rebuilds(tmp_path):
+    save_source(icon(seed=0), tmp_path / "icon.png")
+    run(tmp_path, resize(8))
+    save_source(icon(seed=1), tmp_path / "icon.png")
+    stats, _ = run(tmp_path, resize(8))
+    assert (stats["outputs"], stats["cached"]) == (1, 0)
+    # Touching the file without changing it is still a hit
+    save_source(icon(seed=1), tmp_path / "icon.png")
+    stats, _ = run(tmp_path, resize(8))
+    assert (stats["outputs"], stats["cached"]) == (0, 1)
+
+
+def test_params_change_rebuilds(tmp_path):
+    save_source(icon(), tmp_path / "icon.png")
+    run(tmp_path, resize(8))
+    stats, _ = run(tmp_path, resize(6))
+    assert (stats["outputs"], stats["cached"]) == (1, 0)
+    with Image.open(tmp_path / "out.png") as im:
+        assert im.size == (6, 6)
+    # Back to the first size: its bytes are still in the cache
+    stats, cache = run(tmp_path, resize(8))
+    assert (stats["outputs"], stats["cached"], cache.restored) == (0, 1, 1)
+    with Image.open(tmp_path / "out.png") as im:
+        assert im.size == (8, 8)
+
+
+def test_master_rewritten_in_place_keeps_its_origin(tmp_path):
+    path = tmp_path / "logo.png"
+    save_source(logo(), path)
+    outputs = [{"path": "logo.png", "input": "logo", "op": "remove_bg"}]
+    stats, cache = run(tmp_path, outputs, {"logo": "logo.png"})
+    assert stats["outputs"] == 1
+    with Image.open(path) as im:
+        assert im.convert("RGBA").getpixel((0, 0))[3] == 0
+    # The rewritten file is not a new source: it keeps the original's signature
+    written = cache.index["written"][str(path)]
+    assert written["sha"] == cache.file_hash(str(path))
+    assert cache.source_signature(str(path)) == written["origin"] != written["sha"]
+    stats, _ = run(tmp_path, outputs, {"logo": "logo.png"})
+    assert (stats["outputs"], stats["cached"]) == (0, 1)
+    # A new master saved over it is built again
+    save_source(logo(32), path)
+    stats, _ = run(tmp_path, outputs, {"logo": "logo.png"})
+    assert (stats["outputs"], stats["cached"]) == (1, 0)
+
+
+def test_prune_drops_least_recently_used(tmp_path):
+    cache = BuildCache(str(tmp_path))
+    for i, key in enumerate(["aa01", "bb02", "cc03"]):
+        cache.store(key, bytes(10))
+        cache.index["entries"][key]["used"] = i
+    assert cache.lookup("aa01")  # the oldest entry, used again now
+    assert cache.prune(20) == 1
+    assert sorted(cache.index["entries"]) == ["aa01", "cc03"]
+    assert not os.path.exists(cache.object_path("bb02"))
+    assert not cache.lookup("bb02")
+    assert cache.clear() == 2 and cache.size() == 0
@@ -0,0 +1,78 @@
+"""fingerprint: hashed copies, rewritten references, reruns after edits."""
+import json
+import os
+
+from asset_pipeline import ASSET_MANIFEST
+from asset_pipeline.cache import sha256
+from asset_pipeline.fingerprint import HASH_LENGTH, fingerprint, hashed_name, rewrite
+from tests.helpers import icon
+
+PAGE = """<html><head><link rel="icon" href="/img/icon.png"></head><body>
+<img src="img/icon.png?v=2" srcset="img/icon.png 1x, /img/big.png 2x" alt="">
+<div style="background: url('img/big.png')"></div>
+<img src="https://example.com/img/icon.png"><a href="img/icon.png.html">img/icon.png</a>
+</body></html>
+"""
+
+
+def quiet(*args):
+    pass
+
+
+def site(tmp_path):
+    (tmp_path / "img").mkdir()
+    icon(8).save(tmp_path / "img" / "icon.png")
+    icon(16).save(tmp_path / "img" / "big.png")
+    page = tmp_path / "index.html"
+    page.write_text(PAGE, encoding="utf-8")
+    return page
+
+
+def hashed(tmp_path, name):
+    path = str(tmp_path / "img" / name)
+    with open(path, "rb") as f:
+        return os.path.relpath(hashed_name(path, sha256(f.read())), tmp_path).replace(os.sep, "/")
+
+
+def run(tmp_path, page):
+    return fingerprint(str(tmp_path), [str(page)], log=quiet)
+
+
+def test_rewrites_references_to_hashed_copies(tmp_path):
+    page = site(tmp_path)
+    stats = run(tmp_path, page)
+    assert (stats["assets"], stats["written"], stats["rewritten"]) == (2, 2, 1)
+    small, big = hashed(tmp_path, "icon.png"), hashed(tmp_path, "big.png")
+    assert len(small.split(".")[-2]) == HASH_LENGTH
+    with open(tmp_path / small, "rb") as a, open(tmp_path / "img" / "icon.png", "rb") as b:
+        assert a.read() == b.read()
+    assert page.read_text(encoding="utf-8") == (
+        PAGE.replace('"/img/icon.png"', f'"/{small}"')
+            .replace('"img/icon.png?v=2"', f'"{small}?v=2"')
+            .replace('"img/icon.png 1x, /img/big.png 2x"', f'"{small} 1x, /{big} 2x"')
+            .replace("url('img/big.png')", f"url('{big}')"))
+    with open(tmp_path / ASSET_MANIFEST, encoding="utf-8") as f:
+        assert json.load(f) == {"/img/big.png": f"/{big}", "/img/icon.png": f"/{small}"}
+
+
+def test_rerun_only_swaps_changed_images(tmp_path):
+    page = site(tmp_path)
+    run(tmp_path, page)
+    first = page.read_text(encoding="utf-8")
+    stats = run(tmp_path, page)
+    assert (stats["written"], stats["rewritten"], stats["removed"]) == (0, 0, 0)
+    assert page.read_text(encoding="utf-8") == first
+
+    old = hashed(tmp_path, "icon.png")
+    icon(8, seed=1).save(tmp_path / "img" / "icon.png")
+    stats = run(tmp_path, page)
+    new = hashed(tmp_path, "icon.png")
+    assert (stats["written"], stats["rewritten"], stats["removed"]) == (1, 1, 1)
+    assert not os.path.exists(tmp_path / old)
+    assert page.read_text(encoding="utf-8") == first.replace(old, new)
+
+
+def test_rewrite_leaves_longer_urls_alone():
+    text = '<img src="a.png"> <img src="a.png.bak"> <p>a.png</p>'
+    assert rewrite(text, {"a.png": "a.1234abcd.png"}) == (
+        '<img src="a.1234abcd.png"> <img src="a.png.bak"> <p>a.png</p>')
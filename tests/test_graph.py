@@ -0,0 +1,66 @@
+"""Graph.select and Graph.split over a manifest that is never built."""
+import pytest
+
+from tests.helpers import graph_of
+
+SOURCES = {"a": "a.png", "b": "b.png", "logo": "logo.png"}
+TRANSFORMS = {"a-square": {"input": "a", "op": "square"}}
+OUTPUTS = [
+    {"path": "a-16.png", "input": "a-square", "op": "resize", "size": 16, "group": "icons"},
+    {"path": "a-32.png", "input": "a-square", "op": "resize", "size": 32, "group": "icons"},
+    {"path": "public/a-32.png", "input": "a-square", "op": "resize", "size": 32, "group": "icons"},
+    {"path": "b-16.png", "input": "b", "op": "resize", "size": 16, "group": "icons"},
+    {"path": "logo.png", "input": "logo", "op": "remove_bg", "group": "logos"},
+    {"path": "logo-8w.png", "input": "logo", "op": "resize_width", "width": 8, "group": "logos"},
+]
+
+
+@pytest.fixture
+def graph(tmp_path):
+    return graph_of(tmp_path, SOURCES, OUTPUTS, TRANSFORMS)
+
+
+def names(graph, outputs):
+    return sorted(graph.relative(o.path) for o in outputs)
+
+
+def test_same_work_shares_one_node(graph, tmp_path):
+    root, public = [o for o in graph.outputs if o.path.endswith("a-32.png")]
+    assert root.node is public.node
+    assert graph.fanout(graph.outputs) == {id(public): root}
+    # a.png is decoded and squared once, then resized to two sizes
+    plan = graph.plan(graph.select(None, [str(tmp_path / "a.png")]))
+    assert [n.op for n in plan] == ["decode", "square", "resize", "resize"]
+
+
+def test_select_by_group_and_source(graph, tmp_path):
+    assert names(graph, graph.select(["logos"])) == ["logo-8w.png", "logo.png"]
+    assert names(graph, graph.select(None, [str(tmp_path / "a.png")])) == [
+        "a-16.png", "a-32.png", "public/a-32.png"]
+    assert names(graph, graph.select(["logos"], [str(tmp_path / "a.png")])) == []
+    with pytest.raises(ValueError, match="Unknown group"):
+        graph.select(["nope"])
+
+
+def test_split_keeps_sources_apart(graph):
+    jobs = graph.split(graph.outputs)
+    assert [names(graph, job.outputs) for job in jobs] == [
+        ["a-16.png", "a-32.png", "public/a-32.png"],
+        ["b-16.png"],
+        ["logo-8w.png", "logo.png"],
+    ]
+    # Every node lands in exactly one job, after its inputs
+    seen = set()
+    for job in jobs:
+        for node in job.nodes:
+            assert node.key not in seen
+            assert all(dep.key in seen for dep in node.inputs)
+            seen.add(node.key)
+
+
+def test_plan_decodes_rewritten_masters_first(graph):
+    logos = graph.select(["logos"])
+    first = graph.plan(logos)[0]
+    assert first.op == "decode" and graph.relative(first.params["path"]) == "logo.png"
+    # The resize reads the master the remove_bg output overwrites: one job
+    assert len(graph.split(logos)) == 1
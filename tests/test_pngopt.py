@@ -0,0 +1,68 @@
+"""pngopt.recompress: smaller files, same pixels."""
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from asset_pipeline import pngopt
+from tests.helpers import icon
+
+
+def pillow_png(img):
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def few_colours(size=24):
+    arr = np.zeros((size, size, 4), dtype=np.uint8)
+    arr[::2] = (200, 30, 30, 255)
+    arr[:, ::3] = (10, 10, 90, 128)
+    return Image.fromarray(arr, "RGBA")
+
+
+IMAGES = {
+    "rgba": lambda: icon(24),
+    "opaque rgba": lambda: icon(24).convert("RGB").convert("RGBA"),
+    "gray": lambda: icon(24).convert("L"),
+    "palette": few_colours,
+    "bilevel": lambda: icon(24).convert("1"),
+    # Larger than SWEEP_PIXELS: only the adaptive filter is tried
+    "large": lambda: icon(520).convert("RGB"),
+}
+
+
+@pytest.mark.parametrize("name", IMAGES)
+def test_recompress_round_trips(name):
+    img = IMAGES[name]()
+    baseline = pillow_png(img)
+    data = pngopt.recompress(img, baseline)
+    assert len(data) <= len(baseline)
+    assert pngopt.decodes_to(data, pngopt.as_rgba(img))
+
+
+def test_decodes_to_rejects_other_pixels():
+    img = icon(16)
+    rgba = pngopt.as_rgba(img).copy()
+    rgba[3, 5, 0] ^= 1
+    assert not pngopt.decodes_to(pillow_png(img), rgba)
+
+
+def test_filtered_matches_per_row_choice():
+    rows = np.asarray(icon(70).convert("RGB")).reshape(70, -1)
+    found = pngopt.filtered(rows, 3)
+    for kind in pngopt.FILTERS:
+        data = np.frombuffer(found[kind].data, dtype=np.uint8).reshape(70, -1)
+        assert (data[:, 0] == pngopt.FILTERS.index(kind)).all()
+    # The strips join up: undoing "up" (and "sub" along each row) gives the rows back
+    up = np.frombuffer(found["up"].data, dtype=np.uint8).reshape(70, -1)[:, 1:]
+    assert (np.cumsum(up, axis=0, dtype=np.uint8) == rows).all()
+    sub = np.frombuffer(found["sub"].data, dtype=np.uint8).reshape(70, -1)[:, 1:]
+    assert (np.cumsum(sub.reshape(70, -1, 3), axis=1, dtype=np.uint8).reshape(70, -1) == rows).all()
+    # Adaptive takes, row by row, one of the plain filters' rows
+    adaptive = np.frombuffer(found["adaptive"].data, dtype=np.uint8).reshape(70, -1)
+    plain = {kind: np.frombuffer(found[kind].data, dtype=np.uint8).reshape(70, -1)
+             for kind in pngopt.FILTERS}
+    for y, row in enumerate(adaptive):
+        assert (row == plain[pngopt.FILTERS[row[0]]][y]).all()